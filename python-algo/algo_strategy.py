@@ -1,6 +1,7 @@
 import gamelib
 import random
 import math
+import time
 import warnings
 from sys import maxsize
 import json
@@ -22,6 +23,8 @@ Advanced strategy tips:
 class AlgoStrategy(gamelib.AlgoCore):
     def __init__(self):
         super().__init__()
+        # Keeps the influence maps and path fields of the board from turn to turn
+        self.track_board = True
         seed = random.randrange(maxsize)
         random.seed(seed)
         gamelib.debug_write('Random seed: {}'.format(seed))
@@ -31,18 +34,25 @@ class AlgoStrategy(gamelib.AlgoCore):
         Read in config and perform any initial setup here 
         """
         gamelib.debug_write('Configuring your custom algo strategy...')
-        self.config = config
+        super().on_game_start(config)
         global WALL, SUPPORT, TURRET, SCOUT, DEMOLISHER, INTERCEPTOR, MP, SP
-        WALL = config["unitInformation"][0]["shorthand"]
-        SUPPORT = config["unitInformation"][1]["shorthand"]
-        TURRET = config["unitInformation"][2]["shorthand"]
-        SCOUT = config["unitInformation"][3]["shorthand"]
-        DEMOLISHER = config["unitInformation"][4]["shorthand"]
-        INTERCEPTOR = config["unitInformation"][5]["shorthand"]
+        WALL = self.catalog.WALL
+        SUPPORT = self.catalog.SUPPORT
+        TURRET = self.catalog.TURRET
+        SCOUT = self.catalog.SCOUT
+        DEMOLISHER = self.catalog.DEMOLISHER
+        INTERCEPTOR = self.catalog.INTERCEPTOR
         MP = 1
         SP = 0
         # This is a good place to do initial setup
         self.scored_on_locations = []
+        # Picks attacks and structures together by simulating them with the evaluation service,
+        # reusing the simulations of earlier turns. Set evaluation_workers in __init__ to run them in parallel
+        self.plan_search = gamelib.PlanSearch(config, self.catalog, cache=self.simulation_cache, evaluation=self.evaluation)
+        # Chooses turrets against the paths the enemy's mobile units are likely to take
+        self.turret_placer = gamelib.TurretPlacer(config, self.catalog)
+        # Chooses supports that shield our attackers along their routes
+        self.support_placer = gamelib.SupportPlacer(config, self.catalog)
 
     def on_turn(self, turn_state):
         """
@@ -52,14 +62,16 @@ class AlgoStrategy(gamelib.AlgoCore):
         unit deployments, and transmitting your intended deployments to the
         game engine.
         """
-        game_state = gamelib.GameState(self.config, turn_state)
+        game_state = gamelib.GameState(self.config, turn_state, catalog=self.catalog, board=self.board)
         game_state.attempt_spawn(DEMOLISHER, [24, 10], 3) 
-        gamelib.debug_write('Performing turn {} of your custom algo strategy'.format(game_state.turn_number))
+        gamelib.log(gamelib.INFO, 'Performing turn {} of your custom algo strategy', game_state.turn_number)
         game_state.suppress_warnings(True)  #Comment or remove this line to enable warnings.
 
-        self.starter_strategy(game_state)
-
-        game_state.submit_turn()
+        # The planner runs the stages of the turn until the turn budget runs out, then submits the turn.
+        # If a stage is still running at the deadline, the plan of the stages that finished is submitted.
+        planner = self.make_planner(game_state)
+        self.starter_strategy(planner)
+        planner.run()
 
 
     """
@@ -67,18 +79,25 @@ class AlgoStrategy(gamelib.AlgoCore):
     strategy and can safely be replaced for your custom algo.
     """
 
-    def starter_strategy(self, game_state):
+    def starter_strategy(self, planner):
         """
         For defense we will use a spread out layout and some interceptors early on.
         We will place turrets near locations the opponent managed to score on.
         For offense we will use long range demolishers if they place stationary units near the enemy's front.
         If there are no stationary units to attack in the front, we will send Scouts to try and score quickly.
+        Each part is a stage of the planner, and the most important ones run first.
         """
         # First, place basic defenses
-        self.build_defences(game_state)
+        planner.add_stage(self.build_defences, priority=2)
         # Now build reactive defenses based on where the enemy scored
-        self.build_reactive_defense(game_state)
+        planner.add_stage(self.build_reactive_defense, priority=1)
+        # Then attack, with whatever time is left
+        planner.add_stage(self.build_offense, priority=0)
 
+    def build_offense(self, game_state):
+        """
+        Stall with interceptors early on, then attack with demolishers or scouts.
+        """
         # If the turn is less than 5, stall with interceptors and wait to see enemy's base
         if game_state.turn_number < 5:
             self.stall_with_interceptors(game_state)
@@ -87,36 +106,56 @@ class AlgoStrategy(gamelib.AlgoCore):
             # If they have many units in the front we can build a line for our demolishers to attack them at long range.
             if self.detect_enemy_unit(game_state, unit_type=None, valid_x=None, valid_y=[14, 15]) > 10:
                 self.demolisher_line_strategy(game_state)
+                # Shield the demolishers we just deployed
+                self.build_supports(game_state)
             else:
                 # They don't have many units in the front so lets figure out their least defended area and send Scouts there.
 
+                # To simplify we will just check sending them from back left and right
+                scout_spawn_location_options = [[13, 0], [14, 0]]
+                scout_stacks = [(SCOUT, location, game_state.number_affordable(SCOUT)) for location in scout_spawn_location_options]
+                actions = []
                 # Only spawn Scouts every other turn
                 # Sending more at once is better since attacks can only hit a single scout at a time
                 if game_state.turn_number % 2 == 1:
-                    # To simplify we will just check sending them from back left and right
-                    scout_spawn_location_options = [[13, 0], [14, 0]]
-                    best_location = self.least_damage_spawn_location(game_state, scout_spawn_location_options)
-                    game_state.attempt_spawn(SCOUT, best_location, 1000)
+                    actions += [(SCOUT, location, 1000) for location in scout_spawn_location_options]
+                # With the SP left, the turrets and upgrades that best cover the enemy's paths,
+                # and the supports that best shield the scouts on either route
+                actions += self.turret_placer.place(game_state).actions[:4]
+                actions += self.support_placer.place(game_state, scout_stacks).actions[:4]
 
-                # Lastly, if we have spare SP, let's build some supports
-                support_locations = [[13, 2], [14, 2], [13, 3], [14, 3]]
-                game_state.attempt_spawn(SUPPORT, support_locations)
+                # Let the search pick the spawn location and the structures together, by simulating them against
+                # a few guesses of the enemy's deploys, with at most half of the time left in the turn
+                time_limit = 0.5
+                if self.turn_deadline is not None:
+                    time_limit = max(0.0, min(time_limit, (self.turn_deadline - time.monotonic()) / 2))
+                result = self.plan_search.search(game_state, actions, time_limit=time_limit)
+                result.apply(game_state)
+
+    def build_supports(self, game_state, stacks=None):
+        """
+        Lastly, if we have spare SP, let's build some supports along the routes of our attackers.
+        By default the stacks are the mobile units we deployed this turn.
+        """
+        placement = self.support_placer.place(game_state, stacks)
+        placement.apply(game_state)
 
     def build_defences(self, game_state):
         """
-        Build basic defenses using hardcoded locations.
+        Build basic defenses, with turrets where they hurt the enemy's likely paths the most.
         Remember to defend corners and avoid placing units in the front where enemy demolishers can attack them.
         """
         # Useful tool for setting up your base locations: https://www.kevinbai.design/terminal-map-maker
         # More community tools available at: https://terminal.c1games.com/rules#Download
 
-        # Place turrets that attack enemy units
-        turret_locations = [[0, 13], [27, 13], [8, 11], [19, 11], [13, 11], [14, 11]]
-        # attempt_spawn will try to spawn units if we have resources, and will check if a blocking unit is already there
-        game_state.attempt_spawn(TURRET, turret_locations)
+        # Place turrets that attack enemy units, covering the paths from every enemy edge tile.
+        # Keep half of our SP for the rest of the turn
+        placement = self.turret_placer.place(game_state, SP_budget=game_state.get_resource(SP) / 2)
+        placement.apply(game_state)
         
-        # Place walls in front of turrets to soak up damage for them
-        wall_locations = [[8, 12], [19, 12]]
+        # Place walls in front of the turrets we just placed to soak up damage for them
+        wall_locations = [[x, y + 1] for unit_type, (x, y) in placement.actions
+                          if unit_type == TURRET and y + 1 < game_state.HALF_ARENA]
         game_state.attempt_spawn(WALL, wall_locations)
         # upgrade walls so they soak more damage
         game_state.attempt_upgrade(wall_locations)
@@ -127,10 +166,16 @@ class AlgoStrategy(gamelib.AlgoCore):
         We can track where the opponent scored by looking at events in action frames 
         as shown in the on_action_frame function
         """
+        # Weight the enemy's paths by how often they scored where those paths end
+        breaches = {}
         for location in self.scored_on_locations:
-            # Build turret one space above so that it doesn't block our own edge spawn locations
-            build_location = [location[0], location[1]+1]
-            game_state.attempt_spawn(TURRET, build_location)
+            breaches[tuple(location)] = breaches.get(tuple(location), 0) + 1
+        paths = [(path, breaches[tuple(path[-1])]) for path, _ in self.turret_placer.enemy_paths(game_state)
+                 if tuple(path[-1]) in breaches]
+        if paths:
+            # The placer keeps our edge tiles free, so turrets don't block our own edge spawn locations
+            placement = self.turret_placer.place(game_state, paths, SP_budget=game_state.get_resource(SP) / 2)
+            placement.apply(game_state)
 
     def stall_with_interceptors(self, game_state):
         """
@@ -160,12 +205,11 @@ class AlgoStrategy(gamelib.AlgoCore):
         Build a line of the cheapest stationary unit so our demolisher can attack from long range.
         """
         # First let's figure out the cheapest unit
-        # We could just check the game rules, but this demonstrates how to use the GameUnit class
+        # The unit catalog compiled at the start of the game has the cost of every unit type
         stationary_units = [WALL, TURRET, SUPPORT]
         cheapest_unit = WALL
         for unit in stationary_units:
-            unit_class = gamelib.GameUnit(unit, game_state.config)
-            if unit_class.cost[game_state.MP] < gamelib.GameUnit(cheapest_unit, game_state.config).cost[game_state.MP]:
+            if self.catalog.cost(unit)[game_state.MP] < self.catalog.cost(cheapest_unit)[game_state.MP]:
                 cheapest_unit = unit
 
         # Now let's build out a line of stationary units. This will prevent our demolisher from running into the enemy base.
@@ -187,10 +231,8 @@ class AlgoStrategy(gamelib.AlgoCore):
         # Get the damage estimate each path will take
         for location in location_options:
             path = game_state.find_path_to_edge(location)
-            damage = 0
-            for path_location in path:
-                # Get number of enemy turrets that can attack each location and multiply by turret damage
-                damage += len(game_state.get_attackers(path_location, 0)) * gamelib.GameUnit(TURRET, game_state.config).damage_i
+            # The threat map holds the damage enemy turrets deal on each location, so the path damage is a sum over the path
+            damage = game_state.threat_map.path_damage(path, 0)
             damages.append(damage)
         
         # Now just return the location that takes the least damage
@@ -212,7 +254,7 @@ class AlgoStrategy(gamelib.AlgoCore):
                 filtered.append(location)
         return filtered
 
-    def on_action_frame(self, turn_string):
+    def on_action_frame(self, state):
         """
         This is the action frame of the game. This function could be called 
         hundreds of times per turn and could slow the algo down so avoid putting slow code here.
@@ -220,7 +262,7 @@ class AlgoStrategy(gamelib.AlgoCore):
         Full doc on format of a game frame at in json-docs.html in the root of the Starterkit.
         """
         # Let's record at what position we get scored on
-        state = json.loads(turn_string)
+        # The frame has already been decoded by AlgoCore, so there is no need to call json.loads here
         events = state["events"]
         breaches = events["breach"]
         for breach in breaches:
@@ -229,9 +271,9 @@ class AlgoStrategy(gamelib.AlgoCore):
             # When parsing the frame data directly, 
             # 1 is integer for yourself, 2 is opponent (StarterKit code uses 0, 1 as player_index instead)
             if not unit_owner_self:
-                gamelib.debug_write("Got scored on at: {}".format(location))
+                gamelib.log(gamelib.INFO, "Got scored on at: {}", location)
                 self.scored_on_locations.append(location)
-                gamelib.debug_write("All locations: {}".format(self.scored_on_locations))
+                gamelib.log(gamelib.DEBUG, "All locations: {}", self.scored_on_locations)
 
 
 if __name__ == "__main__":
@@ -2,7 +2,8 @@
 The gamelib package contains modules that assist in algo creation \n
 
 The GameState class in game_state.py is the main class most players interact with. 
-It contains functions that let you get information about resources, deploy units, and help you strategize your move. \n
+It contains functions that let you get information about resources, deploy units, and help you strategize your move. 
+GameState.to_bytes and GameState.from_bytes save and restore it in a compact binary form, for example to send it to another process. \n
 
 The GameMap class in game_map.py represents the current game map. It can be used to access information related to the locations of units. 
 Investigating it is useful for any player that wants to access more information about the current state of the game. \n
@@ -10,20 +11,73 @@ Investigating it is useful for any player that wants to access more information
 The GameUnit class in unit.py represents a single unit. 
 Investigating it is useful for any player that wants to access information about units. \n
 
+The UnitCatalog class in catalog.py is the unit information of the game config, compiled once into fast lookups. 
+AlgoCore builds it in on_game_start and GameState, GameMap and GameUnit share it. \n
+
+The UnitStore class in unit_store.py holds all units of a turn as parallel arrays. 
+GameState fills it while parsing and GameUnits are only created from it when a tile of the map is accessed. 
+Investigating it is useful for players that want to analyze many units at once. \n
+
+The BoardModel class in board.py is a model of the structures on the board that lasts the whole game. 
+When AlgoCore.track_board is set, AlgoCore updates it every turn with only what changed, so GameUnits for structures keep their identity across turns. \n
+
+influence.py contains ThreatMap, a per-player grid of how many enemy structures attack each tile and how much damage they deal there. 
+GameState.threat_map builds it once and keeps it up to date as structures are spawned, upgraded or removed. 
+ShieldMap, available as GameState.shield_map, works the same way for the shield supports give to friendly mobile units. 
+GameState.get_path_exposure combines both to estimate, frame by frame, how a stack of mobile units fares along a path. \n
+
+The ResourceForecast class in forecast.py projects MP and SP for both players over every future turn at once. 
+GameState.project_future_MP and GameState.project_future_SP use it. \n
+
+The Simulator class in simulator.py simulates the action phase that follows a turn, frame by frame, from a GameState 
+and both players' deploys, and reports breaches, health, SP and destroyed structures in a SimulationResult. 
+replay.py checks it frame by frame against replay files, and can be run with python -m gamelib.replay. 
+BatchSimulator in batch_simulator.py runs many deploy variants on the same board in lockstep, sharing the board tables between them. 
+SimulationCache in sim_cache.py remembers results by board and deploys, and AlgoCore keeps one for the whole game. \n
+
+The EvaluationService class in evaluation.py evaluates candidates such as simulations in parallel on worker processes, 
+collecting what finishes before a deadline. AlgoCore makes it in on_game_start, with workers only if evaluation_workers asks for them. 
+Workers read each turn's board snapshot from a SharedBoard in shared_board.py instead of receiving it with every batch. \n
+
+The TurnPlanner class in planner.py runs the stages of a turn by priority until the deadline of the turn's TurnBudget, 
+and submits the plan of the finished stages if a stage is still running then. AlgoCore.make_planner makes one. \n
+
+The PlanSearch class in search.py picks builds, upgrades and deploys together with a beam search scored by the Simulator 
+against sampled enemy responses. It tries each plan between GameState.checkpoint and GameState.rollback, 
+and can simulate the plans of each step on the EvaluationService. \n
+
+TurretPlacer in placement.py chooses turrets and upgrades that deal the most damage per SP to the paths your opponent's 
+mobile units are likely to take, with a lazy greedy search over range stencils. 
+SupportPlacer does the same for supports, shielding the routes of your own mobile units. \n
+
 The AlgoCore class in algocore.py handles communication with the game engine, and forms the bones of an algo. AlgoStrategy inherits from it. 
 Investigating it is useful for advanced players interested in getting data from the action phase or communicating directly with the game engine. \n
 
 The Navigation class in navigation.py contains functions related to path-finding, which are used by GameState in pathing related functions. 
 Investigating it is useful for advanced player who want to optimize the slow default pathing algorithm we provide. \n 
 
-util.py contains a small handful of functions that help with communication, including the debug-printing function, debug_write().
+util.py contains a small handful of functions that help with communication, including the debug-printing function, debug_write(). 
+Its log() function adds levels and lazy formatting, and writes messages from a background thread so stderr never blocks a turn.
 """
 
 from .algocore import AlgoCore
-from .util import debug_write
+from .util import debug_write, log, log_enabled, configure_logging, dump_recent_logs, flush_logs, DEBUG, INFO, WARNING, ERROR
 from .game_state import GameState
 from .unit import GameUnit
 from .game_map import GameMap
+from .unit_store import UnitStore
+from .board import BoardModel, BoardDiff
+from .catalog import UnitCatalog, UnitStats
+from .influence import ThreatMap, ShieldMap, PathExposure
+from .forecast import ResourceForecast
+from .simulator import Simulator, SimulationResult
+from .batch_simulator import BatchSimulator
+from .sim_cache import SimulationCache, board_key, plan_key
+from .shared_board import SharedBoard
+from .evaluation import EvaluationService, EvaluationContext, simulate_task, path_task
+from .planner import TurnBudget, TurnPlanner
+from .search import PlanSearch, PlanSearchResult, apply_action, plan_task, sample_enemy_responses
+from .placement import TurretPlacer, SupportPlacer, PlacementResult, board_layout
 
-__all__ = ["algocore", "game_state", "game_map", "navigation", "unit", "util"]
+__all__ = ["algocore", "batch_simulator", "board", "catalog", "evaluation", "forecast", "game_state", "game_map", "influence", "navigation", "placement", "planner", "replay", "search", "shared_board", "sim_cache", "simulator", "unit", "unit_store", "util"]
  
\ No newline at end of file
@@ -1,7 +1,13 @@
 import json
+import time
 
 from .game_state import GameState
-from .util import get_command, debug_write, BANNER_TEXT, send_command
+from .board import BoardModel
+from .catalog import UnitCatalog
+from .evaluation import EvaluationService
+from .planner import TurnBudget, TurnPlanner
+from .sim_cache import SimulationCache
+from .util import get_command, debug_write, dump_recent_logs, log, DEBUG, WARNING, BANNER_TEXT, send_command
 
 class AlgoCore(object):
     """
@@ -10,23 +16,66 @@ class AlgoCore(object):
 
     Attributes :
         * config (JSON): json object containing information about the game
+        * catalog (:obj: UnitCatalog): The unit information of the config, compiled once at the start of the game. 
+          Pass it to GameState so every turn shares it.
+        * track_board (bool): Whether to keep a BoardModel of the structures across turns. Off by default. 
+          Set it before on_game_start, and pass board to GameState so each turn reuses the model's units, 
+          influence maps and path fields
+        * board (:obj: BoardModel): If track_board is set, a model of the structures on the board that lives for 
+          the whole game, updated with every turn message before on_turn is called. None otherwise
+        * slow_turn_seconds (float): If on_turn takes longer than this, the recent log messages are dumped 
+          to the debug output with gamelib.dump_recent_logs. None to never dump them
+        * evaluation_workers (int): The number of worker processes of the evaluation service. 0 by default, 
+          to evaluate candidates in the main process. None for one less than the number of cores. 
+          Set it before on_game_start if your strategy evaluates candidates with the service
+        * evaluation (:obj: EvaluationService): Evaluates candidates, in parallel if it has workers, during on_turn. 
+          Its workers are started in on_game_start, before the first turn
+        * simulation_cache (:obj: SimulationCache): Remembers simulated action phases by board and deploys. 
+          Made in on_game_start with simulation_cache_bytes of memory
+        * persist_simulation_cache (bool): If False, the simulation cache is cleared before every turn. 
+          Otherwise results are kept for later turns
+        * turn_budget (:obj: TurnBudget): The time each turn may take, from the engine's limits and my_time. 
+          Made in on_game_start
+        * turn_deadline (float): The time.monotonic() by which the current turn should be submitted. 
+          Set before on_turn is called
 
     """
     def __init__(self):
         self.config = None
+        self.catalog = None
+        self.track_board = False
+        self.board = None
+        self.slow_turn_seconds = 1.0
+        self.evaluation_workers = 0
+        self.evaluation = None
+        self.simulation_cache_bytes = 32 * 1024 * 1024
+        self.persist_simulation_cache = True
+        self.simulation_cache = None
+        self.turn_budget = None
+        self.turn_deadline = None
+        self._planner = None
 
     def on_game_start(self, config):
         """
         This function is called once at the start of the game. 
-        By default, it just initializes the config. \n
+        By default, it initializes the config, the unit catalog, the simulation cache and, if track_board is set, the board model, 
+        and starts the worker processes of the evaluation service, if evaluation_workers asks for any. \n
         You can override it it in algo_strategy.py to perform start of game setup
         """
         self.config = config
+        self.catalog = UnitCatalog(config)
+        self.board = BoardModel(config, self.catalog) if self.track_board else None
+        if self.evaluation is not None:
+            self.evaluation.shutdown()
+        self.evaluation = EvaluationService(config, self.evaluation_workers, self.catalog)
+        self.evaluation.start()
+        self.simulation_cache = SimulationCache(self.simulation_cache_bytes)
+        self.turn_budget = TurnBudget(config)
 
     def on_turn(self, game_state):
         """
         This step function is called at the start of each turn.
-        It is passed the current game state, which can be used to initiate a new GameState object. 
+        It is passed the current game state as a decoded json object, which can be used to initiate a new GameState object. 
         By default, it sends empty commands to the game engine. \n
         algo_strategy.py inherits from AlgoCore and overrides this on turn function. 
         Adjusting the on_turn function in algo_strategy is the main way to adjust your algo's logic. 
@@ -34,11 +83,21 @@ class AlgoCore(object):
         send_command("[]")
         send_command("[]")
     
+    def make_planner(self, game_state):
+        """Makes a TurnPlanner for the turn of game_state, with the deadline of the turn budget
+
+        Add the stages of the turn to it and call its run function instead of submit_turn. 
+        If the deadline comes before the stages finish, the plan of the stages that did is submitted.
+        """
+        deadline = self.turn_deadline if self.turn_deadline is not None else time.monotonic() + TurnBudget({}).seconds
+        self._planner = TurnPlanner(game_state, deadline)
+        return self._planner
+
     def on_action_frame(self, action_frame_game_state):
         """
         After each deploy phase, the game engine will run the action phase of the round.
         The action phase is made up of a sequence of distinct frames. 
-        Each of these frames is sent to the algo in order. 
+        Each of these frames is sent to the algo in order, as a decoded json object. 
         They can be handled in this function. 
         """
         pass
@@ -70,26 +129,47 @@ class AlgoCore(object):
                     """
                     This is the game turn game state message. Algo must now print to stdout 2 lines, one for build phase one for
                     deploy phase. Printing is handled by the provided functions.
+                    The message has already been decoded, so the decoded state is passed on to avoid parsing it again.
                     """
-                    self.on_turn(game_state_string)
+                    turn_start = time.monotonic()
+                    if self.board is not None:
+                        self.board.apply(state)
+                    if self.simulation_cache is not None:
+                        cache = self.simulation_cache
+                        log(DEBUG, "Simulation cache: {} results, {} bytes, {:.1%} hits, {} evictions",
+                            len(cache), cache.bytes_used, cache.hit_rate, cache.evictions)
+                        if not self.persist_simulation_cache:
+                            cache.clear()
+                    if self.turn_budget is not None:
+                        self.turn_deadline = self.turn_budget.start(state, turn_start)
+                    self._planner = None
+                    self.on_turn(state)
+                    elapsed = time.monotonic() - turn_start
+                    if self.turn_budget is not None:
+                        submitted_at = self._planner.submitted_at if self._planner is not None else None
+                        self.turn_budget.finish((submitted_at if submitted_at is not None else time.monotonic()) - turn_start)
+                    if self.slow_turn_seconds is not None and elapsed > self.slow_turn_seconds:
+                        dump_recent_logs("turn {} took {:.3f}s".format(state["turnInfo"][1], elapsed))
                 elif stateType == 1:
                     """
                     If stateType == 1, this game_state_string string represents a single frame of an action phase
                     """
-                    self.on_action_frame(game_state_string)
+                    self.on_action_frame(state)
                 elif stateType == 2:
                     """
                     This is the end game message. This means the game is over so break and finish the program.
                     """
                     debug_write("Got end state, game over. Stopping algo.")
+                    if self.evaluation is not None:
+                        self.evaluation.shutdown()
                     break
                 else:
                     """
                     Something is wrong? Received an incorrect or improperly formatted string.
                     """
-                    debug_write("Got unexpected string with turnInfo: {}".format(game_state_string))
+                    log(WARNING, "Got unexpected string with turnInfo: {}", game_state_string)
             else:
                 """
                 Something is wrong? Received an incorrect or improperly formatted string.
                 """
-                debug_write("Got unexpected string : {}".format(game_state_string))
+                log(WARNING, "Got unexpected string : {}", game_state_string)
@@ -0,0 +1,765 @@
+from array import array
+
+from .catalog import UnitCatalog
+from .influence import ARENA_SIZE, HALF_ARENA, range_offsets, reach_offsets
+from .navigation import PathFieldCache
+from .simulator import EDGES, EDGE_TILES, SimUnit, SimulationResult, compile_rules, target_edge_of
+
+# TILE_X[index] and TILE_Y[index] are the coordinates of the flat tile index x * ARENA_SIZE + y
+TILE_X = [index // ARENA_SIZE for index in range(ARENA_SIZE * ARENA_SIZE)]
+TILE_Y = [index % ARENA_SIZE for index in range(ARENA_SIZE * ARENA_SIZE)]
+
+# What stops a stack moving quietly along its path
+_END, _BREACH, _INTERACT = range(3)
+
+
+class _Board:
+    """
+    The structures of the board every scenario of a batch starts from, as parallel lists indexed by structure id,
+    with the tables the scenarios share: which turrets reach each tile, which supports shield each tile,
+    the structures each mobile unit range reaches from each tile, in target priority order, and for each
+    board layout the tiles where mobile units can be attacked or can attack a structure.
+    """
+    def __init__(self, structures, get_hit_radius):
+        self.rules = [unit.rules for unit in structures]
+        self.player = [unit.player_index for unit in structures]
+        self.tile = [unit.x * ARENA_SIZE + unit.y for unit in structures]
+        self.unit_type = [unit.unit_type for unit in structures]
+        self.upgraded = [unit.upgraded for unit in structures]
+        self.pending_removal = [unit.pending_removal for unit in structures]
+        self.health = array('d', [unit.health for unit in structures])
+        self.grid = [-1] * (ARENA_SIZE * ARENA_SIZE)
+        for structure_id, tile in enumerate(self.tile):
+            self.grid[tile] = structure_id
+        self.layout = frozenset(self.tile)
+        self.get_hit_radius = get_hit_radius
+
+        # turret_cover[tile] = [(turret_id, distance)] for every turret that can attack a mobile unit on tile
+        self.turrets = []
+        self.turret_cover = {}
+        # support_cover[tile] = [(support_id, shield amount)] for every support that shields tile
+        self.supports = []
+        self.support_cover = {}
+        for structure_id, unit in enumerate(structures):
+            stats = unit.rules.stats
+            if stats.damage_i > 0 and stats.attackRange > 0:
+                self.turrets.append(structure_id)
+                for dx, dy, distance in reach_offsets(stats.attackRange, get_hit_radius):
+                    x, y = unit.x + dx, unit.y + dy
+                    if 0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE:
+                        self.turret_cover.setdefault(x * ARENA_SIZE + y, []).append((structure_id, distance))
+            if stats.shieldRange > 0 and (stats.shieldPerUnit > 0 or stats.shieldBonusPerY > 0):
+                self.supports.append(structure_id)
+                rows_from_edge = unit.y if unit.player_index == 0 else ARENA_SIZE - 1 - unit.y
+                amount = stats.shieldPerUnit + stats.shieldBonusPerY * rows_from_edge
+                for dx, dy in range_offsets(stats.shieldRange):
+                    x, y = unit.x + dx, unit.y + dy
+                    if 0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE:
+                        self.support_cover.setdefault(x * ARENA_SIZE + y, []).append((structure_id, amount))
+        self.__reach = {}
+        self.__reach_grids = {}
+        self.__threat_grids = {}
+
+    def structures_in_reach(self, tile, attack_range, player_index):
+        """
+        The (structure_id, distance) of the enemy structures a mobile unit of player_index on tile could attack,
+        sorted by every part of the target priority except health. Cached for the whole batch.
+        """
+        key = (tile, attack_range, player_index)
+        reach = self.__reach.get(key)
+        if reach is None:
+            enemy = 1 - player_index
+            y_sign = 1 if player_index == 0 else -1
+            ax, ay = TILE_X[tile], TILE_Y[tile]
+            candidates = []
+            for dx, dy, distance in reach_offsets(attack_range, self.get_hit_radius):
+                x, y = ax + dx, ay + dy
+                if 0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE:
+                    structure_id = self.grid[x * ARENA_SIZE + y]
+                    if structure_id >= 0 and self.player[structure_id] == enemy:
+                        candidates.append(((distance, y_sign * y, -abs(HALF_ARENA - 0.5 - x), x, y), structure_id, distance))
+            candidates.sort()
+            reach = [(structure_id, distance) for _, structure_id, distance in candidates]
+            self.__reach[key] = reach
+        return reach
+
+    def reach_grid(self, layout, player_index, attack_range):
+        """
+        A flat grid counting, for each tile, the structures of player_index still standing in layout that a unit
+        with attack_range can attack from it. Built from the grid of the starting layout by removing the
+        destroyed structures, and cached for the whole batch.
+        """
+        key = (layout, player_index, attack_range)
+        grid = self.__reach_grids.get(key)
+        if grid is None:
+            offsets = reach_offsets(attack_range, self.get_hit_radius)
+            if layout is self.layout:
+                grid = bytearray(ARENA_SIZE * ARENA_SIZE)
+                tiles, step = layout, 1
+            else:
+                grid = bytearray(self.reach_grid(self.layout, player_index, attack_range))
+                tiles, step = self.layout - layout, -1
+            for tile in tiles:
+                if self.player[self.grid[tile]] != player_index:
+                    continue
+                sx, sy = TILE_X[tile], TILE_Y[tile]
+                for dx, dy, _ in offsets:
+                    x, y = sx + dx, sy + dy
+                    if 0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE:
+                        grid[x * ARENA_SIZE + y] += step
+            self.__reach_grids[key] = grid
+        return grid
+
+    def threat_grids(self, layout):
+        """
+        For each player, a flat grid marking the tiles where an enemy turret still standing in layout can attack
+        their mobile units. False if turrets can attack enemy structures, since then no frame is quiet.
+        Cached for the whole batch.
+        """
+        threat = self.__threat_grids.get(layout)
+        if threat is None:
+            threat = (bytearray(ARENA_SIZE * ARENA_SIZE), bytearray(ARENA_SIZE * ARENA_SIZE))
+            for turret_id in self.turrets:
+                tile = self.tile[turret_id]
+                if tile not in layout:
+                    continue
+                stats = self.rules[turret_id].stats
+                enemy = 1 - self.player[turret_id]
+                if stats.damage_f > 0 and self.reach_grid(layout, enemy, stats.attackRange)[tile]:
+                    threat = False
+                    break
+                grid = threat[enemy]
+                tx, ty = TILE_X[tile], TILE_Y[tile]
+                for dx, dy, _ in reach_offsets(stats.attackRange, self.get_hit_radius):
+                    x, y = tx + dx, ty + dy
+                    if 0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE:
+                        grid[x * ARENA_SIZE + y] = 1
+            self.__threat_grids[layout] = threat
+        return threat
+
+
+class _Scenario:
+    """
+    The state of one scenario of a batch. Mobile units are kept as stacks: units of the same type on the same
+    tile, with the same health, path and shields, which move and are attacked alike. Stacks are parallel lists
+    indexed by stack id, and mobiles lists the living stacks in deploy order. When one unit of a stack is
+    attacked, it is split into a stack of its own, just before the rest of the stack.
+    """
+    __slots__ = ("result", "frame", "busy_until", "cursor", "health", "alive_structures", "layout", "opened",
+                 "damaged", "rules", "player", "tile", "unit_health", "count", "edge", "path", "path_index",
+                 "steps", "shielded", "mobiles")
+
+    def __init__(self, board, result):
+        self.result = result
+        self.frame = 0
+        self.busy_until = 0
+        self.cursor = 0
+        self.health = array('d', board.health)
+        self.alive_structures = [True] * len(board.tile)
+        self.layout = board.layout
+        self.opened = []
+        self.damaged = []
+        self.rules = []
+        self.player = []
+        self.tile = []
+        self.unit_health = []
+        self.count = []
+        self.edge = []
+        self.path = []
+        self.path_index = []
+        self.steps = []
+        self.shielded = []
+        self.mobiles = []
+
+    def add_mobile(self, rules, player_index, x, y, health, count=1):
+        tile = x * ARENA_SIZE + y
+        if self.mobiles:
+            last = self.mobiles[-1]
+            if (self.rules[last] is rules and self.player[last] == player_index and self.tile[last] == tile
+                    and self.unit_health[last] == health):
+                self.count[last] += count
+                return
+        stack_id = len(self.tile)
+        self.rules.append(rules)
+        self.player.append(player_index)
+        self.tile.append(tile)
+        self.unit_health.append(health)
+        self.count.append(count)
+        self.edge.append(target_edge_of((x, y)))
+        self.path.append(None)
+        self.path_index.append(0)
+        self.steps.append(0)
+        self.shielded.append(0)
+        self.mobiles.append(stack_id)
+
+    def split(self, stack_id):
+        """
+        Moves the first unit of a stack into a new stack just before it in mobiles, and returns the new stack id.
+        Keeps cursor on the same stack if the new one is inserted before it.
+        """
+        new_id = len(self.tile)
+        for values in (self.rules, self.player, self.tile, self.unit_health, self.edge, self.path, self.path_index,
+                       self.steps, self.shielded):
+            values.append(values[stack_id])
+        self.count.append(1)
+        self.count[stack_id] -= 1
+        position = self.mobiles.index(stack_id)
+        self.mobiles.insert(position, new_id)
+        if position < self.cursor:
+            self.cursor += 1
+        return new_id
+
+
+class BatchSimulator:
+    """Simulates many deploy variants of one board in lockstep, with the rules of Simulator.
+
+    The board is compiled once per batch into shared tables: which turrets reach each tile, which supports
+    shield it, which structures each mobile unit could attack from it, already sorted by target priority, and
+    for each board layout the tiles where nothing can happen. Paths are shared between scenarios through a cache
+    keyed by board layout. Each scenario only keeps its own structure health and its mobile units, grouped into
+    stacks of identical units so a stack of scouts moves, is shielded and finds its targets once per frame.
+    Every round advances all running scenarios by one step, either a full frame or a run of quiet frames in
+    which units can only move, skipped the way Simulator skips them. Results are identical to running Simulator
+    on each scenario.
+
+    Attributes :
+        * config (JSON): Contains information about the game
+        * catalog (:obj: UnitCatalog): The compiled unit information of the game
+        * rules (dict): Maps (unit_type, upgraded) to the UnitRules of that type
+        * max_frames (int): A scenario stops after this many frames even if mobile units remain
+        * skip_quiet_frames (bool): Whether frames in which units can only move are run with moves only
+        * stacks_stepped (int): The stacks the last call to simulate went through in full frames, once per stack 
+          and frame over every scenario. Comparable to Simulator.units_stepped, which counts every unit
+
+    """
+    PATH_CACHE_SIZE = 4096
+
+    def __init__(self, config, catalog=None, max_frames=1000):
+        """Compiles the rules of the game
+
+        Args:
+            config (JSON): Contains information about the game
+            catalog (:obj: UnitCatalog): The compiled unit information of the game. Compiled from config if None
+            max_frames: The longest action phase to simulate
+
+        """
+        self.config = config
+        self.catalog = catalog if catalog is not None else UnitCatalog.for_config(config)
+        self.rules = compile_rules(config, self.catalog)
+        self.max_frames = max_frames
+        self.skip_quiet_frames = True
+        self.stacks_stepped = 0
+        self._get_hit_radius = self.catalog.get_hit_radius
+        self._path_fields = PathFieldCache()
+        self._path_cache = {}
+        self._scan_cache = {}
+
+    def simulate(self, game_state, scenarios):
+        """Simulates the action phase that follows the current turn once per scenario
+
+        Structures and mobile units already on the game_map, including those added with attempt_spawn, take part
+        in every scenario.
+
+        Args:
+            game_state: The GameState every scenario starts from
+            scenarios: A list of (deploys, enemy_deploys) pairs, each a list of (unit_type, location) or
+              (unit_type, location, count) tuples like the arguments of Simulator.simulate
+
+        Returns:
+            A list with the SimulationResult of each scenario, in order
+
+        """
+        structures = []
+        map_mobiles = []
+        for x, y, unit_type, player_index, health, upgraded, pending_removal in game_state.game_map.iter_units():
+            rules = self.rules[(unit_type, upgraded)]
+            if rules.stats.stationary:
+                structures.append(SimUnit(unit_type, player_index, x, y, health, rules, upgraded, pending_removal))
+            else:
+                map_mobiles.append((rules, player_index, x, y, health))
+        board = _Board(structures, self._get_hit_radius)
+        health = [game_state.my_health, game_state.enemy_health]
+        SP = [game_state.get_resource(game_state.SP, 0), game_state.get_resource(game_state.SP, 1)]
+
+        states = []
+        for deploys, enemy_deploys in scenarios:
+            state = _Scenario(board, SimulationResult(health, SP))
+            for mobile in map_mobiles:
+                state.add_mobile(*mobile)
+            for player_index, plan in ((0, deploys), (1, enemy_deploys)):
+                for deploy in plan:
+                    rules = self.rules[(deploy[0], False)]
+                    count = deploy[2] if len(deploy) > 2 else 1
+                    if count > 0:
+                        state.add_mobile(rules, player_index, deploy[1][0], deploy[1][1], rules.stats.max_health, count)
+            states.append(state)
+
+        self.stacks_stepped = 0
+        running = [state for state in states if state.mobiles]
+        while running:
+            for state in running:
+                self._advance(board, state)
+            running = [state for state in running if state.mobiles and state.frame < self.max_frames]
+
+        return [self._finish(board, state) for state in states]
+
+    def _advance(self, board, state):
+        """
+        Advances one scenario by one frame, or by every frame until something other than a move can happen.
+        """
+        frame = state.frame
+        if frame > 0:
+            if state.opened:
+                self._repath(state)
+            if self.skip_quiet_frames and frame >= state.busy_until:
+                quiet = self._quiet_frames(board, state, frame)
+                if quiet:
+                    self._skip(board, state, frame, quiet)
+                    state.frame = frame + quiet
+                    return
+            self._move(board, state, frame)
+        self.stacks_stepped += len(state.mobiles)
+        self._step(board, state)
+        state.frame = frame + 1
+
+    def _step(self, board, state):
+        """
+        Runs the rest of a frame once units have moved: shield, attack, then remove destroyed units.
+        """
+        unit_health = state.unit_health
+        player = state.player
+        tile_of = state.tile
+        # occupied[player_index] maps each tile holding living mobile units of that player to their stack ids
+        occupied = ({}, {})
+        for stack_id in state.mobiles:
+            if unit_health[stack_id] > 0:
+                occupied[player[stack_id]].setdefault(tile_of[stack_id], []).append(stack_id)
+
+        if board.supports:
+            self._shield(board, state, occupied)
+
+        state.cursor = 0
+        if board.turrets and (occupied[0] or occupied[1]):
+            # The tiles each turret could attack this frame, in the order Simulator would consider them
+            candidates = {}
+            for player_index in (0, 1):
+                for tile in occupied[player_index]:
+                    for turret_id, distance in board.turret_cover.get(tile, ()):
+                        if board.player[turret_id] != player_index:
+                            candidates.setdefault(turret_id, []).append((tile, distance))
+            health = state.health
+            for turret_id in board.turrets:
+                tiles = candidates.get(turret_id)
+                if tiles and health[turret_id] > 0 and state.alive_structures[turret_id]:
+                    turret_player = board.player[turret_id]
+                    enemy_tiles = occupied[1 - turret_player]
+                    target = self._pick_mobile(tiles, enemy_tiles, unit_health, 1 if turret_player == 0 else -1)
+                    if target is not None:
+                        self._hit_mobile(state, target, board.rules[turret_id].stats.damage_i, turret_player, occupied)
+
+        # Stacks may be split while they attack, so walk mobiles with a cursor that split keeps in place
+        mobiles = state.mobiles
+        while state.cursor < len(mobiles):
+            stack_id = mobiles[state.cursor]
+            if unit_health[stack_id] > 0:
+                self._mobile_attack(board, state, stack_id, occupied)
+            state.cursor += 1
+
+        self._remove_destroyed(board, state)
+
+    def _pick_mobile(self, tiles, enemy_tiles, unit_health, y_sign):
+        best_key = None
+        target = None
+        for tile, distance in tiles:
+            weakest = None
+            weakest_health = 0
+            for stack_id in enemy_tiles[tile]:
+                health = unit_health[stack_id]
+                if health > 0 and (weakest is None or health < weakest_health):
+                    weakest = stack_id
+                    weakest_health = health
+            if weakest is None:
+                continue
+            x, y = TILE_X[tile], TILE_Y[tile]
+            key = (distance, weakest_health, y_sign * y, -abs(HALF_ARENA - 0.5 - x), x, y)
+            if best_key is None or key < best_key:
+                best_key = key
+                target = weakest
+        return target
+
+    def _mobile_attack(self, board, state, stack_id, occupied):
+        """
+        Every unit of a stack attacks in turn. The tiles and structures in reach are found once for the stack.
+        """
+        stats = state.rules[stack_id].stats
+        player_index = state.player[stack_id]
+        tile = state.tile[stack_id]
+        y_sign = 1 if player_index == 0 else -1
+        tiles = None
+        enemy_tiles = occupied[1 - player_index]
+        if stats.damage_i > 0 and enemy_tiles:
+            ax, ay = TILE_X[tile], TILE_Y[tile]
+            limit = stats.attackRange + self._get_hit_radius
+            tiles = []
+            for enemy_tile in enemy_tiles:
+                dx, dy = TILE_X[enemy_tile] - ax, TILE_Y[enemy_tile] - ay
+                distance = (dx * dx + dy * dy) ** 0.5
+                if distance < limit:
+                    tiles.append((enemy_tile, distance))
+        reach = board.structures_in_reach(tile, stats.attackRange, player_index) if stats.damage_f > 0 else ()
+        unit_health = state.unit_health
+        health = state.health
+        alive = state.alive_structures
+        for _ in range(state.count[stack_id]):
+            if tiles:
+                target = self._pick_mobile(tiles, enemy_tiles, unit_health, y_sign)
+                if target is not None:
+                    self._hit_mobile(state, target, stats.damage_i, player_index, occupied)
+                    continue
+                # Mobile units only lose health during attacks, so the rest of the stack finds none either
+                tiles = None
+            target = None
+            target_distance = None
+            target_health = 0
+            for structure_id, distance in reach:
+                if target is not None and distance > target_distance:
+                    break
+                if alive[structure_id] and health[structure_id] > 0 and (target is None or health[structure_id] < target_health):
+                    target = structure_id
+                    target_distance = distance
+                    target_health = health[structure_id]
+            if target is None:
+                break
+            self._damage_structure(state, target, stats.damage_f, player_index)
+
+    def _hit_mobile(self, state, stack_id, amount, player_index, occupied):
+        """
+        Damages the first unit of a stack, splitting it from the rest of the stack.
+        """
+        if state.count[stack_id] > 1:
+            units = occupied[state.player[stack_id]][state.tile[stack_id]]
+            new_id = state.split(stack_id)
+            units.insert(units.index(stack_id), new_id)
+            stack_id = new_id
+        self._damage_mobile(state, stack_id, amount, player_index)
+
+    def _damage_mobile(self, state, stack_id, amount, player_index):
+        """
+        Damages every unit of a stack.
+        """
+        health = state.unit_health[stack_id]
+        dealt = min(amount, health)
+        damage_dealt = state.result.damage_dealt
+        for _ in range(state.count[stack_id]):
+            damage_dealt[player_index] += dealt
+        state.unit_health[stack_id] = health - amount
+
+    def _damage_structure(self, state, structure_id, amount, player_index):
+        health = state.health[structure_id]
+        state.result.damage_dealt[player_index] += min(amount, health)
+        state.health[structure_id] = health - amount
+        state.damaged.append(structure_id)
+
+    def _shield(self, board, state, occupied):
+        shielded = state.shielded
+        unit_health = state.unit_health
+        alive = state.alive_structures
+        for player_index in (0, 1):
+            for tile, units in occupied[player_index].items():
+                for support_id, amount in board.support_cover.get(tile, ()):
+                    if board.player[support_id] != player_index or not alive[support_id]:
+                        continue
+                    bit = 1 << support_id
+                    for stack_id in units:
+                        if not shielded[stack_id] & bit:
+                            shielded[stack_id] |= bit
+                            unit_health[stack_id] += amount
+
+    def _path(self, board, state, stack_id):
+        key = (state.layout, state.tile[stack_id], state.edge[stack_id])
+        path = self._path_cache.get(key)
+        if path is None:
+            if len(self._path_cache) >= self.PATH_CACHE_SIZE:
+                self._path_cache.clear()
+            tile = state.tile[stack_id]
+            steps = self._path_fields.path([TILE_X[tile], TILE_Y[tile]], EDGES[state.edge[stack_id]], state.layout)
+            path = [x * ARENA_SIZE + y for x, y in steps] if steps else [tile]
+            self._path_cache[key] = path
+        return path
+
+    def _repath(self, state):
+        state.layout, changed = self._path_fields.open_tiles(state.layout, state.opened)
+        state.opened = []
+        state.busy_until = 0
+        path = state.path
+        tile = state.tile
+        for stack_id in state.mobiles:
+            if tile[stack_id] in changed:
+                path[stack_id] = None
+
+    def _quiet_frames(self, board, state, frame):
+        """
+        The number of frames from frame on that only move units, found like Simulator._quiet_frames.
+        """
+        threat = board.threat_grids(state.layout)
+        if threat is False:
+            return 0
+        horizon = self.max_frames - frame
+
+        # Mobile units attacking each other. Each move brings two units at most 1 tile closer
+        tiles = (set(), set())
+        limit = None
+        fastest = None
+        for stack_id in state.mobiles:
+            tiles[state.player[stack_id]].add(state.tile[stack_id])
+            rules = state.rules[stack_id]
+            if rules.stats.damage_i > 0 and (limit is None or rules.stats.attackRange + self._get_hit_radius > limit):
+                limit = rules.stats.attackRange + self._get_hit_radius
+            if rules.frames_per_move and (fastest is None or rules.frames_per_move < fastest):
+                fastest = rules.frames_per_move
+        if limit is not None and tiles[0] and tiles[1]:
+            nearest = min((TILE_X[tile0] - TILE_X[tile1]) * (TILE_X[tile0] - TILE_X[tile1]) +
+                          (TILE_Y[tile0] - TILE_Y[tile1]) * (TILE_Y[tile0] - TILE_Y[tile1])
+                          for tile0 in tiles[0] for tile1 in tiles[1]) ** 0.5
+            moves = int((nearest - limit) // 2)
+            if moves < 1:
+                return 0
+            if fastest is not None:
+                horizon = min(horizon, moves * fastest)
+
+        groups = {}
+        for stack_id in state.mobiles:
+            key = (state.player[stack_id], state.tile[stack_id], state.edge[stack_id], id(state.path[stack_id]),
+                   state.path_index[stack_id], state.rules[stack_id], state.shielded[stack_id])
+            groups.setdefault(key, stack_id)
+        last_breach = 0
+        for stack_id in groups.values():
+            quiet, breach = self._stack_quiet_frames(board, state, stack_id, frame, horizon)
+            horizon = quiet
+            if not horizon:
+                return 0
+            if breach is None:
+                last_breach = None
+            elif last_breach is not None:
+                last_breach = max(last_breach, breach)
+        # The action phase ends with the frame in which the last unit breaches
+        return horizon if last_breach is None else min(horizon, last_breach + 1)
+
+    def _stack_quiet_frames(self, board, state, stack_id, frame, horizon):
+        """
+        Helper function for _quiet_frames, like Simulator._unit_quiet_frames for the units of a stack.
+        """
+        path, index = state.path[stack_id], state.path_index[stack_id]
+        if path is None:
+            path, index = self._path(board, state, stack_id), 0
+        here, moves, event = self._scan(board, state, stack_id, path, index)
+        frames_per_move = state.rules[stack_id].frames_per_move
+        if not frames_per_move:
+            return (0 if here else horizon), None
+        if frame % frames_per_move and here:
+            state.busy_until = frame + (-frame % frames_per_move)
+            return 0, None
+        # The frames until the move that ends on the event
+        wait = -frame % frames_per_move + (moves - 1) * frames_per_move
+        if wait >= horizon:
+            return horizon, None
+        if event == _BREACH:
+            return horizon, wait
+        if event == _INTERACT and wait == 0:
+            state.busy_until = frame + frames_per_move
+        return wait, None
+
+    def _scan(self, board, state, stack_id, path, index):
+        """
+        Whether a stack at path[index] could attack, be attacked or be shielded where it stands, and the number of
+        moves along path until it runs out of path, breaches or ends a move where it interacts, with which of
+        those comes first. Shared by every stack of the batch on the same path and board layout with the
+        same rules and shields.
+        """
+        rules = state.rules[stack_id]
+        player_index = state.player[stack_id]
+        shielded = state.shielded[stack_id]
+        key = (state.layout, id(path), index, rules, player_index, shielded)
+        scan = self._scan_cache.get(key)
+        if scan is None:
+            if len(self._scan_cache) >= self.PATH_CACHE_SIZE:
+                self._scan_cache.clear()
+            stats = rules.stats
+            threat = board.threat_grids(state.layout)[player_index]
+            reach = board.reach_grid(state.layout, 1 - player_index, stats.attackRange) if stats.damage_f > 0 else None
+            alive = state.alive_structures
+
+            def interacts(tile):
+                if threat[tile] or (reach is not None and reach[tile]):
+                    return True
+                for support_id, _ in board.support_cover.get(tile, ()):
+                    if board.player[support_id] == player_index and alive[support_id] and not shielded >> support_id & 1:
+                        return True
+                return False
+
+            edge_tiles = EDGE_TILES[state.edge[stack_id]]
+            moves = 0
+            while True:
+                moves += 1
+                if index + moves >= len(path):
+                    event = _END
+                    break
+                tile = path[index + moves]
+                if tile in edge_tiles:
+                    event = _BREACH
+                    break
+                if interacts(tile):
+                    event = _INTERACT
+                    break
+            # The path is kept with the scan so its id is not reused while the scan is cached
+            scan = (path, interacts(path[index]), moves, event)
+            self._scan_cache[key] = scan
+        return scan[1:]
+
+    def _skip(self, board, state, frame, frames):
+        """
+        Runs quiet frames found by _quiet_frames, moving every stack as many tiles as _move would.
+        Breaches are counted in the order _move would count them.
+        """
+        end = frame + frames
+        remaining = []
+        breaches = []
+        for order, stack_id in enumerate(state.mobiles):
+            frames_per_move = state.rules[stack_id].frames_per_move
+            moves = (end - 1) // frames_per_move - (frame - 1) // frames_per_move if frames_per_move else 0
+            if not moves:
+                remaining.append(stack_id)
+                continue
+            if state.path[stack_id] is None:
+                state.path[stack_id] = self._path(board, state, stack_id)
+                state.path_index[stack_id] = 0
+            edge_tiles = EDGE_TILES[state.edge[stack_id]]
+            path = state.path[stack_id]
+            index = state.path_index[stack_id]
+            for move in range(1, moves + 1):
+                if path[index + move] in edge_tiles:
+                    moves = move
+                    breaches.append((frame + (-frame % frames_per_move) + (move - 1) * frames_per_move, order, stack_id))
+                    break
+            else:
+                remaining.append(stack_id)
+            state.path_index[stack_id] = index + moves
+            state.tile[stack_id] = path[index + moves]
+            state.steps[stack_id] += moves
+        breaches.sort(key=lambda breach: breach[:2])
+        for _, _, stack_id in breaches:
+            self._breach(state, stack_id)
+        state.mobiles = remaining
+
+    def _breach(self, state, stack_id):
+        result = state.result
+        rules = state.rules[stack_id]
+        player_index = state.player[stack_id]
+        for _ in range(state.count[stack_id]):
+            result.breaches[player_index] += 1
+            result.health[1 - player_index] -= rules.breach_damage
+            result.SP[player_index] += rules.breach_SP
+
+    def _move(self, board, state, frame):
+        result = state.result
+        remaining = []
+        for stack_id in state.mobiles:
+            rules = state.rules[stack_id]
+            frames_per_move = rules.frames_per_move
+            if not frames_per_move or frame % frames_per_move:
+                remaining.append(stack_id)
+                continue
+            if state.path[stack_id] is None:
+                state.path[stack_id] = self._path(board, state, stack_id)
+                state.path_index[stack_id] = 0
+            path = state.path[stack_id]
+            index = state.path_index[stack_id]
+            if index + 1 < len(path):
+                index += 1
+                state.path_index[stack_id] = index
+                state.tile[stack_id] = path[index]
+                state.steps[stack_id] += 1
+                if path[index] in EDGE_TILES[state.edge[stack_id]]:
+                    self._breach(state, stack_id)
+                    continue
+                remaining.append(stack_id)
+            else:
+                self._self_destruct(board, state, stack_id)
+                result.units_lost[state.player[stack_id]] += state.count[stack_id]
+        state.mobiles = remaining
+
+    def _self_destruct(self, board, state, stack_id):
+        """
+        Every unit of a stack self destructs in turn. Enemy stacks in range are damaged as a whole.
+        """
+        rules = state.rules[stack_id]
+        unit_health = state.unit_health
+        unit_health[stack_id] = 0
+        if state.steps[stack_id] < rules.self_destruct_steps or rules.self_destruct_range <= 0:
+            return
+        player_index = state.player[stack_id]
+        enemy = 1 - player_index
+        tile = state.tile[stack_id]
+        ux, uy = TILE_X[tile], TILE_Y[tile]
+        structures = []
+        for dx, dy, _ in reach_offsets(rules.self_destruct_range, self._get_hit_radius):
+            x, y = ux + dx, uy + dy
+            if 0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE:
+                structure_id = board.grid[x * ARENA_SIZE + y]
+                if structure_id >= 0 and state.alive_structures[structure_id] and board.player[structure_id] == enemy:
+                    structures.append(structure_id)
+        limit = rules.self_destruct_range + self._get_hit_radius
+        others = []
+        for other in state.mobiles:
+            if state.player[other] == enemy:
+                other_tile = state.tile[other]
+                dx, dy = TILE_X[other_tile] - ux, TILE_Y[other_tile] - uy
+                if (dx * dx + dy * dy) ** 0.5 < limit:
+                    others.append(other)
+        for _ in range(state.count[stack_id]):
+            for structure_id in structures:
+                if state.health[structure_id] > 0:
+                    self._damage_structure(state, structure_id, rules.self_destruct_damage_f, player_index)
+            for other in others:
+                if unit_health[other] > 0:
+                    self._damage_mobile(state, other, rules.self_destruct_damage_i, player_index)
+
+    def _remove_destroyed(self, board, state):
+        result = state.result
+        unit_health = state.unit_health
+        remaining = []
+        for stack_id in state.mobiles:
+            if unit_health[stack_id] > 0:
+                remaining.append(stack_id)
+            else:
+                result.units_lost[state.player[stack_id]] += state.count[stack_id]
+        state.mobiles = remaining
+        if state.damaged:
+            alive = state.alive_structures
+            for structure_id in state.damaged:
+                if state.health[structure_id] <= 0 and alive[structure_id]:
+                    alive[structure_id] = False
+                    tile = board.tile[structure_id]
+                    result.structures_destroyed.append((TILE_X[tile], TILE_Y[tile], board.unit_type[structure_id], board.player[structure_id]))
+                    state.opened.append(tile)
+            state.damaged = []
+
+    def _finish(self, board, state):
+        """
+        Refunds structures marked for removal and lists the remaining structures, in tile order like Simulator.
+        """
+        result = state.result
+        result.frames = state.frame
+        for tile in sorted(board.tile):
+            structure_id = board.grid[tile]
+            if not state.alive_structures[structure_id]:
+                continue
+            rules = board.rules[structure_id]
+            health = state.health[structure_id]
+            if board.pending_removal[structure_id]:
+                stats = rules.stats
+                result.SP[board.player[structure_id]] += stats.cost[0] * rules.refund_percentage * health / stats.max_health
+            else:
+                result.structures.append(SimUnit(board.unit_type[structure_id], board.player[structure_id], TILE_X[tile], TILE_Y[tile],
+                                                 health, rules, board.upgraded[structure_id]))
+        return result
@@ -0,0 +1,233 @@
+from .unit_store import UnitStore
+from .catalog import UnitCatalog
+from .game_map import GameMap
+from .influence import ARENA_SIZE, ThreatMap, ShieldMap
+from .navigation import PathFieldCache
+
+
+class BoardDiff:
+    """The changes to the structures on the board between two turns
+
+    Attributes :
+        * turn_number (int): The turn this diff leads to
+        * added (list): GameUnits for structures that were built
+        * destroyed (list): GameUnits for structures that are no longer on the board
+        * upgraded (list): GameUnits for structures that were upgraded
+        * marked_for_removal (list): GameUnits for structures that were marked for removal by their owner
+        * health_changed (list): GameUnits for structures whose health changed
+        * changed_tiles (set): The (x, y) tuples of every tile touched by one of the above
+
+    """
+    def __init__(self, turn_number):
+        self.turn_number = turn_number
+        self.added = []
+        self.destroyed = []
+        self.upgraded = []
+        self.marked_for_removal = []
+        self.health_changed = []
+        self.changed_tiles = set()
+
+    def __bool__(self):
+        return bool(self.changed_tiles)
+
+    def __repr__(self):
+        return "BoardDiff(turn {}: {} added, {} destroyed, {} upgraded, {} marked for removal, {} health changed)".format(
+            self.turn_number, len(self.added), len(self.destroyed), len(self.upgraded), len(self.marked_for_removal), len(self.health_changed))
+
+
+class BoardModel:
+    """A long lived model of the structures on the board, kept up to date across turns.
+
+    Each turn message is applied as a diff against the previous turn, so every structure keeps the
+    same GameUnit object for as long as it stays on the board. The threat map, shield map and path fields
+    of the board live as long as the model, and each diff only updates them on its changed_tiles.
+    Pass the model to GameState with the turn message it was last updated with, and the GameState reuses
+    the units parsed by apply, copies the influence maps instead of building them, and finds paths with
+    the model's path fields. Other caches can use changed_tiles, or register a listener.
+    If its track_board attribute is set, AlgoCore owns one BoardModel and applies every turn message to it
+    before calling on_turn.
+
+    Attributes :
+        * config (JSON): Contains information about the game
+        * catalog (:obj: UnitCatalog): The compiled unit information of the game
+        * turn_number (int): The turn of the last applied message, -1 before the first one
+        * last_diff (:obj: BoardDiff): The changes made by the last applied message
+        * changed_tiles (set): The (x, y) tuples changed by the last applied message
+        * last_message (dict): The last applied turn message
+        * unit_store (:obj: UnitStore): Every unit of the last applied message
+        * game_map (:obj: GameMap): The structures of the board, as the GameUnits the model keeps across turns
+        * threat_map (:obj: ThreatMap): The ThreatMap of game_map. Built on first access and then kept up to date
+        * shield_map (:obj: ShieldMap): The ShieldMap of game_map. Built on first access and then kept up to date
+        * layout (frozenset): The flat indexes, x * 28 + y, of every tile holding a structure
+        * path_fields (:obj: PathFieldCache): The path fields of layout, carried over from turn to turn
+
+    """
+    def __init__(self, config, catalog=None):
+        self.config = config
+        self.catalog = catalog if catalog is not None else UnitCatalog.for_config(config)
+        self.turn_number = -1
+        self.last_diff = BoardDiff(-1)
+        self.last_message = None
+        self.unit_store = None
+        self.game_map = GameMap(config, self.catalog)
+        self.layout = frozenset()
+        self.path_fields = PathFieldCache()
+        self._threat_map = None
+        self._shield_map = None
+        self.__units = {}
+        self.__tiles = {}
+        self.__listeners = []
+
+    @property
+    def changed_tiles(self):
+        return self.last_diff.changed_tiles
+
+    @property
+    def threat_map(self):
+        if self._threat_map is None:
+            self._threat_map = ThreatMap(self)
+        return self._threat_map
+
+    @property
+    def shield_map(self):
+        if self._shield_map is None:
+            self._shield_map = ShieldMap(self)
+        return self._shield_map
+
+    def add_listener(self, callback):
+        """Registers a function to call with the BoardDiff after every applied message
+
+        Args:
+            callback: A function taking a single BoardDiff argument
+
+        """
+        self.__listeners.append(callback)
+
+    def apply(self, state):
+        """Updates the board to match a turn message
+
+        Args:
+            state: The turn message as a decoded json object, as passed to on_turn
+
+        Returns:
+            A BoardDiff describing what changed since the previous turn
+
+        """
+        unit_store = UnitStore(self.config, self.catalog)
+        unit_store.add_player_units(state["p1Units"], 0)
+        unit_store.add_player_units(state["p2Units"], 1)
+        diff = BoardDiff(int(state["turnInfo"][1]))
+
+        seen = set()
+        for row in range(len(unit_store)):
+            if not unit_store.is_stationary(row):
+                continue
+            key = self.__key(unit_store, row)
+            seen.add(key)
+            unit = self.__units.get(key)
+            if unit is None:
+                unit = unit_store.make_unit(row)
+                self.__units[key] = unit
+                self.__tiles[(unit.x, unit.y)] = unit
+                diff.added.append(unit)
+                continue
+
+            changed = False
+            if unit_store.upgraded[row] and not unit.upgraded:
+                unit.upgrade()
+                diff.upgraded.append(unit)
+                changed = True
+            pending_removal = bool(unit_store.pending_removal[row])
+            if pending_removal != unit.pending_removal:
+                unit.pending_removal = pending_removal
+                if pending_removal:
+                    diff.marked_for_removal.append(unit)
+                changed = True
+            if unit_store.health[row] != unit.health:
+                unit.health = unit_store.health[row]
+                diff.health_changed.append(unit)
+                changed = True
+            if changed:
+                diff.changed_tiles.add((unit.x, unit.y))
+
+        for key in [key for key in self.__units if key not in seen]:
+            unit = self.__units.pop(key)
+            location = (unit.x, unit.y)
+            if self.__tiles.get(location) is unit:
+                del self.__tiles[location]
+            diff.destroyed.append(unit)
+            diff.changed_tiles.add(location)
+
+        for unit in diff.added:
+            diff.changed_tiles.add((unit.x, unit.y))
+
+        # The influence maps follow game_map, and the path fields follow the layout, tile by tile
+        opened = []
+        closed = []
+        for location in diff.changed_tiles:
+            unit = self.__tiles.get(location)
+            self.game_map[location] = [unit] if unit is not None else []
+            index = location[0] * ARENA_SIZE + location[1]
+            if unit is None and index in self.layout:
+                opened.append(index)
+            elif unit is not None and index not in self.layout:
+                closed.append(index)
+        layout = self.layout
+        if opened:
+            layout, _ = self.path_fields.open_tiles(layout, opened)
+        if closed:
+            layout = self.path_fields.close_tiles(layout, closed)
+        self.layout = layout
+
+        self.unit_store = unit_store
+        self.last_message = state
+        self.turn_number = diff.turn_number
+        self.last_diff = diff
+        for callback in self.__listeners:
+            callback(diff)
+        return diff
+
+    def __key(self, unit_store, row):
+        """
+        Structures are tracked by engine unit id, falling back to owner, type and tile if there is no id.
+        """
+        unit_id = unit_store.unit_id[row]
+        if unit_id >= 0:
+            return unit_id
+        return (unit_store.player_index[row], unit_store.type_code[row], unit_store.x[row], unit_store.y[row])
+
+    def get_unit(self, unit_id):
+        """Gets a structure by its engine unit id
+
+        Args:
+            unit_id: The id the engine gave the structure
+
+        Returns:
+            The GameUnit for that structure, or None if it is not on the board
+
+        """
+        return self.__units.get(int(unit_id))
+
+    def unit_at(self, location):
+        """Gets the structure at a location
+
+        Args:
+            location: The location to check
+
+        Returns:
+            The GameUnit for the structure at that location, or None if there is none
+
+        """
+        return self.__tiles.get((location[0], location[1]))
+
+    def structures(self, player_index=None):
+        """Gets the structures on the board
+
+        Args:
+            player_index: The owner of the structures, 0 for you 1 for your opponent. Both players if None
+
+        Returns:
+            A list of GameUnits
+
+        """
+        return [unit for unit in self.__tiles.values() if player_index is None or unit.player_index == player_index]
@@ -0,0 +1,142 @@
+from collections import namedtuple
+from types import MappingProxyType
+
+
+UnitStats = namedtuple("UnitStats", [
+    "stationary", "speed", "damage_f", "damage_i", "attackRange", "shieldRange",
+    "max_health", "shieldPerUnit", "shieldBonusPerY", "cost"])
+UnitStats.__doc__ = """The values of a unit type, named like the matching GameUnit attributes. cost is a (SP, MP) tuple."""
+
+
+class UnitCatalog:
+    """The unit information from the game config, compiled once into constant time lookups.
+
+    A UnitCatalog is immutable and is meant to be built once per game, in AlgoCore.on_game_start,
+    and then shared by every GameState, GameMap and GameUnit of that game.
+
+    Attributes :
+        * WALL, SUPPORT, TURRET, SCOUT, DEMOLISHER, INTERCEPTOR, REMOVE, UPGRADE (str): The unit type shorthands
+        * UNIT_TYPE_TO_INDEX (mapping): Maps a unit type to its index in config["unitInformation"]
+        * shorthands (tuple): The unit types in config order
+        * STRUCTURE_TYPES (tuple): The structure unit types
+        * MOBILE_TYPES (tuple): The mobile unit types
+        * ALL_UNITS (tuple): Every unit type that can be spawned
+        * get_hit_radius (float): The radius within which a unit is hit by attacks
+        * max_attack_range (float): The largest attackRange of any unit, upgraded or not
+
+    """
+    __slots__ = ("WALL", "SUPPORT", "TURRET", "SCOUT", "DEMOLISHER", "INTERCEPTOR", "REMOVE", "UPGRADE",
+                 "UNIT_TYPE_TO_INDEX", "shorthands", "STRUCTURE_TYPES", "MOBILE_TYPES", "ALL_UNITS",
+                 "get_hit_radius", "max_attack_range", "_structures", "_costs", "_upgrade_costs",
+                 "_stats", "_upgraded_stats", "_upgradable", "_frozen")
+
+    _last_config = None
+    _last_catalog = None
+
+    def __init__(self, config):
+        """Compiles the catalog
+
+        Args:
+            config (JSON): Contains information about the game
+
+        """
+        unit_information = config["unitInformation"]
+        shorthands = tuple(unit_def["shorthand"] for unit_def in unit_information)
+        (self.WALL, self.SUPPORT, self.TURRET, self.SCOUT, self.DEMOLISHER,
+         self.INTERCEPTOR, self.REMOVE, self.UPGRADE) = shorthands[:8]
+        self.shorthands = shorthands
+        self.UNIT_TYPE_TO_INDEX = MappingProxyType({shorthand: index for index, shorthand in enumerate(shorthands)})
+        self.STRUCTURE_TYPES = (self.WALL, self.SUPPORT, self.TURRET)
+        self.MOBILE_TYPES = (self.SCOUT, self.DEMOLISHER, self.INTERCEPTOR)
+        self.ALL_UNITS = self.MOBILE_TYPES + self.STRUCTURE_TYPES
+        self._structures = frozenset(self.STRUCTURE_TYPES)
+        self.get_hit_radius = unit_information[0].get("getHitRadius", 0)
+
+        costs = {}
+        upgrade_costs = {}
+        stats = {}
+        upgraded_stats = {}
+        upgradable = set()
+        for unit_def in unit_information[:6]:
+            unit_type = unit_def["shorthand"]
+            upgrade = unit_def.get("upgrade")
+            base_cost = (unit_def.get("cost1", 0), unit_def.get("cost2", 0))
+            costs[unit_type] = base_cost
+            upgrade_costs[unit_type] = (
+                (upgrade or {}).get("cost1", base_cost[0]),
+                (upgrade or {}).get("cost2", base_cost[1]))
+            base = UnitStats(
+                stationary=unit_def.get("unitCategory") == 0,
+                speed=unit_def.get("speed", 0),
+                damage_f=unit_def.get("attackDamageTower", 0),
+                damage_i=unit_def.get("attackDamageWalker", 0),
+                attackRange=unit_def.get("attackRange", 0),
+                shieldRange=unit_def.get("shieldRange", 0),
+                max_health=unit_def.get("startHealth", 0),
+                shieldPerUnit=unit_def.get("shieldPerUnit", 0),
+                shieldBonusPerY=unit_def.get("shieldBonusPerY", 0),
+                cost=base_cost)
+            stats[unit_type] = base
+            upgrade = upgrade or {}
+            if unit_def.get("upgrade") is not None:
+                upgradable.add(unit_type)
+            upgraded_stats[unit_type] = base._replace(
+                speed=upgrade.get("speed", base.speed),
+                damage_f=upgrade.get("attackDamageTower", base.damage_f),
+                damage_i=upgrade.get("attackDamageWalker", base.damage_i),
+                attackRange=upgrade.get("attackRange", base.attackRange),
+                shieldRange=upgrade.get("shieldRange", base.shieldRange),
+                max_health=upgrade.get("startHealth", base.max_health),
+                shieldPerUnit=upgrade.get("shieldPerUnit", base.shieldPerUnit),
+                shieldBonusPerY=upgrade.get("shieldBonusPerY", base.shieldBonusPerY),
+                cost=(base_cost[0] + upgrade.get("cost1", 0), base_cost[1] + upgrade.get("cost2", 0)))
+        self._costs = MappingProxyType(costs)
+        self._upgrade_costs = MappingProxyType(upgrade_costs)
+        self._stats = MappingProxyType(stats)
+        self._upgraded_stats = MappingProxyType(upgraded_stats)
+        self._upgradable = frozenset(upgradable)
+        self.max_attack_range = max(
+            [unit_def.get("attackRange", 0) for unit_def in unit_information] +
+            [unit_def.get("upgrade", {}).get("attackRange", 0) for unit_def in unit_information])
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, "_frozen", False):
+            raise AttributeError("UnitCatalog is immutable")
+        object.__setattr__(self, name, value)
+
+    @classmethod
+    def for_config(cls, config):
+        """Gets a catalog for a config, reusing the last one compiled if it was made from the same config object
+
+        Args:
+            config (JSON): Contains information about the game
+
+        Returns:
+            A UnitCatalog for the config
+
+        """
+        if cls._last_config is not config:
+            cls._last_catalog = cls(config)
+            cls._last_config = config
+        return cls._last_catalog
+
+    def is_stationary(self, unit_type):
+        """Whether a unit type is a structure
+        """
+        return unit_type in self._structures
+
+    def can_upgrade(self, unit_type):
+        """Whether a unit type has an upgrade
+        """
+        return unit_type in self._upgradable
+
+    def cost(self, unit_type, upgrade=False):
+        """The (SP, MP) cost of spawning a unit type, or of upgrading it if upgrade is True
+        """
+        return self._upgrade_costs[unit_type] if upgrade else self._costs[unit_type]
+
+    def stats(self, unit_type, upgraded=False):
+        """The UnitStats of a unit type, upgraded or not
+        """
+        return self._upgraded_stats[unit_type] if upgraded else self._stats[unit_type]
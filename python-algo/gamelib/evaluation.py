@@ -0,0 +1,266 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from .catalog import UnitCatalog
+from .game_state import GameState
+from .shared_board import SharedBoard
+from .simulator import Simulator
+from .util import log, WARNING
+
+# The evaluation context of a worker process, created once by _initialize_worker
+_worker_context = None
+
+
+class EvaluationContext:
+    """What an evaluation task gets besides its own arguments.
+
+    One context lives in every worker process for the whole game, and one in the main process when
+    evaluations run inline. It holds the tables that are expensive to build, so tasks never rebuild them.
+
+    Attributes :
+        * config (JSON): Contains information about the game
+        * catalog (:obj: UnitCatalog): The compiled unit information of the game
+        * simulator (:obj: Simulator): A simulator whose path fields are kept between tasks
+        * shared_board (:obj: SharedBoard): In worker processes, the board snapshot shared by the main process. 
+          None when evaluating inline
+
+    """
+    def __init__(self, config, catalog=None, shared_board=None):
+        self.config = config
+        self.catalog = catalog if catalog is not None else UnitCatalog(config)
+        self.simulator = Simulator(config, self.catalog)
+        self.shared_board = shared_board
+        self._snapshot = None
+        self._generation = None
+        self._game_state = None
+
+    def game_state(self, snapshot):
+        """Decodes a snapshot made by GameState.to_bytes, reusing the last one if it did not change
+
+        The same GameState is shared by every task of a batch, so tasks must not modify it.
+        """
+        if snapshot != self._snapshot:
+            game_state = GameState.from_bytes(self.config, snapshot, catalog=self.catalog)
+            game_state.suppress_warnings(True)
+            self._snapshot = snapshot
+            self._generation = None
+            self._game_state = game_state
+        return self._game_state
+
+    def shared_game_state(self, generation):
+        """Decodes the board of the shared block, if it is still the given generation
+
+        Returns:
+            The GameState, shared by every task like game_state, or None if the main process wrote a newer board
+        """
+        if generation != self._generation:
+            snapshot = self.shared_board.snapshot(generation)
+            if snapshot is None:
+                return None
+            self.game_state(snapshot)
+            self._generation = generation
+        return self._game_state
+
+
+def _initialize_worker(config, board_name=None):
+    global _worker_context
+    shared_board = SharedBoard.attach(board_name) if board_name is not None else None
+    _worker_context = EvaluationContext(config, shared_board=shared_board)
+
+
+def _warm_up():
+    return os.getpid()
+
+
+def _run_chunk(task, board, chunk, deadline):
+    """
+    Runs task on each item of a chunk in a worker process. board is the generation of the shared board, or a
+    snapshot when the board did not fit in it. Items left when the deadline passes are skipped, so a straggling
+    chunk returns what it has instead of holding the worker into the next turn. Chunks that start after a newer
+    board was shared return nothing.
+    """
+    context = _worker_context
+    if isinstance(board, int):
+        game_state = context.shared_game_state(board)
+        if game_state is None:
+            return []
+    else:
+        game_state = context.game_state(board)
+    results = []
+    for item in chunk:
+        if deadline is not None and time.monotonic() >= deadline:
+            break
+        results.append(task(context, game_state, *item))
+    return results
+
+
+def simulate_task(context, game_state, deploys=(), enemy_deploys=()):
+    """An evaluation task that simulates the action phase, see Simulator.simulate
+    """
+    return context.simulator.simulate(game_state, deploys, enemy_deploys)
+
+
+def path_task(context, game_state, start_location, target_edge=None):
+    """An evaluation task that finds the path of a mobile unit, see GameState.find_path_to_edge
+    """
+    return game_state.find_path_to_edge(start_location, target_edge)
+
+
+class EvaluationService:
+    """Evaluates independent candidates in parallel on a pool of worker processes.
+
+    Workers are started by start, normally from AlgoCore.on_game_start, and each builds an EvaluationContext
+    once. The board snapshot is written once into a SharedBoard that workers map read-only, so only the generation
+    of the board and the small candidate tuples are sent to them. Each worker decodes a board once.
+    With 0 workers, or if the pool breaks, candidates are evaluated inline in the main process with the
+    same results.
+
+    A task is a function defined at module level, called as task(context, game_state, *item) for every item.
+    simulate_task and path_task are provided, and strategies can add their own scoring functions.
+
+    Attributes :
+        * workers (int): The number of worker processes, 0 to evaluate inline
+        * chunks_per_worker (int): How many pieces a batch is split into for each worker.
+          Smaller pieces spread work more evenly, larger ones cost less to send
+        * timed_out (int): The number of candidates that were not evaluated before their deadline, over the whole game
+
+    """
+    def __init__(self, config, workers=None, catalog=None):
+        """Sets up the service without starting any process
+
+        Args:
+            config (JSON): Contains information about the game
+            workers: The number of worker processes. None for one less than the number of cores
+            catalog: The UnitCatalog of the game, used when evaluating inline. Built from config if None
+
+        """
+        self.config = config
+        self.workers = max(0, (os.cpu_count() or 1) - 1) if workers is None else workers
+        self.chunks_per_worker = 4
+        self.timed_out = 0
+        self._catalog = catalog
+        self._executor = None
+        self._context = None
+        self._board = None
+        self._board_snapshot = None
+        self._board_generation = None
+
+    @property
+    def running(self):
+        """Whether the worker processes are up
+        """
+        return self._executor is not None
+
+    def start(self):
+        """Starts the worker processes and waits until each has loaded the config
+        """
+        if self.workers <= 0 or self._executor is not None:
+            return
+        try:
+            self._board = SharedBoard.create()
+            self._executor = ProcessPoolExecutor(self.workers, initializer=_initialize_worker, initargs=(self.config, self._board.name))
+            wait([self._executor.submit(_warm_up) for _ in range(self.workers)])
+        except (OSError, BrokenProcessPool) as error:
+            log(WARNING, "Could not start {} evaluation workers, evaluating inline: {}", self.workers, error)
+            self.shutdown()
+            self.workers = 0
+
+    def shutdown(self):
+        """Stops the worker processes, cancelling anything they have not started
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._board is not None:
+            self._board.close()
+            self._board = None
+            self._board_snapshot = None
+
+    def evaluate(self, task, game_state, items, timeout=None):
+        """Evaluates a task for every item, in parallel when workers are running
+
+        Args:
+            task: A module level function called as task(context, game_state, *item)
+            game_state: The GameState every item is evaluated on. It is not modified
+            items: A list of argument tuples, one per candidate
+            timeout: The number of seconds to wait for results, None to wait for all of them
+
+        Returns:
+            A list with the result of each item, in order. Items that were not evaluated in time are None.
+            An exception raised by the task is raised again here
+
+        """
+        items = [tuple(item) for item in items]
+        results = [None] * len(items)
+        if not items:
+            return results
+        deadline = None if timeout is None else time.monotonic() + timeout
+        evaluated = None
+        if self._executor is not None:
+            try:
+                evaluated = self.__evaluate_in_pool(task, self.__share(game_state), items, deadline, results)
+            except BrokenProcessPool as error:
+                log(WARNING, "Evaluation workers stopped, evaluating inline from now on: {}", error)
+                self.shutdown()
+                self.workers = 0
+        if evaluated is None:
+            evaluated = self.__evaluate_inline(task, game_state, items, deadline, results)
+        self.timed_out += len(items) - evaluated
+        return results
+
+    def simulate(self, game_state, scenarios, timeout=None):
+        """Simulates many (deploys, enemy_deploys) scenarios, see Simulator.simulate
+
+        Returns:
+            A list with the SimulationResult of each scenario, None for those not simulated in time
+
+        """
+        return self.evaluate(simulate_task, game_state, scenarios, timeout)
+
+    def __evaluate_inline(self, task, game_state, items, deadline, results):
+        """
+        Helper function for evaluate, runs the items in the main process until the deadline.
+        Fills results in place and returns the number of items evaluated.
+        """
+        if self._context is None:
+            self._context = EvaluationContext(self.config, self._catalog)
+        for index, item in enumerate(items):
+            if deadline is not None and time.monotonic() >= deadline:
+                return index
+            results[index] = task(self._context, game_state, *item)
+        return len(items)
+
+    def __share(self, game_state):
+        """
+        Helper function for evaluate, writes the board to the shared block unless it is already there.
+        Returns what workers need to find the board: its generation, or the snapshot itself if it does not fit.
+        """
+        snapshot = game_state.to_bytes()
+        if snapshot != self._board_snapshot:
+            self._board_generation = self._board.write(game_state, snapshot)
+            self._board_snapshot = snapshot
+        return self._board_generation if self._board_generation is not None else snapshot
+
+    def __evaluate_in_pool(self, task, board, items, deadline, results):
+        """
+        Helper function for evaluate, splits the items into chunks and collects them until the deadline.
+        Chunks that are not done by then are cancelled and their items count as not evaluated.
+        Fills results in place and returns the number of items evaluated.
+        """
+        chunk_size = max(1, -(-len(items) // (self.workers * self.chunks_per_worker)))
+        futures = [self._executor.submit(_run_chunk, task, board, items[start:start + chunk_size], deadline)
+                   for start in range(0, len(items), chunk_size)]
+        timeout = None if deadline is None else max(0, deadline - time.monotonic())
+        done, pending = wait(futures, timeout)
+        for future in pending:
+            future.cancel()
+        evaluated = 0
+        for index, future in enumerate(futures):
+            if future in done:
+                chunk_results = future.result()
+                start = index * chunk_size
+                results[start:start + len(chunk_results)] = chunk_results
+                evaluated += len(chunk_results)
+        return evaluated
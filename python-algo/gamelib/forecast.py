@@ -0,0 +1,146 @@
+class ResourceForecast:
+    """Projects future MP and SP for both players over every horizon.
+
+    The MP income of every future turn is computed once from config["resources"], following the
+    bitDecayPerRound, bitsPerRound, bitGrowthRate and turnIntervalForBitSchedule rules and rounding
+    to one decimal each turn like GameState.project_future_MP. Whole curves are cached by their starting
+    value, so asking for many horizons, or for "what if I spend X now", only walks the curve once per
+    distinct starting value.
+
+    SP income is coresPerRound each turn. Supports add the generatesResource1 (SP) and generatesResource2 (MP)
+    values of their unit information, using the upgraded values for upgraded supports.
+
+    Attributes :
+        * turn_number (int): The turn the forecast starts from
+        * support_income (list): For each player, the [SP, MP] their supports generate each turn
+
+    """
+    MAX_HORIZON = 99
+
+    def __init__(self, config, turn_number, support_income=None):
+        """Precomputes the income tables
+
+        Args:
+            config (JSON): Contains information about the game
+            turn_number: The current turn number
+            support_income: For each player, the [SP, MP] their supports generate each turn. None for no supports
+
+        """
+        resources = config["resources"]
+        self.turn_number = turn_number
+        self.support_income = support_income if support_income is not None else [[0, 0], [0, 0]]
+        self._decay = 1 - resources["bitDecayPerRound"]
+        self._bits_per_round = resources["bitsPerRound"]
+        self._bit_growth_rate = resources["bitGrowthRate"]
+        self._bit_schedule_interval = resources["turnIntervalForBitSchedule"]
+        self._SP_per_round = resources.get("coresPerRound", 0)
+        self._MP_income = [0]
+        self.__extend_income(self.MAX_HORIZON)
+        self.__MP_curves = {}
+
+    @staticmethod
+    def support_income_of(config, structures):
+        """Totals the resources generated by supports
+
+        Args:
+            config (JSON): Contains information about the game
+            structures: An iterable of (x, y, unit_type, player_index, upgraded), such as GameMap.iter_structures()
+
+        Returns:
+            For each player, the [SP, MP] their supports generate each turn
+
+        """
+        generated = {}
+        for unit_def in config["unitInformation"]:
+            upgrade = unit_def.get("upgrade", {})
+            SP, MP = unit_def.get("generatesResource1", 0), unit_def.get("generatesResource2", 0)
+            if SP or MP or upgrade.get("generatesResource1", 0) or upgrade.get("generatesResource2", 0):
+                generated[unit_def["shorthand"]] = [
+                    (SP, MP),
+                    (upgrade.get("generatesResource1", SP), upgrade.get("generatesResource2", MP))]
+        income = [[0, 0], [0, 0]]
+        for _, _, unit_type, player_index, upgraded in structures:
+            values = generated.get(unit_type)
+            if values is not None:
+                SP, MP = values[1 if upgraded else 0]
+                income[player_index][0] += SP
+                income[player_index][1] += MP
+        return income
+
+    def __extend_income(self, horizon):
+        """
+        Fills self._MP_income[h] with the MP gained on the h-th turn from now, up to horizon.
+        """
+        for increment in range(len(self._MP_income), horizon + 1):
+            current_turn = self.turn_number + increment
+            MP_ramp_ups = current_turn // self._bit_schedule_interval
+            self._MP_income.append(self._bits_per_round + (self._bit_growth_rate * MP_ramp_ups))
+
+    def MP_curve(self, current_MP, player_index=0, horizon=MAX_HORIZON, include_supports=True):
+        """Projects MP over every horizon at once
+
+        Args:
+            current_MP: The MP held now
+            player_index: The player whose supports are counted, 0 for you 1 for your opponent
+            horizon: The last turn of the curve
+            include_supports: If False, MP generated by supports is ignored
+
+        Returns:
+            A list whose entry h is the MP held h turns from now. Do not modify it, it is shared by later queries
+
+        """
+        support_MP = self.support_income[player_index][1] if include_supports else 0
+        key = (current_MP, support_MP)
+        curve = self.__MP_curves.get(key)
+        if curve is None:
+            curve = [current_MP]
+            self.__MP_curves[key] = curve
+        if len(curve) <= horizon:
+            if len(self._MP_income) <= horizon:
+                self.__extend_income(horizon)
+            MP = curve[-1]
+            decay = self._decay
+            income = self._MP_income
+            for increment in range(len(curve), horizon + 1):
+                MP *= decay
+                MP += income[increment]
+                if support_MP:
+                    MP += support_MP
+                MP = round(MP, 1)
+                curve.append(MP)
+        return curve
+
+    def project_MP(self, current_MP, turns_in_future=1, player_index=0, spend=0, include_supports=True):
+        """Projects the MP a player will hold after some turns
+
+        Args:
+            current_MP: The MP held now
+            turns_in_future: The number of turns to look ahead
+            player_index: The player whose supports are counted, 0 for you 1 for your opponent
+            spend: MP spent this turn before the projection starts
+            include_supports: If False, MP generated by supports is ignored
+
+        Returns:
+            The projected MP
+
+        """
+        if turns_in_future < 1:
+            return current_MP - spend
+        return self.MP_curve(current_MP - spend, player_index, turns_in_future, include_supports)[turns_in_future]
+
+    def project_SP(self, current_SP, turns_in_future=1, player_index=0, spend=0, include_supports=True):
+        """Projects the SP a player will hold after some turns
+
+        Args:
+            current_SP: The SP held now
+            turns_in_future: The number of turns to look ahead
+            player_index: The player whose supports are counted, 0 for you 1 for your opponent
+            spend: SP spent this turn before the projection starts
+            include_supports: If False, SP generated by supports is ignored
+
+        Returns:
+            The projected SP
+
+        """
+        per_round = self._SP_per_round + (self.support_income[player_index][0] if include_supports else 0)
+        return current_SP - spend + per_round * turns_in_future
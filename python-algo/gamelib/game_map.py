@@ -1,6 +1,7 @@
 import math
 from .unit import GameUnit
-from .util import debug_write
+from .catalog import UnitCatalog
+from .util import log, WARNING
 
 class GameMap:
     """Holds data about the current game map and provides functions
@@ -11,6 +12,7 @@ class GameMap:
 
     Attributes :
         * config (JSON): Contains information about the current game rules
+        * catalog (:obj: UnitCatalog): The compiled unit information of the game
         * enable_warnings (bool): If true, debug messages for game_map functions will print out
         * ARENA_SIZE (int): The size of the arena.
         * HALF_ARENA (int): Half of the size of the arena.
@@ -20,14 +22,16 @@ class GameMap:
         * BOTTOM_RIGHT (int): A constant that represents the bottom right edge
 
     """
-    def __init__(self, config):
+    def __init__(self, config, catalog=None):
         """Initializes constants and game map
 
         Args:
             config (JSON): Contains information about the game
+            catalog (:obj: UnitCatalog): The compiled unit information of the game. Compiled from config if None
 
         """
         self.config = config
+        self.catalog = catalog if catalog is not None else UnitCatalog.for_config(config)
         self.enable_warnings = True
         self.ARENA_SIZE = 28
         self.HALF_ARENA = int(self.ARENA_SIZE / 2)
@@ -37,16 +41,23 @@ class GameMap:
         self.BOTTOM_RIGHT = 3
         self.__map = self.__empty_grid()
         self.__start = [13,0]
+        self.__unit_store = None
+        self.__pending = set()
+        self.__listeners = []
     
     def __getitem__(self, location):
         if len(location) == 2 and self.in_arena_bounds(location):
             x,y = location
+            if self.__pending and (x, y) in self.__pending:
+                self.__materialize(x, y)
             return self.__map[x][y]
         self._invalid_coordinates(location)
 
     def __setitem__(self, location, val):
         if type(location) == tuple and len(location) == 2 and self.in_arena_bounds(location):
+            self.__pending.discard(location)
             self.__map[location[0]][location[1]] = val
+            self.mark_changed(location)
             return
         self._invalid_coordinates(location)
 
@@ -75,8 +86,84 @@ class GameMap:
                 grid[x].append([])
         return grid
 
+    def attach_unit_store(self, unit_store):
+        """Fills the map from a UnitStore without creating any GameUnits yet.
+
+        The GameUnits on a tile are created the first time that tile is indexed with game_map[x, y].
+
+        Args:
+            unit_store: A UnitStore holding the units to place on the map
+
+        """
+        self.__unit_store = unit_store
+        self.__pending = set(unit_store.tiles())
+
+    def add_listener(self, callback):
+        """Registers a function to call whenever the structures on a tile may have changed
+
+        Args:
+            callback: A function taking the x and y coordinates of the changed tile
+
+        """
+        self.__listeners.append(callback)
+
+    def mark_changed(self, location):
+        """Tells listeners that the structures at a location changed.
+        Called by add_unit, remove_unit and item assignment. Call it yourself after changing a unit in place, like upgrading it.
+
+        Args:
+            location: The location that changed
+
+        """
+        for callback in self.__listeners:
+            callback(location[0], location[1])
+
+    def iter_structures(self):
+        """Iterates over every structure on the map without creating GameUnits for tiles that were not accessed yet
+
+        Returns:
+            An iterator of (x, y, unit_type, player_index, upgraded) tuples
+
+        """
+        store = self.__unit_store
+        pending = self.__pending
+        for x, column in enumerate(self.__map):
+            for y, units in enumerate(column):
+                if (x, y) in pending:
+                    for row in store.rows_at(x, y):
+                        if store.is_stationary(row):
+                            yield x, y, store.unit_type(row), store.player_index[row], bool(store.upgraded[row])
+                    continue
+                for unit in units:
+                    if unit.stationary:
+                        yield x, y, unit.unit_type, unit.player_index, unit.upgraded
+
+    def iter_units(self):
+        """Iterates over every unit on the map without creating GameUnits for tiles that were not accessed yet
+
+        Returns:
+            An iterator of (x, y, unit_type, player_index, health, upgraded, pending_removal) tuples
+
+        """
+        store = self.__unit_store
+        pending = self.__pending
+        for x, column in enumerate(self.__map):
+            for y, units in enumerate(column):
+                if (x, y) in pending:
+                    for row in store.rows_at(x, y):
+                        yield (x, y, store.unit_type(row), store.player_index[row], store.health[row],
+                               bool(store.upgraded[row]), bool(store.pending_removal[row]))
+                    continue
+                for unit in units:
+                    yield x, y, unit.unit_type, unit.player_index, unit.health, unit.upgraded, unit.pending_removal
+
+    def __materialize(self, x, y):
+        self.__pending.discard((x, y))
+        store = self.__unit_store
+        self.__map[x][y].extend(store.make_unit(row) for row in store.rows_at(x, y))
+
     def _invalid_coordinates(self, location):
-        self.warn("{} is out of bounds.".format(str(location)))
+        self.warn("{} is out of bounds.", location)
 
     def in_arena_bounds(self, location):
         """Checks if the given location is inside the diamond shaped game board.
@@ -114,7 +201,7 @@ class GameMap:
 
         """
         if not quadrant_description in [self.TOP_LEFT, self.TOP_RIGHT, self.BOTTOM_LEFT, self.BOTTOM_RIGHT]:
-            self.warn("Passed invalid quadrant_description '{}'. See the documentation for valid inputs for get_edge_locations.".format(quadrant_description))
+            self.warn("Passed invalid quadrant_description '{}'. See the documentation for valid inputs for get_edge_locations.", quadrant_description)
             return
 
         edges = self.get_edges()
@@ -149,13 +236,14 @@ class GameMap:
             bottom_right.append([int(x), int(y)])
         return [top_right, top_left, bottom_left, bottom_right]
     
-    def add_unit(self, unit_type, location, player_index=0):
+    def add_unit(self, unit_type, location, player_index=0, count=1):
         """Add a single GameUnit to the map at the given location.
 
         Args:
             unit_type: The type of the new unit. Use the constants provided in algo_strategy.
             location: A list of two integers representing the [x,y] coordinate of the new unit
             player_index: The index corresponding to the player controlling the new unit, 0 for you 1 for the enemy
+            count: The number of mobile units to add at once. Ignored for structures, which do not stack
 
         This function does not affect your turn and only changes the data stored in GameMap. The intended use of this function
         is to allow you to create arbitrary gamestates. Using this function on the game_map provided with game_state will 
@@ -164,14 +252,19 @@ class GameMap:
         if not self.in_arena_bounds(location):
             self._invalid_coordinates(location)
         if player_index < 0 or player_index > 1:
-            self.warn("Player index {} is invalid. Player index should be 0 or 1.".format(player_index))
+            self.warn("Player index {} is invalid. Player index should be 0 or 1.", player_index)
 
         x, y = location
-        new_unit = GameUnit(unit_type, self.config, player_index, None, location[0], location[1])
+        if (x, y) in self.__pending:
+            self.__materialize(x, y)
+        new_unit = GameUnit(unit_type, self.config, player_index, None, location[0], location[1], self.catalog)
         if not new_unit.stationary:
             self.__map[x][y].append(new_unit)
+            for _ in range(count - 1):
+                self.__map[x][y].append(GameUnit(unit_type, self.config, player_index, None, x, y, self.catalog))
         else:
             self.__map[x][y] = [new_unit]
+            self.mark_changed(location)
 
     def remove_unit(self, location):
         """Remove all units on the map in the given location.
@@ -186,7 +279,9 @@ class GameMap:
             self._invalid_coordinates(location)
         
         x, y = location
+        self.__pending.discard((x, y))
         self.__map[x][y] = []
+        self.mark_changed(location)
 
     def get_locations_in_range(self, location, radius):
         """Gets locations in a circular area around a location
@@ -200,14 +295,14 @@ class GameMap:
 
         """
         if radius < 0 or radius > self.ARENA_SIZE:
-            self.warn("Radius {} was passed to get_locations_in_range. Expected integer between 0 and {}".format(radius, self.ARENA_SIZE))
+            self.warn("Radius {} was passed to get_locations_in_range. Expected integer between 0 and {}", radius, self.ARENA_SIZE)
         if not self.in_arena_bounds(location):
             self._invalid_coordinates(location)
 
         x, y = location
         locations = []
         search_radius = math.ceil(radius)
-        getHitRadius = self.config["unitInformation"][0]['getHitRadius']
+        getHitRadius = self.catalog.get_hit_radius
         for i in range(int(x - search_radius), int(x + search_radius + 1)):
             for j in range(int(y - search_radius), int(y + search_radius + 1)):
                 new_location = [i, j]
@@ -232,9 +327,10 @@ class GameMap:
 
         return math.sqrt((x1 - x2)**2 + (y1 - y2)**2)
 
-    def warn(self, message):
+    def warn(self, message, *args):
         """
-        Used internally by game_map to print out default messaging
+        Used internally by game_map to print out default messaging. 
+        message is only formatted with args if warnings are enabled, see gamelib.log
         """
         if(self.enable_warnings):
-            debug_write(message)
+            log(WARNING, message, *args)
@@ -1,11 +1,46 @@
 import math
 import json
+import struct
 import sys
+import threading
 
 from .navigation import ShortestPathFinder
-from .util import send_command, debug_write
+from .util import send_command, log, log_enabled, WARNING
 from .unit import GameUnit
 from .game_map import GameMap
+from .unit_store import UnitStore
+from .catalog import UnitCatalog
+from .influence import ThreatMap, ShieldMap, IN_BOUNDS, reach_offsets, integrate_path
+from .forecast import ResourceForecast
+
+_bound_catalog = None
+
+# Held while a turn is sent, so a TurnPlanner watchdog and on_turn never both send one
+_submit_lock = threading.Lock()
+
+# Layout of GameState.to_bytes: a header, both players' stats, then fixed size structure and mobile stack records
+_SNAPSHOT_MAGIC = b"TGS"
+_SNAPSHOT_VERSION = 1
+_SNAPSHOT_HEADER = struct.Struct("<3sBbHhHH")   # magic, version, phase, turn, frame, structure count, stack count
+_SNAPSHOT_STATS = struct.Struct("<8d")          # health, SP, MP, time for you, then for your opponent
+_SNAPSHOT_STRUCTURE = struct.Struct("<BBBBd")   # x, y, type index, flags (owner, upgraded << 1, pending removal << 2), health
+_SNAPSHOT_STACK = struct.Struct("<BBBBHd")      # x, y, type index, owner, count, health
+
+def _bind_unit_constants(catalog):
+    """
+    Sets the module level unit constants from a catalog.
+    Only rebinds them when the catalog changes, which is once per game.
+    """
+    global _bound_catalog, WALL, SUPPORT, TURRET, SCOUT, DEMOLISHER, INTERCEPTOR, REMOVE, UPGRADE, STRUCTURE_TYPES, ALL_UNITS, UNIT_TYPE_TO_INDEX
+    if _bound_catalog is catalog:
+        return
+    WALL, SUPPORT, TURRET = catalog.WALL, catalog.SUPPORT, catalog.TURRET
+    SCOUT, DEMOLISHER, INTERCEPTOR = catalog.SCOUT, catalog.DEMOLISHER, catalog.INTERCEPTOR
+    REMOVE, UPGRADE = catalog.REMOVE, catalog.UPGRADE
+    UNIT_TYPE_TO_INDEX = dict(catalog.UNIT_TYPE_TO_INDEX)
+    ALL_UNITS = list(catalog.ALL_UNITS)
+    STRUCTURE_TYPES = list(catalog.STRUCTURE_TYPES)
+    _bound_catalog = catalog
 
 def is_stationary(unit_type):
     """
@@ -15,7 +50,7 @@ def is_stationary(unit_type):
         Returns: 
             Boolean, True if the unit is stationary, False otherwise.
     """
-    return unit_type in STRUCTURE_TYPES
+    return _bound_catalog.is_stationary(unit_type)
 
 class GameState:
     """Represents the entire gamestate for a given turn
@@ -32,6 +67,7 @@ class GameState:
         * REMOVE (str): A constant representing removing your own unit
         * UPGRADE (str): A constant representing upgrading a unit
         * STRUCTURE_TYPES (list): A list of the structure units
+        * catalog (:obj: UnitCatalog): The compiled unit information used for costs and unit values
 
         * ARENA_SIZE (int): The size of the arena
         * HALF_ARENA (int): Half the size of the arena
@@ -39,47 +75,48 @@ class GameState:
         * SP (int): A constant representing the SP resource, used in the get_resource function
          
         * game_map (:obj: GameMap): The current GameMap. To retrieve a list of GameUnits at a location, use game_map[x, y]
+        * unit_store (:obj: UnitStore): The units at the start of this turn as parallel arrays, for bulk analysis without creating GameUnits
+        * threat_map (:obj: ThreatMap): Attacker counts and damage per frame on each tile for each player's mobile units. Built on first access
+        * shield_map (:obj: ShieldMap): Shield from friendly supports on each tile for each player's mobile units. Built on first access
+        * resource_forecast (:obj: ResourceForecast): Projected MP and SP for both players over every horizon. Built on first access
         * turn_number (int): The current turn number. Starts at 0.
         * my_health (int): Your current remaining health
         * my_time (int): The time you took to submit your previous turn
         * enemy_health (int): Your opponents current remaining health
         * enemy_time (int): Your opponents current remaining time
+        * submitted (bool): Whether submit_turn already sent this turn
 
     """
 
-    def __init__(self, config, serialized_string):
+    def __init__(self, config, serialized_string, lazy=False, catalog=None, board=None):
         """ Setup a turns variables using arguments passed
 
         Args:
             * config (JSON): A json object containing information about the game
-            * serialized_string (string): A string containing information about the game state at the start of this turn
+            * serialized_string (string or dict): The game state at the start of this turn, either as the json string 
+              sent by the engine or as the already decoded json object passed to on_turn by AlgoCore
+            * lazy (bool): If True, only resources, health, time and turn number are parsed immediately. 
+              The game_map, unit_store and path finder are built the first time they are used.
+            * catalog (:obj: UnitCatalog): The compiled unit information of the game, usually AlgoCore.catalog. 
+              Compiled from config if None.
+            * board (:obj: BoardModel): A BoardModel last updated with serialized_string, usually AlgoCore.board. 
+              Its units, influence maps and path fields are reused instead of being built again. None to build everything
 
         """
-        self.serialized_string = serialized_string
+        if isinstance(serialized_string, str):
+            self._serialized_string = serialized_string
+            self._state = json.loads(serialized_string)
+        else:
+            self._serialized_string = None
+            self._state = serialized_string
+        if board is not None and board.last_message is not self._state:
+            raise ValueError("The board was not last updated with this game state")
         self.config = config
         self.enable_warnings = True
+        self._board = board
 
-        global WALL, SUPPORT, TURRET, SCOUT, DEMOLISHER, INTERCEPTOR, REMOVE, UPGRADE, STRUCTURE_TYPES, ALL_UNITS, UNIT_TYPE_TO_INDEX
-        UNIT_TYPE_TO_INDEX = {}
-        WALL = config["unitInformation"][0]["shorthand"]
-        UNIT_TYPE_TO_INDEX[WALL] = 0
-        SUPPORT = config["unitInformation"][1]["shorthand"]
-        UNIT_TYPE_TO_INDEX[SUPPORT] = 1
-        TURRET = config["unitInformation"][2]["shorthand"]
-        UNIT_TYPE_TO_INDEX[TURRET] = 2
-        SCOUT = config["unitInformation"][3]["shorthand"]
-        UNIT_TYPE_TO_INDEX[SCOUT] = 3
-        DEMOLISHER = config["unitInformation"][4]["shorthand"]
-        UNIT_TYPE_TO_INDEX[DEMOLISHER] = 4
-        INTERCEPTOR = config["unitInformation"][5]["shorthand"]
-        UNIT_TYPE_TO_INDEX[INTERCEPTOR] = 5
-        REMOVE = config["unitInformation"][6]["shorthand"]
-        UNIT_TYPE_TO_INDEX[REMOVE] = 6
-        UPGRADE = config["unitInformation"][7]["shorthand"]
-        UNIT_TYPE_TO_INDEX[UPGRADE] = 7
-
-        ALL_UNITS = [SCOUT, DEMOLISHER, INTERCEPTOR, WALL, SUPPORT, TURRET]
-        STRUCTURE_TYPES = [WALL, SUPPORT, TURRET]
+        self.catalog = catalog if catalog is not None else UnitCatalog.for_config(config)
+        _bind_unit_constants(self.catalog)
 
         self.ARENA_SIZE = 28
         self.HALF_ARENA = int(self.ARENA_SIZE / 2)
@@ -89,21 +126,188 @@ class GameState:
         MP = self.MP
         SP = self.SP
 
-        self.game_map = GameMap(self.config)
-        self._shortest_path_finder = ShortestPathFinder()
+        self._game_map = None
+        self._unit_store = None
+        self._threat_map = None
+        self._shield_map = None
+        self._resource_forecast = None
+        self.__forecast_map = None
+        self.__shortest_path_finder = None
+        self.__board_unchanged = False
+        self.__blocked = None
+        self.__layout = None
         self._build_stack = []
         self._deploy_stack = []
+        self.submitted = False
+        self._journal = None
         self._player_resources = [
                 {'SP': 0, 'MP': 0},  # player 0, which is you
                 {'SP': 0, 'MP': 0}]  # player 1, which is the opponent
-        self.__parse_state(serialized_string)
+        self.__parse_state(self._state)
+        if not lazy:
+            self.__build_map()
+
+    @property
+    def game_map(self):
+        """The current GameMap, built from the game state on first access in lazy mode
+        """
+        if self._game_map is None:
+            self.__build_map()
+        return self._game_map
+
+    @game_map.setter
+    def game_map(self, game_map):
+        self._game_map = game_map
+        self._board = None
+        self._threat_map = None
+        self._shield_map = None
+        self._resource_forecast = None
+
+    @property
+    def resource_forecast(self):
+        """The ResourceForecast for this turn, built on first access. 
+        It is rebuilt after structures change, since new supports change future income.
+        """
+        if self._resource_forecast is None:
+            game_map = self.game_map
+            support_income = ResourceForecast.support_income_of(self.config, game_map.iter_structures())
+            self._resource_forecast = ResourceForecast(self.config, self.turn_number, support_income)
+            if self.__forecast_map is not game_map:
+                game_map.add_listener(self.__reset_resource_forecast)
+                self.__forecast_map = game_map
+        return self._resource_forecast
+
+    def __reset_resource_forecast(self, x, y):
+        self._resource_forecast = None
+
+    @property
+    def threat_map(self):
+        """The ThreatMap of the current game_map, built on first access and kept up to date as the map changes
+        """
+        if self._threat_map is None:
+            if self._game_map is None:
+                self.__build_map()
+            self._threat_map = self._board.threat_map.copy(self) if self.__board_unchanged else ThreatMap(self)
+        return self._threat_map
+
+    @property
+    def shield_map(self):
+        """The ShieldMap of the current game_map, built on first access and kept up to date as the map changes
+        """
+        if self._shield_map is None:
+            if self._game_map is None:
+                self.__build_map()
+            self._shield_map = self._board.shield_map.copy(self) if self.__board_unchanged else ShieldMap(self)
+        return self._shield_map
+
+    @property
+    def unit_store(self):
+        """The units at the start of this turn as a UnitStore, built from the game state on first access in lazy mode
+        """
+        if self._unit_store is None:
+            self.__build_unit_store()
+        return self._unit_store
+
+    @property
+    def _shortest_path_finder(self):
+        if self.__shortest_path_finder is None:
+            self.__shortest_path_finder = ShortestPathFinder()
+        return self.__shortest_path_finder
+
+    @property
+    def serialized_string(self):
+        """The game state this GameState was created from as a json string.
+        Only encoded on first access if the GameState was created from an already decoded json object.
+        """
+        if self._serialized_string is None:
+            self._serialized_string = json.dumps(self._state)
+        return self._serialized_string
 
-    def __parse_state(self, state_line):
+    def to_bytes(self):
+        """Encodes the current game state in a compact fixed layout binary format.
+
+        The snapshot holds the turn number, health, time and current resources of both players, every structure 
+        and every stack of identical mobile units on the game_map, including changes made this turn by 
+        attempt_spawn, attempt_upgrade or direct game_map edits. Engine unit ids are not kept.
+        Use GameState.from_bytes to decode it.
+
+        Returns:
+            The snapshot as bytes
+
+        """
+        catalog = self.catalog
+        type_index = catalog.UNIT_TYPE_TO_INDEX
+        structures = []
+        stacks = {}
+        for x, y, unit_type, player_index, health, upgraded, pending_removal in self.game_map.iter_units():
+            if catalog.is_stationary(unit_type):
+                flags = player_index | (upgraded << 1) | (pending_removal << 2)
+                structures.append(_SNAPSHOT_STRUCTURE.pack(x, y, type_index[unit_type], flags, health))
+            else:
+                key = (x, y, type_index[unit_type], player_index, health)
+                stacks[key] = stacks.get(key, 0) + 1
+
+        turn_info = self._state["turnInfo"]
+        frame = int(turn_info[2]) if len(turn_info) > 2 else -1
+        header = _SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, _SNAPSHOT_VERSION, int(turn_info[0]), self.turn_number, frame, len(structures), len(stacks))
+        my_resources, enemy_resources = self._player_resources
+        stats = _SNAPSHOT_STATS.pack(
+            self.my_health, my_resources['SP'], my_resources['MP'], self.my_time,
+            self.enemy_health, enemy_resources['SP'], enemy_resources['MP'], self.enemy_time)
+        records = [header, stats]
+        records.extend(structures)
+        records.extend(_SNAPSHOT_STACK.pack(x, y, type_code, player_index, count, health)
+                       for (x, y, type_code, player_index, health), count in stacks.items())
+        return b"".join(records)
+
+    @classmethod
+    def from_bytes(cls, config, data, lazy=False, catalog=None):
+        """Creates a GameState from a snapshot made by GameState.to_bytes, without going through json.
+
+        Args:
+            * config (JSON): A json object containing information about the game
+            * data (bytes): The snapshot
+            * lazy (bool): Passed on to GameState
+            * catalog (:obj: UnitCatalog): Passed on to GameState
+
+        Returns:
+            A new GameState
+
+        """
+        magic, version, phase, turn, frame, structure_count, stack_count = _SNAPSHOT_HEADER.unpack_from(data, 0)
+        if magic != _SNAPSHOT_MAGIC or version != _SNAPSHOT_VERSION:
+            raise ValueError("Not a GameState snapshot, or made by another version of GameState.to_bytes")
+        offset = _SNAPSHOT_HEADER.size
+        stats = _SNAPSHOT_STATS.unpack_from(data, offset)
+        offset += _SNAPSHOT_STATS.size
+
+        type_count = len(config["unitInformation"])
+        remove_index, upgrade_index = UnitStore.REMOVE_INDEX, UnitStore.UPGRADE_INDEX
+        units = ([[] for _ in range(type_count)], [[] for _ in range(type_count)])
+        for x, y, type_code, flags, health in _SNAPSHOT_STRUCTURE.iter_unpack(data[offset:offset + structure_count * _SNAPSHOT_STRUCTURE.size]):
+            player_units = units[flags & 1]
+            player_units[type_code].append([x, y, health, -1])
+            if flags & 2:
+                player_units[upgrade_index].append([x, y, health, -1])
+            if flags & 4:
+                player_units[remove_index].append([x, y, health, -1])
+        offset += structure_count * _SNAPSHOT_STRUCTURE.size
+        for x, y, type_code, player_index, count, health in _SNAPSHOT_STACK.iter_unpack(data[offset:offset + stack_count * _SNAPSHOT_STACK.size]):
+            units[player_index][type_code].extend([x, y, health, -1] for _ in range(count))
+
+        state = {
+            "turnInfo": [phase, turn, frame],
+            "p1Stats": list(stats[:4]),
+            "p2Stats": list(stats[4:]),
+            "p1Units": units[0],
+            "p2Units": units[1]}
+        return cls(config, state, lazy, catalog)
+
+    def __parse_state(self, state):
         """
-        Fills in map based on the serialized game state so that self.game_map[x,y] is a list of GameUnits at that location.
-        state_line is the game state as a json string.
+        Reads the turn number, health, time and resources from the game state.
+        state is the game state as a decoded json object.
         """
-        state = json.loads(state_line)
 
         turn_info = state["turnInfo"]
         self.turn_number = int(turn_info[1])
@@ -120,37 +324,52 @@ class GameState:
             {'SP': p1_SP, 'MP': p1_MP},
             {'SP': p2_SP, 'MP': p2_MP}]
 
-        p1units = state["p1Units"]
-        p2units = state["p2Units"]
-
-        self.__create_parsed_units(p1units, 0)
-        self.__create_parsed_units(p2units, 1)
-
-    def __create_parsed_units(self, units, player_number):
-        """
-        Helper function for __parse_state to add units to the map.
-        """
-        typedef = self.config.get("unitInformation")
-        for i, unit_types in enumerate(units):
-            for uinfo in unit_types:
-                unit_type = typedef[i].get("shorthand")
-                sx, sy, shp = uinfo[:3]
-                x, y = map(int, [sx, sy])
-                hp = float(shp)
-                # This depends on RM and UP always being the last types to be processed
-                if unit_type == REMOVE:
-                    # Quick fix will deploy engine fix soon
-                    if self.contains_stationary_unit([x,y]):
-                        self.game_map[x,y][0].pending_removal = True
-                elif unit_type == UPGRADE:
-                    if self.contains_stationary_unit([x,y]):
-                        self.game_map[x,y][0].upgrade()
-                else:
-                    unit = GameUnit(unit_type, self.config, player_number, hp, x, y)
-                    self.game_map[x,y].append(unit)
+    def __build_unit_store(self):
+        """
+        Fills self.unit_store with the units of the game state.
+        """
+        if self._board is not None:
+            self._unit_store = self._board.unit_store
+            return
+        unit_store = UnitStore(self.config, self.catalog)
+        unit_store.add_player_units(self._state["p1Units"], 0)
+        unit_store.add_player_units(self._state["p2Units"], 1)
+        self._unit_store = unit_store
+
+    def __build_map(self):
+        """
+        Fills in map based on the game state so that self.game_map[x,y] is a list of GameUnits at that location.
+        Units are stored in self.unit_store and only become GameUnits when their tile is accessed.
+        """
+        if self._unit_store is None:
+            self.__build_unit_store()
+        self._game_map = GameMap(self.config, self.catalog)
+        self._threat_map = None
+        self._shield_map = None
+        self._resource_forecast = None
+        self._game_map.enable_warnings = self.enable_warnings
+        self._game_map.attach_unit_store(self._unit_store)
+        if self._board is not None:
+            # Until a structure changes, the map holds the structures of the board
+            self.__board_unchanged = True
+            self.__blocked = set(self._board.layout)
+            self.__layout = self._board.layout
+            self._game_map.add_listener(self.__track_board)
+
+    def __track_board(self, x, y):
+        """
+        Keeps the layout used with the board's path fields up to date as structures change.
+        """
+        self.__board_unchanged = False
+        index = x * self.ARENA_SIZE + y
+        if self.contains_stationary_unit([x, y]):
+            self.__blocked.add(index)
+        else:
+            self.__blocked.discard(index)
+        self.__layout = None
 
     def __resource_required(self, unit_type):
-        return self.SP if is_stationary(unit_type) else self.MP
+        return self.SP if self.catalog.is_stationary(unit_type) else self.MP
 
     def __set_resource(self, resource_type, amount, player_index=0):
         """
@@ -165,20 +384,105 @@ class GameState:
         held_resource = self.get_resource(resource_type, player_index)
         self._player_resources[player_index][resource_key] = held_resource + amount
 
+    def __spend(self, SP_amount, MP_amount, player_index=0):
+        """
+        Removes the given amounts of SP and MP from a player's resources in one step.
+        """
+        resources = self._player_resources[player_index]
+        resources['SP'] -= SP_amount
+        resources['MP'] -= MP_amount
+
     def _invalid_player_index(self, index):
-        self.warn("Invalid player index {} passed, player index should always be 0 (yourself) or 1 (your opponent)".format(index))
+        self.warn("Invalid player index {} passed, player index should always be 0 (yourself) or 1 (your opponent)", index)
     
     def _invalid_unit(self, unit):
-        self.warn("Invalid unit {}".format(unit))
+        self.warn("Invalid unit {}", unit)
 
-    def submit_turn(self):
+    def submit_turn(self, plan=None):
         """Submit and end your turn.
             Must be called at the end of your turn or the algo will hang.
+            Only the first call sends anything, so a turn submitted early, for example by a TurnPlanner
+            running out of time, is not sent twice.
+
+        Args:
+            plan: A (build_stack, deploy_stack) tuple from current_plan to send instead of the current one
+
+        Returns:
+            True if the turn was sent, False if it was already submitted
+
+        """
+        build_stack, deploy_stack = plan if plan is not None else self.current_plan()
+        with _submit_lock:
+            if self.submitted:
+                return False
+            self.submitted = True
+            send_command(json.dumps(build_stack))
+            send_command(json.dumps(deploy_stack))
+        return True
+
+    def checkpoint(self):
+        """Marks the builds, deploys, resources and board of this turn so rollback can return to them
+
+        Use it to try a plan and undo it, without copying the GameState. Every attempt_spawn and
+        attempt_upgrade made after the first checkpoint is recorded so it can be undone.
+
+        Returns:
+            A checkpoint to pass to rollback
+
         """
-        build_string = json.dumps(self._build_stack)
-        deploy_string = json.dumps(self._deploy_stack)
-        send_command(build_string)
-        send_command(deploy_string)
+        if self._journal is None:
+            self._journal = []
+        return (len(self._journal), len(self._build_stack), len(self._deploy_stack),
+                [dict(resources) for resources in self._player_resources])
+
+    def rollback(self, checkpoint):
+        """Undoes every spawn and upgrade made since a checkpoint, and restores the resources and queued turn
+
+        Args:
+            checkpoint: A checkpoint made by checkpoint on this GameState, not rolled back past yet
+
+        """
+        journal_length, build_length, deploy_length, resources = checkpoint
+        journal = self._journal
+        upgrade = self.catalog.UPGRADE
+        while len(journal) > journal_length:
+            unit_type, x, y, count = journal.pop()
+            if unit_type == upgrade:
+                self.contains_stationary_unit([x, y]).downgrade()
+                self.game_map.mark_changed([x, y])
+            elif self.catalog.is_stationary(unit_type):
+                self.game_map.remove_unit([x, y])
+            else:
+                del self.game_map[x, y][-count:]
+        del self._build_stack[build_length:]
+        del self._deploy_stack[deploy_length:]
+        self._player_resources = [dict(player_resources) for player_resources in resources]
+
+    def fork(self):
+        """Copies this GameState, with its board, resources and queued turn, through to_bytes
+
+        Changes to the copy do not affect this GameState. Prefer checkpoint and rollback when trying
+        plans one after the other, and fork when a plan must be kept, for example to send it to another process.
+
+        Returns:
+            A new GameState
+
+        """
+        copy = GameState.from_bytes(self.config, self.to_bytes(), lazy=True, catalog=self.catalog)
+        copy.suppress_warnings(not self.enable_warnings)
+        copy._build_stack = list(self._build_stack)
+        copy._deploy_stack = list(self._deploy_stack)
+        return copy
+
+    def current_plan(self):
+        """Copies the builds and deploys queued so far
+
+        Returns:
+            A (build_stack, deploy_stack) tuple that submit_turn can send later, whatever is queued after it
+
+        """
+        return list(self._build_stack), [(unit_type, x, y) for unit_type, x, y, count in self._deploy_stack
+                                         for _ in range(count)]
 
     def get_resource(self, resource_type, player_index = 0):
         """Gets a players resources
@@ -195,7 +499,7 @@ class GameState:
             self._invalid_player_index(player_index)
             return
         if not resource_type == self.MP and not resource_type == self.SP:
-            self.warn("Invalid resource_type '{}'. Please use MP (0) or SP (1)".format(resource_type))
+            self.warn("Invalid resource_type '{}'. Please use MP (0) or SP (1)", resource_type)
             return
 
         if resource_type == self.MP:
@@ -234,11 +538,11 @@ class GameState:
             The number of units affordable of the given unit_type.
 
         """
-        if unit_type not in ALL_UNITS:
+        if unit_type not in self.catalog.ALL_UNITS:
             self._invalid_unit(unit_type)
             return
 
-        costs = self.type_cost(unit_type)
+        costs = self.catalog.cost(unit_type)
         player_held = self.get_resources()
         if costs[MP] > 0 and costs[SP] > 0:
             return min(math.floor(player_held[SP] / costs[SP]), math.floor(player_held[MP] / costs[MP]))
@@ -264,23 +568,32 @@ class GameState:
         """
 
         if turns_in_future < 1 or turns_in_future > 99:
-            self.warn("Invalid turns in future used ({}). Turns in future should be between 1 and 99".format(turns_in_future))
+            self.warn("Invalid turns in future used ({}). Turns in future should be between 1 and 99", turns_in_future)
         if not player_index == 1 and not player_index == 0:
             self._invalid_player_index(player_index)
         if type(current_MP) == int and current_MP < 0:
-            self.warn("Invalid current MP ({}). Current MP cannot be negative.".format(current_MP))
+            self.warn("Invalid current MP ({}). Current MP cannot be negative.", current_MP)
 
         MP = self.get_resource(self.MP, player_index) if not current_MP else current_MP
-        for increment in range(1, turns_in_future + 1):
-            current_turn = self.turn_number + increment
-            MP *= (1 - self.config["resources"]["bitDecayPerRound"])
-            MP_per_round = self.config["resources"]["bitsPerRound"]
-            MP_ramp_ups = current_turn // self.config["resources"]["turnIntervalForBitSchedule"]
-            MP_per_round_growth = self.config["resources"]["bitGrowthRate"]
-            MP_gained = MP_per_round + (MP_per_round_growth * MP_ramp_ups)
-            MP += MP_gained
-            MP = round(MP, 1)
-        return MP
+        return self.resource_forecast.project_MP(MP, turns_in_future, player_index, include_supports=False)
+
+    def project_future_SP(self, turns_in_future=1, player_index=0, current_SP=None):
+        """Predicts the number of SP we will have on a future turn, including SP generated by supports
+
+        Args:
+            turns_in_future: The number of turns in the future we want to look forward to predict
+            player_index: The player whose SP we are tracking
+            current_SP: If we pass a value here, we will use that value instead of the current SP of the given player.
+
+        Returns:
+            The number of SP the given player will have after the given number of turns
+
+        """
+        if not player_index == 1 and not player_index == 0:
+            self._invalid_player_index(player_index)
+            return
+        SP = self.get_resource(self.SP, player_index) if current_SP is None else current_SP
+        return self.resource_forecast.project_SP(SP, turns_in_future, player_index)
 
     def type_cost(self, unit_type, upgrade=False):
         """Gets the cost of a unit based on its type
@@ -292,16 +605,11 @@ class GameState:
             The units costs as a list [SP, MP]
 
         """
-        if unit_type == REMOVE:
+        if unit_type == self.catalog.REMOVE:
             self._invalid_unit(unit_type)
             return
-        
-        unit_def = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[unit_type]]
-        cost_base = [unit_def.get('cost1', 0), unit_def.get('cost2', 0)]
-        if upgrade:
-            return [unit_def.get('upgrade', {}).get('cost1', cost_base[SP]), unit_def.get('upgrade', {}).get('cost2', cost_base[MP])]
 
-        return cost_base
+        return list(self.catalog.cost(unit_type, upgrade))
 
 
     def can_spawn(self, unit_type, location, num=1):
@@ -320,22 +628,23 @@ class GameState:
             True if we can spawn the unit(s)
 
         """
-        if unit_type not in ALL_UNITS:
+        if unit_type not in self.catalog.ALL_UNITS:
             self._invalid_unit(unit_type)
             return
         
         if not self.game_map.in_arena_bounds(location):
-            if self.enable_warnings:
-                self.warn("Could not spawn {} at location {}. Location invalid.".format(unit_type, location))
+            self.warn("Could not spawn {} at location {}. Location invalid.", unit_type, location)
             return False
 
         affordable = self.number_affordable(unit_type) >= num
-        stationary = is_stationary(unit_type)
+        stationary = self.catalog.is_stationary(unit_type)
         blocked = self.contains_stationary_unit(location) or (stationary and len(self.game_map[location[0],location[1]]) > 0)
         correct_territory = location[1] < self.HALF_ARENA
-        on_edge = location in (self.game_map.get_edge_locations(self.game_map.BOTTOM_LEFT) + self.game_map.get_edge_locations(self.game_map.BOTTOM_RIGHT))
+        # Our edges are the tiles with x + y == 13 (bottom left) or x - y == 14 (bottom right) in our half
+        on_edge = (0 <= location[1] < self.HALF_ARENA and 
+                   (location[0] + location[1] == self.HALF_ARENA - 1 or location[0] - location[1] == self.HALF_ARENA))
 
-        if self.enable_warnings:
+        if self.enable_warnings and log_enabled(WARNING):
             fail_reason = ""
             if not affordable:
                 fail_reason = fail_reason + " Not enough resources."
@@ -346,7 +655,7 @@ class GameState:
             if not (stationary or on_edge):
                 fail_reason = fail_reason + " Information units must be deployed on the edge."
             if len(fail_reason) > 0:
-                self.warn("Could not spawn {} at location {}.{}".format(unit_type, location, fail_reason))
+                self.warn("Could not spawn {} at location {}.{}", unit_type, location, fail_reason)
 
         return (affordable and correct_territory and not blocked and
                 (stationary or on_edge) and
@@ -364,31 +673,37 @@ class GameState:
             The number of units successfully spawned
 
         """
-        if unit_type not in ALL_UNITS:
+        if unit_type not in self.catalog.ALL_UNITS:
             self._invalid_unit(unit_type)
             return
         if num < 1 or not locations:
-            self.warn("Attempted to spawn fewer than one units! ({})".format(num))
+            self.warn("Attempted to spawn fewer than one units! ({})", num)
             return
       
         if type(locations[0]) == int:
             locations = [locations]
+        stationary = self.catalog.is_stationary(unit_type)
+        costs = self.catalog.cost(unit_type)
         spawned_units = 0
         for location in locations:
-            for i in range(num):
-                if self.can_spawn(unit_type, location, 1):
-                    x, y = map(int, location)
-                    costs = self.type_cost(unit_type)
-                    self.__set_resource(SP, 0 - costs[SP])
-                    self.__set_resource(MP, 0 - costs[MP])
-                    self.game_map.add_unit(unit_type, location, 0)
-                    if is_stationary(unit_type):
-                        self._build_stack.append((unit_type, x, y))
-                    else:
-                        self._deploy_stack.append((unit_type, x, y))
-                    spawned_units += 1
-                else:
-                    break
+            # Legality is checked once per location, then every affordable unit is placed in one step
+            if not self.can_spawn(unit_type, location, 1):
+                continue
+            count = 1 if stationary else min(num, self.number_affordable(unit_type))
+            x, y = map(int, location)
+            self.__spend(costs[SP] * count, costs[MP] * count)
+            self.game_map.add_unit(unit_type, location, 0, count)
+            if stationary:
+                self._build_stack.append((unit_type, x, y))
+            else:
+                # Deploys are queued as one record per location, and expanded to one entry per unit by current_plan
+                self._deploy_stack.append((unit_type, x, y, count))
+            if self._journal is not None:
+                self._journal.append((unit_type, x, y, count))
+            spawned_units += count
+            if count < num and self.enable_warnings:
+                # Report why the remaining units could not be spawned
+                self.can_spawn(unit_type, location, 1)
         return spawned_units
 
     def attempt_remove(self, locations):
@@ -407,10 +722,10 @@ class GameState:
         for location in locations:
             if location[1] < self.HALF_ARENA and self.contains_stationary_unit(location):
                 x, y = map(int, location)
-                self._build_stack.append((REMOVE, x, y))
+                self._build_stack.append((self.catalog.REMOVE, x, y))
                 removed_units += 1
             else:
-                self.warn("Could not remove a unit from {}. Location has no structures or is enemy territory.".format(location))
+                self.warn("Could not remove a unit from {}. Location has no structures or is enemy territory.", location)
         return removed_units
 
     def attempt_upgrade(self, locations):
@@ -430,26 +745,30 @@ class GameState:
 
         if type(locations[0]) == int:
             locations = [locations]
+        # Resources are tracked locally and spent in one step once every location is handled
+        available_SP, available_MP = self.get_resources()
+        spent_SP = spent_MP = 0
+        upgrade = self.catalog.UPGRADE
         spawned_units = 0
         for location in locations:
-            if location[1] < self.HALF_ARENA and self.contains_stationary_unit(location):
-                x, y = map(int, location)
-                existing_unit = None
-                for unit in self.game_map[x,y]:
-                    if unit.stationary:
-                        existing_unit = unit
-
-                if not existing_unit.upgraded and self.config["unitInformation"][UNIT_TYPE_TO_INDEX[existing_unit.unit_type]].get("upgrade", None) is not None:
-                    costs = self.type_cost(existing_unit.unit_type, True)
-                    resources = self.get_resources()
-                    if resources[SP] >= costs[SP] and resources[MP] >= costs[MP]:
-                        self.__set_resource(SP, 0 - costs[SP])
-                        self.__set_resource(MP, 0 - costs[MP])
+            existing_unit = location[1] < self.HALF_ARENA and self.contains_stationary_unit(location)
+            if existing_unit:
+                if not existing_unit.upgraded and self.catalog.can_upgrade(existing_unit.unit_type):
+                    costs = self.catalog.cost(existing_unit.unit_type, True)
+                    if available_SP - spent_SP >= costs[SP] and available_MP - spent_MP >= costs[MP]:
+                        spent_SP += costs[SP]
+                        spent_MP += costs[MP]
                         existing_unit.upgrade()
-                        self._build_stack.append((UPGRADE, x, y))
+                        self.game_map.mark_changed(location)
+                        x, y = map(int, location)
+                        self._build_stack.append((upgrade, x, y))
+                        if self._journal is not None:
+                            self._journal.append((upgrade, x, y, 1))
                         spawned_units += 1
             else:
-                self.warn("Could not upgrade a unit from {}. Location has no structures or is enemy territory.".format(location))
+                self.warn("Could not upgrade a unit from {}. Location has no structures or is enemy territory.", location)
+        if spawned_units:
+            self.__spend(spent_SP, spent_MP)
         return spawned_units
 
     def get_target_edge(self, start_location):
@@ -489,15 +808,45 @@ class GameState:
 
         """
         if self.contains_stationary_unit(start_location):
-            self.warn("Attempted to perform pathing from blocked starting location {}".format(start_location))
+            self.warn("Attempted to perform pathing from blocked starting location {}", start_location)
             return
 
         if target_edge is None:
             target_edge = self.get_target_edge(start_location)
 
         end_points = self.game_map.get_edge_locations(target_edge)
+        if self._board is not None:
+            if self.__layout is None:
+                self.__layout = frozenset(self.__blocked)
+            return self._board.path_fields.path(start_location, end_points, self.__layout)
         return self._shortest_path_finder.navigate_multiple_endpoints(start_location, end_points, self)
 
+    def get_path_exposure(self, path, unit_type, count=1, player_index=0):
+        """Estimates, frame by frame, what happens to a stack of mobile units walking a path.
+
+        Uses the threat_map and shield_map, so evaluating many paths only costs a walk over each of them.
+        Takes unit speed, upgraded turrets, support shields and the size of the stack into account.
+
+        Args:
+            path: A list of locations, as returned by find_path_to_edge
+            unit_type: The mobile unit type walking the path
+            count: The number of units in the stack
+            player_index: The owner of the stack, 0 for you 1 for your opponent
+
+        Returns:
+            A PathExposure with the damage taken each frame, survivors at each location and expected breaches
+
+        """
+        if not path:
+            self.warn("Attempted to get the exposure of an empty path")
+            return
+        if self.catalog.is_stationary(unit_type) or unit_type not in self.catalog.ALL_UNITS:
+            self._invalid_unit(unit_type)
+            return
+        target_edge = self.get_target_edge(path[0])
+        reaches_edge = list(path[-1]) in self.game_map.get_edge_locations(target_edge)
+        return integrate_path(path, self.catalog.stats(unit_type), count, self.threat_map, self.shield_map, player_index, reaches_edge)
+
     def contains_stationary_unit(self, location):
         """Check if a location is blocked, return structures unit if it is
 
@@ -517,12 +866,13 @@ class GameState:
                 return unit
         return False
 
-    def warn(self, message):
-        """ Used internally by game_state to print warnings
+    def warn(self, message, *args):
+        """ Used internally by game_state to print warnings. 
+        message is only formatted with args if warnings are enabled, see gamelib.log
         """
 
         if(self.enable_warnings):
-            debug_write(message)
+            log(WARNING, message, *args)
 
     def suppress_warnings(self, suppress):
         """Suppress all warnings
@@ -533,7 +883,8 @@ class GameState:
         """
 
         self.enable_warnings = not suppress
-        self.game_map.enable_warnings = not suppress
+        if self._game_map is not None:
+            self._game_map.enable_warnings = not suppress
 
     def get_target(self, attacking_unit):
         """Returns target of given unit based on current map of the game board. 
@@ -551,7 +902,7 @@ class GameState:
         """
 
         if not isinstance(attacking_unit, GameUnit):
-            self.warn("Passed a {} to get_target as attacking_unit. Expected a GameUnit.".format(type(attacking_unit)))
+            self.warn("Passed a {} to get_target as attacking_unit. Expected a GameUnit.", type(attacking_unit))
             return
 
         attacker_location = [attacking_unit.x, attacking_unit.y]
@@ -565,7 +916,7 @@ class GameState:
 
         for location in possible_locations:
             for unit in self.game_map[location]:
-                if unit.player_index == attacking_unit.player_index or (attacking_unit.damage_f == 0 and is_stationary(unit.unit_type)) or (attacking_unit.damage_i == 0 and not(is_stationary(unit.unit_type))):
+                if unit.player_index == attacking_unit.player_index or (attacking_unit.damage_f == 0 and unit.stationary) or (attacking_unit.damage_i == 0 and not unit.stationary):
                     continue
 
                 new_target = False
@@ -614,6 +965,76 @@ class GameState:
                     target_x_distance = unit_x_distance
         return target
 
+    def get_targets(self, attacking_units=None):
+        """Returns the target of many units at once, following the same rules as get_target.
+
+        The units on the board are indexed by tile once, and for every tile and player only the unit that tile
+        would offer as a target is kept. Each attacker then compares one candidate per tile in its range using 
+        a sortable key for the priority order: mobile over stationary, nearest, lowest health, 
+        lowest y for player 0 or highest y for player 1, then furthest from x = 13.5.
+
+        Args:
+            attacking_units: A list of GameUnits. If None, every unit on the board that can attack is used
+
+        Returns:
+            A list of (attacker, target) tuples in the order of attacking_units, where target is a GameUnit or None
+
+        """
+        game_map = self.game_map
+        center = self.HALF_ARENA - 0.5
+        # tiles[(x, y)][player_index] = (best mobile target, structure target), each as (priority key, unit) or None
+        tiles = {}
+        all_units = []
+        for x in range(self.ARENA_SIZE):
+            for y in range(self.ARENA_SIZE):
+                if not IN_BOUNDS[x * self.ARENA_SIZE + y]:
+                    continue
+                units = game_map[x, y]
+                if not units:
+                    continue
+                all_units.extend(units)
+                offered = [[None, None], [None, None]]
+                for unit in units:
+                    slot = offered[unit.player_index]
+                    if unit.stationary:
+                        if slot[1] is None:
+                            slot[1] = (unit.health, unit)
+                    elif slot[0] is None or unit.health < slot[0][0]:
+                        slot[0] = (unit.health, unit)
+                tiles[(x, y)] = (offered, -abs(center - x))
+
+        if attacking_units is None:
+            attacking_units = [unit for unit in all_units if unit.attackRange > 0 and (unit.damage_f > 0 or unit.damage_i > 0)]
+
+        get_hit_radius = self.catalog.get_hit_radius
+        results = []
+        for attacker in attacking_units:
+            ax, ay = attacker.x, attacker.y
+            enemy = 1 - attacker.player_index
+            y_sign = 1 if attacker.player_index == 0 else -1
+            best_key = None
+            best = None
+            for dx, dy, distance in reach_offsets(attacker.attackRange, get_hit_radius):
+                x, y = ax + dx, ay + dy
+                tile = tiles.get((x, y))
+                if tile is None:
+                    continue
+                offered, x_key = tile
+                mobile, structure = offered[enemy]
+                if mobile is not None and attacker.damage_i > 0:
+                    key = (False, distance, mobile[0], y_sign * y, x_key, x, y)
+                    candidate = mobile[1]
+                elif structure is not None and attacker.damage_f > 0:
+                    key = (True, distance, structure[0], y_sign * y, x_key, x, y)
+                    candidate = structure[1]
+                else:
+                    continue
+                if best_key is None or key < best_key:
+                    best_key = key
+                    best = candidate
+            results.append((attacker, best))
+        return results
+
     def get_attackers(self, location, player_index):
         """Gets the stationary units threatening a given location
 
@@ -629,16 +1050,13 @@ class GameState:
         if not player_index == 0 and not player_index == 1:
             self._invalid_player_index(player_index)
         if not self.game_map.in_arena_bounds(location):
-            self.warn("Location {} is not in the arena bounds.".format(location))
+            self.warn("Location {} is not in the arena bounds.", location)
 
         attackers = []
         """
         Get locations in the range of TURRET units
         """
-        max_range = 0
-        for unit in self.config["unitInformation"]:
-            if unit.get('attackRange', 0) >= max_range:
-                max_range = unit.get('attackRange', 0)
+        max_range = self.catalog.max_attack_range
         possible_locations= self.game_map.get_locations_in_range(location, max_range)
         for location_unit in possible_locations:
             for unit in self.game_map[location_unit]:
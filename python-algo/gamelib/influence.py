@@ -0,0 +1,352 @@
+import math
+from functools import lru_cache
+
+ARENA_SIZE = 28
+HALF_ARENA = ARENA_SIZE // 2
+
+
+def _build_in_bounds():
+    in_bounds = [False] * (ARENA_SIZE * ARENA_SIZE)
+    for y in range(ARENA_SIZE):
+        row_size = y + 1 if y < HALF_ARENA else ARENA_SIZE - y
+        start_x = HALF_ARENA - row_size
+        for x in range(start_x, start_x + 2 * row_size):
+            in_bounds[x * ARENA_SIZE + y] = True
+    return in_bounds
+
+# IN_BOUNDS[x * ARENA_SIZE + y] is True if [x, y] is on the diamond shaped board
+IN_BOUNDS = _build_in_bounds()
+
+
+@lru_cache(maxsize=None)
+def range_offsets(radius):
+    """Gets the tile offsets within a radius of a tile
+
+    Args:
+        radius: The range of a unit, such as its attackRange or shieldRange
+
+    Returns:
+        A tuple of (dx, dy) offsets whose euclidean distance from (0, 0) is at most radius
+
+    """
+    reach = int(radius)
+    limit = radius * radius
+    return tuple((dx, dy) for dx in range(-reach, reach + 1) for dy in range(-reach, reach + 1) if dx * dx + dy * dy <= limit)
+
+
+@lru_cache(maxsize=None)
+def reach_offsets(radius, get_hit_radius):
+    """Gets the tile offsets a unit can reach, using the same rule as GameMap.get_locations_in_range
+
+    Args:
+        radius: The range of a unit, such as its attackRange
+        get_hit_radius: The getHitRadius of the game config
+
+    Returns:
+        A tuple of (dx, dy, distance) for every offset whose distance from (0, 0) is less than radius + get_hit_radius
+
+    """
+    reach = math.ceil(radius)
+    limit = radius + get_hit_radius
+    offsets = []
+    for dx in range(-reach, reach + 1):
+        for dy in range(-reach, reach + 1):
+            distance = math.sqrt(dx * dx + dy * dy)
+            if distance < limit:
+                offsets.append((dx, dy, distance))
+    return tuple(offsets)
+
+
+class _InfluenceMap:
+    """
+    Base class for per-player grids built from structure range stencils.
+    Each structure adds a contribution to the tiles within its range. Contributions are remembered per tile,
+    so a changed tile is updated by removing its old contribution and adding the new one.
+    Grids are flat lists indexed with x * ARENA_SIZE + y, one per player.
+    """
+    def __init__(self, game_state):
+        self.catalog = game_state.catalog
+        self.game_map = game_state.game_map
+        self._contributions = {}
+        self._reset()
+        for x, y, unit_type, player_index, upgraded in self.game_map.iter_structures():
+            contribution = self._contribution(x, y, unit_type, player_index, upgraded)
+            if contribution is not None:
+                self._contributions[(x, y)] = contribution
+                self._apply(x, y, contribution, 1)
+        self.game_map.add_listener(self.refresh_tile)
+
+    def refresh_tile(self, x, y):
+        """Updates the grids after the structure at [x, y] was added, removed or upgraded
+        """
+        old = self._contributions.pop((x, y), None)
+        if old is not None:
+            self._apply(x, y, old, -1)
+        for unit in self.game_map[x, y]:
+            if unit.stationary:
+                contribution = self._contribution(x, y, unit.unit_type, unit.player_index, unit.upgraded)
+                if contribution is not None:
+                    self._contributions[(x, y)] = contribution
+                    self._apply(x, y, contribution, 1)
+
+    def copy(self, game_state):
+        """Copies the grids of this map into a new map that follows the game_map of game_state instead
+
+        Much cheaper than building the new map from its structures. Used to seed each turn's GameState from the
+        maps of a BoardModel, which is why game_state must hold the same structures as the map being copied.
+
+        Args:
+            game_state: The GameState whose game_map the copy should follow
+
+        Returns:
+            The new map
+
+        """
+        copy = object.__new__(type(self))
+        copy.catalog = game_state.catalog
+        copy.game_map = game_state.game_map
+        copy._contributions = dict(self._contributions)
+        copy._copy_grids(self)
+        copy.game_map.add_listener(copy.refresh_tile)
+        return copy
+
+    def _reset(self):
+        raise NotImplementedError
+
+    def _copy_grids(self, other):
+        raise NotImplementedError
+
+    def _contribution(self, x, y, unit_type, player_index, upgraded):
+        raise NotImplementedError
+
+    def _apply(self, x, y, contribution, sign):
+        raise NotImplementedError
+
+
+class ThreatMap(_InfluenceMap):
+    """Tracks how dangerous each tile is for each player's mobile units.
+
+    For every tile and player, it holds how many enemy structures can attack a mobile unit of that player
+    on that tile, and how much damage they deal to it per frame. It is built in a single pass over the
+    structures on the map and is updated whenever the GameMap reports a changed tile, so it stays correct
+    after attempt_spawn, attempt_upgrade and direct game_map edits.
+
+    Attributes :
+        * attackers (list): For each player, a flat grid of attacker counts indexed with x * 28 + y
+        * damage (list): For each player, a flat grid of damage per frame indexed with x * 28 + y
+
+    """
+    def _reset(self):
+        self.attackers = [[0] * (ARENA_SIZE * ARENA_SIZE), [0] * (ARENA_SIZE * ARENA_SIZE)]
+        self.damage = [[0.0] * (ARENA_SIZE * ARENA_SIZE), [0.0] * (ARENA_SIZE * ARENA_SIZE)]
+
+    def _copy_grids(self, other):
+        self.attackers = [list(grid) for grid in other.attackers]
+        self.damage = [list(grid) for grid in other.damage]
+
+    def _contribution(self, x, y, unit_type, player_index, upgraded):
+        stats = self.catalog.stats(unit_type, upgraded)
+        if stats.damage_i <= 0 or stats.attackRange <= 0:
+            return None
+        return (1 - player_index, stats.attackRange, stats.damage_i)
+
+    def _apply(self, x, y, contribution, sign):
+        player_index, attack_range, damage = contribution
+        attackers = self.attackers[player_index]
+        damage_grid = self.damage[player_index]
+        damage = sign * damage
+        for dx, dy in range_offsets(attack_range):
+            tx, ty = x + dx, y + dy
+            if 0 <= tx < ARENA_SIZE and 0 <= ty < ARENA_SIZE:
+                index = tx * ARENA_SIZE + ty
+                if IN_BOUNDS[index]:
+                    attackers[index] += sign
+                    damage_grid[index] += damage
+
+    def attacker_count(self, location, player_index):
+        """The number of enemy structures that can attack a mobile unit of player_index at location
+        """
+        return self.attackers[player_index][location[0] * ARENA_SIZE + location[1]]
+
+    def damage_at(self, location, player_index):
+        """The damage per frame enemy structures deal to a mobile unit of player_index at location
+        """
+        return self.damage[player_index][location[0] * ARENA_SIZE + location[1]]
+
+    def path_damage(self, path, player_index):
+        """The sum of damage_at over every location of a path
+
+        Args:
+            path: A list of locations, as returned by find_path_to_edge
+            player_index: The player whose mobile units walk the path, 0 for you 1 for your opponent
+
+        Returns:
+            The total damage per frame over the path
+
+        """
+        damage = self.damage[player_index]
+        return sum(damage[x * ARENA_SIZE + y] for x, y in path)
+
+
+class ShieldMap(_InfluenceMap):
+    """Tracks the shield each player's mobile units receive from their own supports.
+
+    For every tile and player, it holds the total shield a mobile unit of that player on that tile would get
+    from every support in range: shieldPerUnit plus shieldBonusPerY for each row the support is away from its
+    owner's edge, with upgraded values for upgraded supports. A unit only gets shielded once by each support,
+    so path_shield counts every support in range of a path once. Like ThreatMap, it is built in a single pass
+    and updated whenever the GameMap reports a changed tile.
+
+    Attributes :
+        * shield (list): For each player, a flat grid of shield amounts indexed with x * 28 + y
+        * coverage (list): For each player, a dict mapping flat tile indexes to the set of (x, y) supports in range
+
+    """
+    def _reset(self):
+        self.shield = [[0.0] * (ARENA_SIZE * ARENA_SIZE), [0.0] * (ARENA_SIZE * ARENA_SIZE)]
+        self.coverage = [{}, {}]
+
+    def _copy_grids(self, other):
+        self.shield = [list(grid) for grid in other.shield]
+        self.coverage = [{index: set(supports) for index, supports in coverage.items()} for coverage in other.coverage]
+
+    def _contribution(self, x, y, unit_type, player_index, upgraded):
+        stats = self.catalog.stats(unit_type, upgraded)
+        if stats.shieldRange <= 0 or (stats.shieldPerUnit <= 0 and stats.shieldBonusPerY <= 0):
+            return None
+        rows_from_edge = y if player_index == 0 else ARENA_SIZE - 1 - y
+        return (player_index, stats.shieldRange, stats.shieldPerUnit + stats.shieldBonusPerY * rows_from_edge)
+
+    def _apply(self, x, y, contribution, sign):
+        player_index, shield_range, amount = contribution
+        shield = self.shield[player_index]
+        coverage = self.coverage[player_index]
+        support = (x, y)
+        amount = sign * amount
+        for dx, dy in range_offsets(shield_range):
+            tx, ty = x + dx, y + dy
+            if 0 <= tx < ARENA_SIZE and 0 <= ty < ARENA_SIZE:
+                index = tx * ARENA_SIZE + ty
+                if IN_BOUNDS[index]:
+                    shield[index] += amount
+                    if sign > 0:
+                        coverage.setdefault(index, set()).add(support)
+                    else:
+                        coverage[index].discard(support)
+
+    def shield_at(self, location, player_index):
+        """The total shield a mobile unit of player_index at location would get from every support in range
+        """
+        return self.shield[player_index][location[0] * ARENA_SIZE + location[1]]
+
+    def supports_in_range(self, location, player_index):
+        """The (x, y) tiles of the supports of player_index that shield location
+        """
+        return self.coverage[player_index].get(location[0] * ARENA_SIZE + location[1], set())
+
+    def path_shield(self, path, player_index):
+        """The shield a single mobile unit gets while walking a path, counting each support once
+
+        Args:
+            path: A list of locations, as returned by find_path_to_edge
+            player_index: The player whose mobile units walk the path, 0 for you 1 for your opponent
+
+        Returns:
+            The total shield the unit would receive
+
+        """
+        coverage = self.coverage[player_index]
+        supports = set()
+        for x, y in path:
+            covering = coverage.get(x * ARENA_SIZE + y)
+            if covering:
+                supports.update(covering)
+        return sum(self._contributions[support][2] for support in supports)
+
+
+class PathExposure:
+    """What happens to a stack of mobile units walking a path, frame by frame.
+
+    Attributes :
+        * frames (list): One (frame, location, damage_taken, survivors) tuple for every frame spent on the path
+        * survivors (list): The number of units alive when leaving each location of the path
+        * total_damage (float): The damage the stack takes over the whole path
+        * total_shield (float): The shield each unit receives over the whole path
+        * breaches (int): The number of units expected to score, 0 if the path does not reach an edge
+
+    """
+    def __init__(self):
+        self.frames = []
+        self.survivors = []
+        self.total_damage = 0.0
+        self.total_shield = 0.0
+        self.breaches = 0
+
+    def __repr__(self):
+        return "PathExposure({} frames, {} damage, {} breaches)".format(len(self.frames), self.total_damage, self.breaches)
+
+
+def integrate_path(path, stats, count, threat_map, shield_map, player_index, reaches_edge):
+    """Estimates the damage a stack of mobile units takes walking a path
+
+    Units spend 1 / speed frames on every location before the last one, taking the damage of the threat map
+    each frame. Enemy turrets are assumed to focus the weakest unit, so damage goes to one unit at a time and
+    carries over to the next when a unit dies. Supports shield every living unit once, when the stack first
+    enters their range.
+
+    Args:
+        path: A list of locations, as returned by find_path_to_edge
+        stats: The UnitStats of the walking unit type
+        count: The number of units in the stack
+        threat_map: The ThreatMap to read damage from
+        shield_map: The ShieldMap to read shielding from, or None to ignore shields
+        player_index: The owner of the stack, 0 for you 1 for your opponent
+        reaches_edge: Whether the last location of the path is on the edge the units are walking to
+
+    Returns:
+        A PathExposure
+
+    """
+    exposure = PathExposure()
+    frames_per_tile = max(1, int(round(1 / stats.speed))) if stats.speed > 0 else 1
+    damage_grid = threat_map.damage[player_index]
+    coverage = shield_map.coverage[player_index] if shield_map is not None else {}
+    contributions = shield_map._contributions if shield_map is not None else {}
+    shielded_by = set()
+
+    unit_health = stats.max_health
+    front_health = unit_health
+    survivors = count
+    frame = 0
+    for x, y in path[:-1]:
+        index = x * ARENA_SIZE + y
+        covering = coverage.get(index)
+        if covering and survivors:
+            for support in covering:
+                if support not in shielded_by:
+                    shielded_by.add(support)
+                    amount = contributions[support][2]
+                    exposure.total_shield += amount
+                    unit_health += amount
+                    front_health += amount
+        damage = damage_grid[index]
+        for _ in range(frames_per_tile):
+            taken = 0.0
+            remaining = damage
+            while remaining > 0 and survivors:
+                if remaining >= front_health:
+                    remaining -= front_health
+                    taken += front_health
+                    survivors -= 1
+                    front_health = unit_health
+                else:
+                    front_health -= remaining
+                    taken += remaining
+                    remaining = 0
+            exposure.total_damage += taken
+            exposure.frames.append((frame, [x, y], taken, survivors))
+            frame += 1
+        exposure.survivors.append(survivors)
+    exposure.survivors.append(survivors)
+    exposure.breaches = survivors if reaches_edge else 0
+    return exposure
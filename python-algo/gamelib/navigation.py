@@ -1,8 +1,9 @@
 import heapq
 import math
 import sys
-import queue
+from collections import deque
 from .util import debug_write
+from .influence import ARENA_SIZE, HALF_ARENA, IN_BOUNDS
 
 class Node:
     """A path-finding node
@@ -41,16 +42,16 @@ class ShortestPathFinder:
         self.VERTICAL = 2
         self.initialized = False
 
-    def initialize_map(self, game_state):
+    def initialize_map(self, game_state=None):
         """Initializes the map
 
         Args:
-            game_state: A GameState object representing the gamestate we want to traverse
+            game_state: A GameState object representing the gamestate we want to traverse, or None when pathing on a blocked grid
         """
         #Initialize map 
         self.initialized = True
         self.game_state = game_state
-        self.game_map = [[Node() for x in range(self.game_state.ARENA_SIZE)] for y in range(self.game_state.ARENA_SIZE)]
+        self.game_map = [[Node() for x in range(ARENA_SIZE)] for y in range(ARENA_SIZE)]
 
     def navigate_multiple_endpoints(self, start_point, end_points, game_state):
         """Finds the path a unit would take to reach a set of endpoints
@@ -71,41 +72,82 @@ class ShortestPathFinder:
         #Initialize map 
         self.initialize_map(game_state)
         #Fill in walls
-        for location in self.game_state.game_map:
-            if self.game_state.contains_stationary_unit(location):
-                self.game_map[location[0]][location[1]].blocked = True
-        #Do pathfinding
+        for x, y, _, _, _ in game_state.game_map.iter_structures():
+            self.game_map[x][y].blocked = True
+        return self._find_path(start_point, end_points)
+
+    def navigate_grid(self, start_point, end_points, blocked):
+        """Finds the path a unit would take to reach a set of endpoints on a board described only by its blocked tiles.
+        Gives the same paths as navigate_multiple_endpoints, without needing a GameState.
+
+        Args:
+            * start_point: The starting location of the unit
+            * end_points: The end points of the unit, should be a list of edge locations
+            * blocked: A flat list indexed with x * 28 + y, True where a structure stands
+
+        Returns:
+            The path a unit at start_point would take when trying to reach end_points, or None if start_point is blocked
+
+        """
+        if blocked[start_point[0] * ARENA_SIZE + start_point[1]]:
+            return
+
+        self.initialize_map()
+        nodes = self.game_map
+        for index, is_blocked in enumerate(blocked):
+            if is_blocked:
+                nodes[index // ARENA_SIZE][index % ARENA_SIZE].blocked = True
+        return self._find_path(start_point, end_points)
+
+    def _find_path(self, start_point, end_points):
+        """Runs the path-finding steps once the blocked nodes are filled in
+        """
         ideal_endpoints = self._idealness_search(start_point, end_points)
         self._validate(ideal_endpoints, end_points)
         return self._get_path(start_point, end_points)
 
+    def _in_bounds(self, location):
+        """Same as GameMap.in_arena_bounds, using a lookup table
+        """
+        x, y = location
+        return 0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE and IN_BOUNDS[x * ARENA_SIZE + y]
+
     def _idealness_search(self, start, end_points):
         """
         Finds the most ideal tile in our 'pocket' of pathable space. 
         The edge if it is available, or the best self destruct location otherwise
         """
-        current = queue.Queue()
-        current.put(start)
+        nodes = self.game_map
+        end_set = set(map(tuple, end_points))
+        direction = self._get_direction_from_endpoints(end_points)
+        up = direction[1] == 1
+        right = direction[0] == 1
         best_idealness = self._get_idealness(start, end_points)
-        self.game_map[start[0]][start[1]].visited_idealness = True
+        nodes[start[0]][start[1]].visited_idealness = True
         most_ideal = start
 
-        while not current.empty():
-            search_location = current.get()
-            for neighbor in self._get_neighbors(search_location):
-                if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
+        current = deque()
+        current.append((start[0], start[1]))
+        while current:
+            x, y = current.popleft()
+            for neighbor in ((x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)):
+                nx, ny = neighbor
+                if not (0 <= nx < ARENA_SIZE and 0 <= ny < ARENA_SIZE and IN_BOUNDS[nx * ARENA_SIZE + ny]):
                     continue
+                node = nodes[nx][ny]
+                # Idealness only depends on the tile, so it is enough to check each tile the first time it is reached
+                if node.blocked or node.visited_idealness:
+                    continue
+                node.visited_idealness = True
+                current.append(neighbor)
 
-                x, y = neighbor
-                current_idealness = self._get_idealness(neighbor, end_points)
-
+                if neighbor in end_set:
+                    # Nothing is more ideal than the edge
+                    return [nx, ny]
+                current_idealness = 28 * (ny if up else 27 - ny) + (nx if right else 27 - nx)
                 if current_idealness > best_idealness:
                     best_idealness = current_idealness
-                    most_ideal = neighbor
-
-                if not self.game_map[x][y].visited_idealness and not self.game_map[x][y].blocked:
-                    self.game_map[x][y].visited_idealness = True
-                    current.put(neighbor)
+                    most_ideal = [nx, ny]
 
         return most_ideal
 
@@ -128,9 +170,9 @@ class ShortestPathFinder:
         point = end_points[0]
         x, y = point
         direction = [1, 1]
-        if x < self.game_state.HALF_ARENA:
+        if x < HALF_ARENA:
            direction[0] = -1
-        if y < self.game_state.HALF_ARENA:
+        if y < HALF_ARENA:
             direction[1] = -1
         return direction
 
@@ -164,31 +206,29 @@ class ShortestPathFinder:
         """
         #VALIDATION
         #Add our most ideal tiles to current
-        current = queue.Queue()
-        if ideal_tile in end_points:
-            for location in end_points:
-               current.put(location)
-               #Set current pathlength to 0
-               self.game_map[location[0]][location[1]].pathlength = 0
-               self.game_map[location[0]][location[1]].visited_validate = True
-        else:
-            current.put(ideal_tile)
-            self.game_map[ideal_tile[0]][ideal_tile[1]].pathlength = 0
-            self.game_map[ideal_tile[0]][ideal_tile[1]].visited_validate = True
+        nodes = self.game_map
+        current = deque()
+        for x, y in (end_points if ideal_tile in end_points else [ideal_tile]):
+            #Set current pathlength to 0
+            nodes[x][y].pathlength = 0
+            nodes[x][y].visited_validate = True
+            current.append((x, y))
 
         #While current is not empty
-        while not current.empty():
-            current_location = current.get()
-            current_node = self.game_map[current_location[0]][current_location[1]]
-            for neighbor in self._get_neighbors(current_location):
-                if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
+        while current:
+            x, y = current.popleft()
+            current_node = nodes[x][y]
+            if current_node.blocked:
+                continue
+            pathlength = current_node.pathlength + 1
+            for nx, ny in ((x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)):
+                if not (0 <= nx < ARENA_SIZE and 0 <= ny < ARENA_SIZE and IN_BOUNDS[nx * ARENA_SIZE + ny]):
                     continue
-
-                neighbor_node = self.game_map[neighbor[0]][neighbor[1]]
-                if not neighbor_node.visited_validate and not current_node.blocked:
-                    neighbor_node.pathlength = current_node.pathlength + 1
+                neighbor_node = nodes[nx][ny]
+                if not neighbor_node.blocked and not neighbor_node.visited_validate:
+                    neighbor_node.pathlength = pathlength
                     neighbor_node.visited_validate = True
-                    current.put(neighbor)
+                    current.append((nx, ny))
 
         #debug_write("Print after validate")
         #self.print_map()
@@ -228,7 +268,7 @@ class ShortestPathFinder:
         best_pathlength = self.game_map[current_point[0]][current_point[1]].pathlength
         for neighbor in neighbors:
             #debug_write("Comparing champ {} and contender {}".format(ideal_neighbor, neighbor))
-            if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
+            if not self._in_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
                 continue
 
             new_best = False
@@ -314,3 +354,327 @@ class ShortestPathFinder:
             sys.stderr.write(" ")
         sys.stderr.write(str(number))
         sys.stderr.write(" ")
+
+
+def _neighbor_indexes(index):
+    """
+    The flat indexes of the tiles next to a flat index that are on the board.
+    """
+    x, y = index // ARENA_SIZE, index % ARENA_SIZE
+    for nx, ny in ((x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)):
+        if 0 <= nx < ARENA_SIZE and 0 <= ny < ARENA_SIZE:
+            neighbor = nx * ARENA_SIZE + ny
+            if IN_BOUNDS[neighbor]:
+                yield neighbor
+
+
+# _NEIGHBORS[index] lists the flat indexes next to index that are on the board, in the order ShortestPathFinder checks them
+_NEIGHBORS = [tuple(_neighbor_indexes(index)) for index in range(ARENA_SIZE * ARENA_SIZE)]
+
+
+class PathFieldCache:
+    """Shares path-finding work between many paths over the same board layouts.
+
+    ShortestPathFinder floods the pocket of the start tile to find its most ideal tile, then floods the board
+    again to get every tile's pathlength to that tile or to the edge. Both only depend on the layout of the
+    board and on the pocket, not on the start tile, so this cache labels the pockets of each layout once and
+    keeps each pathlength field. A new path then only costs the walk along it. Paths are the same as
+    ShortestPathFinder.navigate_grid.
+
+    When structures are destroyed, open_tiles derives the next layout from the previous one. Only the pockets
+    next to the opened tiles are labeled again, and the fields of every other pocket are kept. close_tiles
+    does the same for structures that are built.
+
+    Attributes :
+        * max_fields (int): The number of pathlength fields kept before the cache is cleared
+
+    """
+    def __init__(self, max_fields=512):
+        self.max_fields = max_fields
+        self.__pockets = {}
+        self.__fields = {}
+        self.__field_count = 0
+        self.__openings = {}
+        self.__finder = ShortestPathFinder()
+
+    def clear(self):
+        """Forgets every cached pocket and field
+        """
+        self.__pockets.clear()
+        self.__fields.clear()
+        self.__field_count = 0
+        self.__openings.clear()
+
+    def field_count(self, layout):
+        """The number of pathlength fields kept for a layout
+
+        Args:
+            * layout: A frozenset of the flat indexes, x * 28 + y, of every blocked tile
+
+        Returns:
+            The number of fields that paths on layout can reuse
+
+        """
+        return len(self.__fields.get(layout, ()))
+
+    def path(self, start_point, end_points, layout):
+        """Finds the path a unit would take to reach a set of endpoints
+
+        Args:
+            * start_point: The starting location of the unit
+            * end_points: The end points of the unit, should be a list of edge locations
+            * layout: A frozenset of the flat indexes, x * 28 + y, of every blocked tile
+
+        Returns:
+            The path a unit at start_point would take, or None if start_point is blocked or off the board
+
+        """
+        start_index = start_point[0] * ARENA_SIZE + start_point[1]
+        if start_index in layout or not self.__finder._in_bounds(start_point):
+            return
+        labels, pockets = self.__label_pockets(layout)
+        pocket = pockets[labels[start_index]]
+        end_set = set(x * ARENA_SIZE + y for x, y in end_points)
+        if pocket[0] & end_set:
+            seed = None
+        else:
+            seed = self.__most_ideal(pocket, end_points)
+        key = (tuple(end_points[0]), len(end_points), seed)
+        fields = self.__fields.get(layout)
+        entry = fields.get(key) if fields is not None else None
+        if entry is None:
+            if self.__field_count >= self.max_fields:
+                self.clear()
+                labels, pockets = self.__label_pockets(layout)
+            if seed is None:
+                pathlength = self.__validate([x * ARENA_SIZE + y for x, y in end_points], layout)
+                covered = frozenset(labels[index] for index in end_set if labels[index] >= 0)
+            else:
+                pathlength = self.__validate([seed], layout)
+                covered = frozenset((labels[seed],))
+            entry = (pathlength, covered)
+            self.__fields.setdefault(layout, {})[key] = entry
+            self.__field_count += 1
+        return self.__get_path(start_point, end_points, entry[0], layout)
+
+    def open_tiles(self, layout, tiles):
+        """Unblocks tiles of a layout, such as the tiles of structures destroyed during an action phase
+
+        Args:
+            * layout: A frozenset of the flat indexes, x * 28 + y, of every blocked tile
+            * tiles: The flat indexes to unblock
+
+        Returns:
+            The new layout, and the set of flat indexes of the pockets that changed.
+            Paths from tiles outside of that set are the same on both layouts
+
+        """
+        opened = frozenset(index for index in tiles if index in layout)
+        if not opened:
+            return layout, frozenset()
+        cached = self.__openings.get((layout, opened))
+        if cached is not None:
+            return cached
+        new_layout = layout.difference(opened)
+        labels, pockets = self.__label_pockets(layout)
+        touched = set()
+        for index in opened:
+            for neighbor in _neighbor_indexes(index):
+                if neighbor not in layout:
+                    touched.add(labels[neighbor])
+        changed = set(opened)
+        for label in touched:
+            changed.update(pockets[label][0])
+        changed = frozenset(changed)
+        self.__openings[(layout, opened)] = (new_layout, changed)
+
+        if new_layout not in self.__pockets:
+            new_labels = list(labels)
+            new_pockets = list(pockets)
+            # Group the opened tiles that join each other, directly or through a pocket
+            groups = []
+            for index in opened:
+                neighbors = list(_neighbor_indexes(index))
+                group_labels = set(labels[neighbor] for neighbor in neighbors if neighbor not in layout)
+                group_tiles = [index]
+                for group in [group for group in groups if group[0] & group_labels or any(neighbor in group[1] for neighbor in neighbors)]:
+                    groups.remove(group)
+                    group_labels |= group[0]
+                    group_tiles += group[1]
+                groups.append((group_labels, group_tiles))
+            # Each group becomes one pocket, keeping the label of its largest pocket so fewer tiles are labeled again
+            for group_labels, group_tiles in groups:
+                if group_labels:
+                    label = max(group_labels, key=lambda label: len(pockets[label][1]))
+                    tiles_set = set(pockets[label][0])
+                    order = list(pockets[label][1])
+                    for other in group_labels:
+                        if other != label:
+                            tiles_set |= pockets[other][0]
+                            order += pockets[other][1]
+                            for index in pockets[other][1]:
+                                new_labels[index] = label
+                else:
+                    label = len(new_pockets)
+                    tiles_set = set()
+                    order = []
+                    new_pockets.append(None)
+                tiles_set.update(group_tiles)
+                order += group_tiles
+                for index in group_tiles:
+                    new_labels[index] = label
+                new_pockets[label] = (tiles_set, order)
+            self.__pockets[new_layout] = (new_labels, new_pockets)
+            fields = self.__fields.get(layout)
+            if fields:
+                kept = {key: entry for key, entry in fields.items() if not entry[1] & touched}
+                if kept:
+                    self.__fields[new_layout] = kept
+                    self.__field_count += len(kept)
+        return new_layout, changed
+
+    def close_tiles(self, layout, tiles):
+        """Blocks tiles of a layout, such as the tiles of structures built since the last turn
+
+        Args:
+            * layout: A frozenset of the flat indexes, x * 28 + y, of every blocked tile
+            * tiles: The flat indexes to block
+
+        Returns:
+            The new layout. The fields of every pocket that none of the tiles were in are kept
+
+        """
+        closed = frozenset(index for index in tiles if index not in layout and IN_BOUNDS[index])
+        if not closed:
+            return layout
+        new_layout = layout | closed
+        if new_layout not in self.__pockets:
+            labels, pockets = self.__label_pockets(layout)
+            touched = set(labels[index] for index in closed)
+            new_labels = list(labels)
+            new_pockets = list(pockets)
+            for index in closed:
+                new_labels[index] = -1
+            # The rest of each touched pocket may be split in several. The first part keeps the label of the pocket
+            for label in touched:
+                remaining = [index for index in pockets[label][1] if index not in closed]
+                for index in remaining:
+                    new_labels[index] = -2
+                new_pockets[label] = (set(), [])
+                part_label = label
+                for index in remaining:
+                    if new_labels[index] != -2:
+                        continue
+                    if part_label is None:
+                        part_label = len(new_pockets)
+                        new_pockets.append(None)
+                    new_labels[index] = part_label
+                    order = [index]
+                    current = deque(order)
+                    while current:
+                        tile = current.popleft()
+                        for neighbor in _NEIGHBORS[tile]:
+                            if new_labels[neighbor] == -2:
+                                new_labels[neighbor] = part_label
+                                order.append(neighbor)
+                                current.append(neighbor)
+                    new_pockets[part_label] = (set(order), order)
+                    part_label = None
+            self.__pockets[new_layout] = (new_labels, new_pockets)
+            fields = self.__fields.get(layout)
+            if fields:
+                kept = {key: entry for key, entry in fields.items() if not entry[1] & touched}
+                if kept:
+                    self.__fields[new_layout] = kept
+                    self.__field_count += len(kept)
+        return new_layout
+
+    def __label_pockets(self, layout):
+        """
+        Labels every unblocked tile with the pocket it belongs to.
+        Returns the labels, a flat list indexed like layout, and for each pocket a (set of tiles, tiles in flood order) pair.
+        """
+        cached = self.__pockets.get(layout)
+        if cached is not None:
+            return cached
+        labels = [-1] * (ARENA_SIZE * ARENA_SIZE)
+        pockets = []
+        for index in range(ARENA_SIZE * ARENA_SIZE):
+            if not IN_BOUNDS[index] or index in layout or labels[index] >= 0:
+                continue
+            label = len(pockets)
+            labels[index] = label
+            order = [index]
+            current = deque([index])
+            while current:
+                tile = current.popleft()
+                x, y = tile // ARENA_SIZE, tile % ARENA_SIZE
+                for nx, ny in ((x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)):
+                    if 0 <= nx < ARENA_SIZE and 0 <= ny < ARENA_SIZE:
+                        neighbor = nx * ARENA_SIZE + ny
+                        if IN_BOUNDS[neighbor] and labels[neighbor] < 0 and neighbor not in layout:
+                            labels[neighbor] = label
+                            order.append(neighbor)
+                            current.append(neighbor)
+            pockets.append((set(order), order))
+        self.__pockets[layout] = (labels, pockets)
+        return labels, pockets
+
+    def __most_ideal(self, pocket, end_points):
+        """
+        The most ideal tile of a pocket that does not reach the edge. Idealness is different for every tile, so it does not
+        depend on where the search starts.
+        """
+        direction = self.__finder._get_direction_from_endpoints(end_points)
+        up = direction[1] == 1
+        right = direction[0] == 1
+        return max(pocket[1], key=lambda index: 28 * (index % ARENA_SIZE if up else 27 - index % ARENA_SIZE) +
+                   (index // ARENA_SIZE if right else 27 - index // ARENA_SIZE))
+
+    def __validate(self, seeds, layout):
+        """
+        ShortestPathFinder._validate on a flat list: the pathlength of every tile to the seeds, -1 where unreached.
+        """
+        pathlength = [-1] * (ARENA_SIZE * ARENA_SIZE)
+        for index in seeds:
+            pathlength[index] = 0
+        current = deque(seeds)
+        while current:
+            index = current.popleft()
+            if index in layout:
+                continue
+            length = pathlength[index] + 1
+            for neighbor in _NEIGHBORS[index]:
+                if pathlength[neighbor] < 0 and neighbor not in layout:
+                    pathlength[neighbor] = length
+                    current.append(neighbor)
+        return pathlength
+
+    def __get_path(self, start_point, end_points, pathlength, layout):
+        """
+        ShortestPathFinder._get_path and _choose_next_move on a flat pathlength field, giving the same path.
+        """
+        finder = self.__finder
+        path = [start_point]
+        current = start_point[0] * ARENA_SIZE + start_point[1]
+        move_direction = 0
+        while pathlength[current] != 0:
+            x, y = current // ARENA_SIZE, current % ARENA_SIZE
+            best = current
+            best_length = pathlength[current]
+            for neighbor in _NEIGHBORS[current]:
+                if neighbor in layout:
+                    continue
+                length = pathlength[neighbor]
+                if length > best_length:
+                    continue
+                if length == best_length and not finder._better_direction(
+                        [x, y], [neighbor // ARENA_SIZE, neighbor % ARENA_SIZE], [best // ARENA_SIZE, best % ARENA_SIZE], move_direction, end_points):
+                    continue
+                best = neighbor
+                best_length = length
+            move_direction = finder.VERTICAL if current // ARENA_SIZE == best // ARENA_SIZE else finder.HORIZONTAL
+            path.append([best // ARENA_SIZE, best % ARENA_SIZE])
+            current = best
+        return path
+
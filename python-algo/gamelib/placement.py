@@ -0,0 +1,376 @@
+import heapq
+import itertools
+
+from .catalog import UnitCatalog
+from .influence import ARENA_SIZE, HALF_ARENA, IN_BOUNDS, range_offsets
+from .navigation import PathFieldCache
+from .search import apply_action
+
+
+def board_layout(game_state):
+    """The flat indexes, x * 28 + y, of every tile holding a structure, as used by PathFieldCache.path
+    """
+    return frozenset(x * ARENA_SIZE + y for x, y, _, _, _ in game_state.game_map.iter_structures())
+
+
+class PlacementResult:
+    """The structures and upgrades chosen by a placer.
+
+    Attributes :
+        * actions (list): (unit_type, location) builds and (UPGRADE, location) upgrades in the order they
+          were chosen, see search.apply_action
+        * SP (float): The SP the actions cost
+        * value (float): What the actions add to the placer's objective
+
+    """
+    def __init__(self):
+        self.actions = []
+        self.SP = 0.0
+        self.value = 0.0
+
+    def apply(self, game_state):
+        """Queues the actions on a GameState
+
+        Returns:
+            The number of actions that could be queued
+        """
+        return sum(apply_action(game_state, action) for action in self.actions)
+
+    def __repr__(self):
+        return "PlacementResult({}, {} SP, value {:.2f})".format(self.actions, self.SP, self.value)
+
+
+class _Placer:
+    """
+    Base class for placers that choose structures for a set of weighted paths, with diminishing returns.
+    Each path has a running total and a cap. A candidate adds an amount to some of the paths, and is worth the
+    weighted increase of min(cap, total) over them, so candidates are chosen with a lazy greedy search.
+    """
+    def __init__(self, config, catalog=None):
+        """Sets up a placer
+
+        Args:
+            config (JSON): Contains information about the game
+            catalog (:obj: UnitCatalog): The compiled unit information of the game. Compiled from config if None
+
+        """
+        self.catalog = catalog if catalog is not None else UnitCatalog.for_config(config)
+        self.protect_edges = True
+        self.min_value_per_SP = 0.0
+        self._path_fields = PathFieldCache()
+
+    def _path(self, game_state, location, layout):
+        end_points = game_state.game_map.get_edge_locations(game_state.get_target_edge(location))
+        return self._path_fields.path(location, end_points, layout)
+
+    def _free_tiles(self, game_state, layout, excluded=()):
+        """
+        The tiles of your half a structure can be placed on, leaving out your edges if protect_edges is set.
+        """
+        edges = set(excluded)
+        if self.protect_edges:
+            game_map = game_state.game_map
+            for x, y in game_map.get_edge_locations(game_map.BOTTOM_LEFT) + game_map.get_edge_locations(game_map.BOTTOM_RIGHT):
+                edges.add(x * ARENA_SIZE + y)
+        for x in range(ARENA_SIZE):
+            for y in range(HALF_ARENA):
+                index = x * ARENA_SIZE + y
+                if IN_BOUNDS[index] and index not in layout and index not in edges:
+                    yield x, y
+
+    def _choose(self, candidates, weights, totals, caps, SP_left, follow_up=None):
+        """
+        Runs the lazy greedy search. candidates are (action, added, cost) tuples, where added maps path numbers
+        to the amount the action adds to them. follow_up(action) gives a candidate that becomes available once
+        action is chosen, such as its upgrade, or None. totals is updated in place.
+        """
+        def gain(added):
+            value = 0.0
+            for number, amount in added.items():
+                before = totals[number]
+                value += weights[number] * (min(caps[number], before + amount) - min(caps[number], before))
+            return value
+
+        heap = []
+        order = itertools.count()
+
+        def push(candidate):
+            value = gain(candidate[1])
+            if value > 0:
+                heapq.heappush(heap, [-self.__ratio(value, candidate[2]), next(order), candidate])
+
+        for candidate in candidates:
+            push(candidate)
+        result = PlacementResult()
+        while heap:
+            entry = heapq.heappop(heap)
+            action, added, cost = entry[2]
+            if cost > SP_left:
+                continue
+            value = gain(added)
+            ratio = self.__ratio(value, cost)
+            if value <= 0 or ratio < self.min_value_per_SP:
+                continue
+            if heap and ratio < -heap[0][0]:
+                # Another candidate may be better now, check it first
+                entry[0] = -ratio
+                heapq.heappush(heap, entry)
+                continue
+            result.actions.append(action)
+            result.SP += cost
+            result.value += value
+            SP_left -= cost
+            for number, amount in added.items():
+                totals[number] += amount
+            if follow_up is not None:
+                candidate = follow_up(action)
+                if candidate is not None:
+                    push(candidate)
+        return result
+
+    @staticmethod
+    def __ratio(value, cost):
+        return value / cost if cost > 0 else float("inf")
+
+
+class TurretPlacer(_Placer):
+    """Chooses turrets and turret upgrades that deal the most damage to your opponent's likely paths per SP.
+
+    The paths your opponent's mobile units would take from each of their edge tiles are weighted by how
+    likely they are. A stack walking a path takes, every frame, the damage of the turrets in range, so a
+    turret is worth the damage it adds over every path, weighted. The damage a stack can take is capped by
+    its health, so turrets covering a path that is already well defended are worth less. This makes the
+    objective submodular, and it is maximized with a lazy greedy search: candidates are kept in a heap by
+    damage per SP and only the top one is evaluated again after each choice.
+
+    The tiles each candidate covers are read once from the range stencils of influence.range_offsets, and
+    paths come from a PathFieldCache, so a full board takes tens of milliseconds.
+
+    Paths are predicted once per call. A turret placed on a path makes the units step around it, and the path
+    is assumed to stay where it was. By default turrets are never placed on your own edges, where they would
+    block your deploys.
+
+    Attributes :
+        * catalog (:obj: UnitCatalog): The compiled unit information of the game
+        * protect_edges (bool): Whether to keep your edge tiles free for your mobile units
+        * min_value_per_SP (float): Candidates adding less expected damage per SP than this are not chosen
+
+    """
+    def enemy_paths(self, game_state, spawn_weights=None):
+        """Finds the path your opponent's mobile units would take from each of their free edge tiles
+
+        Args:
+            game_state: The GameState of the turn
+            spawn_weights: A dict mapping (x, y) edge tiles to how likely your opponent is to deploy there.
+                Every free edge tile is equally likely if None
+
+        Returns:
+            A list of (path, weight) tuples, with weights adding up to 1
+
+        """
+        game_map = game_state.game_map
+        layout = board_layout(game_state)
+        starts = game_map.get_edge_locations(game_map.TOP_LEFT) + game_map.get_edge_locations(game_map.TOP_RIGHT)
+        paths = []
+        for x, y in starts:
+            weight = 1.0 if spawn_weights is None else spawn_weights.get((x, y), 0.0)
+            if weight <= 0 or x * ARENA_SIZE + y in layout:
+                continue
+            path = self._path(game_state, [x, y], layout)
+            if path:
+                paths.append((path, weight))
+        total = sum(weight for _, weight in paths)
+        return [(path, weight / total) for path, weight in paths]
+
+    def place(self, game_state, paths=None, SP_budget=None, unit_type=None, count=None, upgrades=True):
+        """Chooses turrets and upgrades for the paths of your opponent's mobile units
+
+        Turrets already on the board count towards the damage on each path, through the ThreatMap.
+
+        Args:
+            game_state: The GameState of the turn, with anything already queued
+            paths: A list of (path, weight) tuples. enemy_paths(game_state) if None
+            SP_budget: The most SP to spend. All of your SP if None
+            unit_type: The mobile unit type expected on the paths. Scouts if None
+            count: The number of units expected in a stack. As many as your opponent's MP buys if None
+            upgrades: Whether upgrades of your turrets are candidates too
+
+        Returns:
+            A PlacementResult, not applied to game_state
+
+        """
+        catalog = self.catalog
+        turret = catalog.TURRET
+        if paths is None:
+            paths = self.enemy_paths(game_state)
+        if unit_type is None:
+            unit_type = catalog.SCOUT
+        available = game_state.get_resource(game_state.SP)
+        SP_left = available if SP_budget is None else min(SP_budget, available)
+        mover = catalog.stats(unit_type)
+        if count is None:
+            count = max(1, int(game_state.get_resource(game_state.MP, 1) // catalog.cost(unit_type)[game_state.MP]))
+        frames = max(1, int(round(1 / mover.speed))) if mover.speed > 0 else 1
+        cap = count * mover.max_health
+
+        # The weight and damage dealt so far of every path, and the paths that walk through every tile
+        damage_grid = game_state.threat_map.damage[1]
+        weights = []
+        dealt = []
+        visits = {}
+        for number, (path, weight) in enumerate(paths):
+            weights.append(weight)
+            walked = [x * ARENA_SIZE + y for x, y in path[:-1]]
+            dealt.append(frames * sum(damage_grid[index] for index in walked))
+            for index in walked:
+                visits.setdefault(index, []).append(number)
+
+        base = catalog.stats(turret)
+        upgraded = catalog.stats(turret, True)
+        cost = catalog.cost(turret)[game_state.SP]
+        upgrade_cost = catalog.cost(turret, True)[game_state.SP]
+        can_upgrade = upgrades and catalog.can_upgrade(turret)
+
+        def covered(x, y, attack_range):
+            hits = {}
+            for dx, dy in range_offsets(attack_range):
+                tx, ty = x + dx, y + dy
+                if 0 <= tx < ARENA_SIZE and 0 <= ty < ARENA_SIZE:
+                    for number in visits.get(tx * ARENA_SIZE + ty, ()):
+                        hits[number] = hits.get(number, 0) + 1
+            return hits
+
+        def upgrade_damage(x, y):
+            added = {number: upgraded.damage_i * frames * hits for number, hits in covered(x, y, upgraded.attackRange).items()}
+            for number, hits in covered(x, y, base.attackRange).items():
+                added[number] = added.get(number, 0) - base.damage_i * frames * hits
+            return added
+
+        layout = board_layout(game_state)
+        candidates = []
+        for x, y in self._free_tiles(game_state, layout):
+            added = {number: base.damage_i * frames * hits for number, hits in covered(x, y, base.attackRange).items()}
+            candidates.append(((turret, [x, y]), added, cost))
+        if can_upgrade:
+            for x, y, structure_type, player_index, is_upgraded in game_state.game_map.iter_structures():
+                if structure_type == turret and player_index == 0 and not is_upgraded:
+                    candidates.append(((catalog.UPGRADE, [x, y]), upgrade_damage(x, y), upgrade_cost))
+
+        def follow_up(action):
+            if action[0] == turret and can_upgrade:
+                return (catalog.UPGRADE, action[1]), upgrade_damage(*action[1]), upgrade_cost
+
+        return self._choose(candidates, weights, dealt, [cap] * len(weights), SP_left, follow_up)
+
+
+class SupportPlacer(_Placer):
+    """Chooses supports and support upgrades that shield your planned mobile stacks the most per SP.
+
+    Each stack walks the path find_path_to_edge gives from its deploy tile. A support shields every unit of a
+    stack once, when it first comes within shieldRange, by shieldPerUnit plus shieldBonusPerY for each row the
+    support is away from your edge, so supports further up and close to a path are worth more. Shield is only
+    useful up to the damage the stack takes on its path, read from the ThreatMap, so stacks that are already
+    well shielded, or walk where no turret reaches, get nothing more. Like TurretPlacer, the objective is
+    maximized with a lazy greedy search over range stencils.
+
+    Supports are never placed on the paths of your stacks, where they would block them, and by default never
+    on your own edges.
+
+    Attributes :
+        * catalog (:obj: UnitCatalog): The compiled unit information of the game
+        * protect_edges (bool): Whether to keep your edge tiles free for your mobile units
+        * min_value_per_SP (float): Candidates adding less useful shield per SP than this are not chosen
+
+    """
+    def planned_stacks(self, game_state):
+        """Groups the mobile units queued this turn into stacks
+
+        Returns:
+            A list of (unit_type, location, count) tuples, one for every unit type and deploy tile
+        """
+        counts = {}
+        for unit_type, x, y in game_state.current_plan()[1]:
+            if not self.catalog.is_stationary(unit_type) and unit_type != self.catalog.REMOVE:
+                counts[(unit_type, x, y)] = counts.get((unit_type, x, y), 0) + 1
+        return [(unit_type, [x, y], count) for (unit_type, x, y), count in counts.items()]
+
+    def place(self, game_state, stacks=None, SP_budget=None, upgrades=True):
+        """Chooses supports and upgrades for the paths of your mobile stacks
+
+        Supports already on the board count towards the shield of each stack, through the ShieldMap.
+
+        Args:
+            game_state: The GameState of the turn, with anything already queued
+            stacks: A list of (unit_type, location, count) stacks you plan to deploy. planned_stacks(game_state) if None
+            SP_budget: The most SP to spend. All of your SP if None
+            upgrades: Whether upgrades of your supports are candidates too
+
+        Returns:
+            A PlacementResult, not applied to game_state
+
+        """
+        catalog = self.catalog
+        support = catalog.SUPPORT
+        if stacks is None:
+            stacks = self.planned_stacks(game_state)
+        available = game_state.get_resource(game_state.SP)
+        SP_left = available if SP_budget is None else min(SP_budget, available)
+
+        # For every stack, the shield it needs and already gets, and the stacks that walk through every tile
+        layout = board_layout(game_state)
+        damage_grid = game_state.threat_map.damage[0]
+        counts = []
+        needed = []
+        shielded = []
+        visits = {}
+        routes = set()
+        for unit_type, location, count in stacks:
+            path = self._path(game_state, list(location), layout)
+            if not path or count <= 0:
+                continue
+            stats = catalog.stats(unit_type)
+            frames = max(1, int(round(1 / stats.speed))) if stats.speed > 0 else 1
+            number = len(counts)
+            walked = [x * ARENA_SIZE + y for x, y in path[:-1]]
+            counts.append(count)
+            needed.append(frames * sum(damage_grid[index] for index in walked))
+            shielded.append(count * game_state.shield_map.path_shield(path[:-1], 0))
+            for index in walked:
+                visits.setdefault(index, set()).add(number)
+            routes.update(x * ARENA_SIZE + y for x, y in path)
+
+        base = catalog.stats(support)
+        upgraded = catalog.stats(support, True)
+        cost = catalog.cost(support)[game_state.SP]
+        upgrade_cost = catalog.cost(support, True)[game_state.SP]
+        can_upgrade = upgrades and catalog.can_upgrade(support)
+
+        def covered(x, y, stats):
+            reached = set()
+            for dx, dy in range_offsets(stats.shieldRange):
+                tx, ty = x + dx, y + dy
+                if 0 <= tx < ARENA_SIZE and 0 <= ty < ARENA_SIZE:
+                    reached.update(visits.get(tx * ARENA_SIZE + ty, ()))
+            amount = stats.shieldPerUnit + stats.shieldBonusPerY * y
+            return {number: counts[number] * amount for number in reached}
+
+        def upgrade_shield(x, y):
+            added = covered(x, y, upgraded)
+            for number, amount in covered(x, y, base).items():
+                added[number] = added.get(number, 0) - amount
+            return added
+
+        candidates = []
+        if base.shieldRange > 0:
+            for x, y in self._free_tiles(game_state, layout, routes):
+                candidates.append(((support, [x, y]), covered(x, y, base), cost))
+        if can_upgrade:
+            for x, y, structure_type, player_index, is_upgraded in game_state.game_map.iter_structures():
+                if structure_type == support and player_index == 0 and not is_upgraded:
+                    candidates.append(((catalog.UPGRADE, [x, y]), upgrade_shield(x, y), upgrade_cost))
+
+        def follow_up(action):
+            if action[0] == support and can_upgrade:
+                return (catalog.UPGRADE, action[1]), upgrade_shield(*action[1]), upgrade_cost
+
+        return self._choose(candidates, [1.0] * len(counts), shielded, needed, SP_left, follow_up)
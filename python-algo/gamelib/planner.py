@@ -0,0 +1,186 @@
+import threading
+import time
+import traceback
+
+from .util import log, DEBUG, WARNING, ERROR
+
+
+class TurnBudget:
+    """The time each turn may take, read from the engine's limits and calibrated with my_time.
+
+    The engine measures a turn from when it sends the game state to when it reads the deploy phase, which
+    includes the time spent passing messages. Every turn, the time the engine reported for the previous turn,
+    my_time, is compared to the time measured in the algo, and the difference is kept as an estimate of that
+    overhead and taken off the next budget.
+
+    Attributes :
+        * limit_seconds (float): The engine's soft time limit, waitTimeBotSoft, or waitTimeBotMax if it is lower
+        * fraction (float): The share of the limit a turn may use, leaving the rest as a safety margin
+        * min_seconds (float): The smallest budget a turn gets, whatever the overhead
+        * overhead_seconds (float): The estimated time the engine counts that the algo does not measure
+
+    """
+    def __init__(self, config, fraction=0.8, min_seconds=0.2):
+        """Reads the time limits from config["timingAndReplay"]
+
+        Args:
+            config (JSON): Contains information about the game
+            fraction: The share of the limit a turn may use
+            min_seconds: The smallest budget a turn gets
+
+        """
+        timing = config.get("timingAndReplay", {})
+        limit = min(timing.get("waitTimeBotSoft", 5000), timing.get("waitTimeBotMax", 35000))
+        self.limit_seconds = limit / 1000
+        self.fraction = fraction
+        self.min_seconds = min_seconds
+        self.overhead_seconds = 0.0
+        self.__measured = None
+
+    @property
+    def seconds(self):
+        """The time the next turn may take
+        """
+        return max(self.min_seconds, self.limit_seconds * self.fraction - self.overhead_seconds)
+
+    def start(self, state, turn_start):
+        """Calibrates the budget with the time the engine reported for the previous turn
+
+        Args:
+            state: The game state of the turn, as a decoded json object
+            turn_start: The time.monotonic() at which the turn was received
+
+        Returns:
+            The time.monotonic() by which the turn should be submitted
+
+        """
+        my_time = float(state["p1Stats"][3]) / 1000
+        if self.__measured is not None and my_time > 0:
+            overhead = max(0.0, my_time - self.__measured)
+            self.overhead_seconds = overhead if self.overhead_seconds == 0 else (self.overhead_seconds + overhead) / 2
+        return turn_start + self.seconds
+
+    def finish(self, seconds):
+        """Records how long the turn took to submit, as measured by the algo
+        """
+        self.__measured = seconds
+
+
+class TurnPlanner:
+    """Runs the stages of a turn in order of priority until its deadline, always holding a plan to submit.
+
+    Stages are functions called with the GameState, which queue builds and deploys with attempt_spawn and
+    the other GameState functions. After each stage the builds and deploys queued so far are committed as the
+    best plan so far. Stages run from the highest priority to the lowest, and those left when the deadline
+    passes are skipped. A stage that raises is logged, whatever it queued is rolled back with
+    GameState.rollback, and the next one runs.
+
+    While stages run, a watchdog thread waits for the deadline. If the turn is not submitted by then, it
+    submits the last committed plan, so a slow stage, such as a slow path query, costs the rest of the
+    plan instead of the whole turn. GameState.submit_turn only sends the first plan it is given.
+
+    Attributes :
+        * game_state (:obj: GameState): The GameState of the turn
+        * deadline (float): The time.monotonic() by which the turn is submitted
+        * stages (list): (priority, name, function) for every stage added
+        * completed (list): The names of the stages that ran to the end
+        * skipped (list): The names of the stages skipped because the deadline passed
+        * plan (tuple): The last committed (build_stack, deploy_stack)
+        * submitted_at (float): The time.monotonic() at which the turn was submitted, None before
+        * timed_out (bool): Whether the watchdog submitted the turn
+
+    """
+    def __init__(self, game_state, deadline):
+        """Sets up a planner. Nothing runs until run is called
+
+        Args:
+            game_state: The GameState of the turn
+            deadline: The time.monotonic() by which the turn must be submitted, usually AlgoCore.turn_deadline
+
+        """
+        self.game_state = game_state
+        self.deadline = deadline
+        self.stages = []
+        self.completed = []
+        self.skipped = []
+        self.plan = game_state.current_plan()
+        self.submitted_at = None
+        self.timed_out = False
+        self._stage_name = None
+        self._done = threading.Event()
+
+    def add_stage(self, function, priority=0, name=None):
+        """Adds a stage to run
+
+        Args:
+            function: Called as function(game_state)
+            priority: Stages with a higher priority run first. Stages with the same priority run in the order they were added
+            name: The name used in logs. The name of the function if None
+
+        """
+        self.stages.append((priority, name or getattr(function, "__name__", repr(function)), function))
+
+    def time_left(self):
+        """The number of seconds before the deadline, negative once it passed
+        """
+        return self.deadline - time.monotonic()
+
+    @property
+    def expired(self):
+        """Whether the deadline passed or the turn was already submitted. Long stages can check it to stop early
+        """
+        return self.game_state.submitted or self.time_left() <= 0
+
+    def commit(self):
+        """Records the builds and deploys queued so far as the plan the watchdog submits
+        """
+        self.plan = self.game_state.current_plan()
+
+    def run(self):
+        """Runs the stages, then submits the turn
+
+        Returns:
+            True if the whole plan was submitted, False if the watchdog submitted the turn before the stages finished
+
+        """
+        watchdog = threading.Thread(target=self.__watch, name="gamelib-turn-watchdog", daemon=True)
+        watchdog.start()
+        try:
+            for priority, name, function in sorted(self.stages, key=lambda stage: -stage[0]):
+                if self.expired:
+                    self.skipped.append(name)
+                    continue
+                self._stage_name = name
+                checkpoint = self.game_state.checkpoint()
+                try:
+                    function(self.game_state)
+                except Exception:
+                    log(ERROR, "Stage {} failed, rolling back what it queued:\n{}", name, traceback.format_exc())
+                    self.game_state.rollback(checkpoint)
+                    continue
+                self.completed.append(name)
+                self.commit()
+            self._stage_name = None
+            if self.skipped:
+                log(WARNING, "Turn {} ran out of time, skipped stages {}", self.game_state.turn_number, self.skipped)
+            self.__submit(self.plan)
+        finally:
+            self._done.set()
+            watchdog.join()
+        return not self.timed_out
+
+    def __submit(self, plan):
+        if self.game_state.submit_turn(plan):
+            self.submitted_at = time.monotonic()
+            return True
+        return False
+
+    def __watch(self):
+        if self._done.wait(max(0.0, self.time_left())):
+            return
+        if self.__submit(self.plan):
+            self.timed_out = True
+            log(WARNING, "Turn {} hit its deadline during stage {}, submitted the plan of stages {}",
+                self.game_state.turn_number, self._stage_name, self.completed)
+        else:
+            log(DEBUG, "Turn {} hit its deadline after it was submitted", self.game_state.turn_number)
@@ -0,0 +1,303 @@
+"""
+Checks the simulator against replay files, without the game engine.
+
+Every action phase is simulated from the structures of its frame 0 and the mobile units of its spawn events,
+and each simulated frame is compared to the recorded one. The exit code is 1 if any turn diverges.
+
+Run it from the python-algo folder with one or more replay files or folders of replays:
+
+    python -m gamelib.replay replays/ --verbose
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+from .catalog import UnitCatalog
+from .game_state import GameState
+from .simulator import Simulator
+
+
+class Replay:
+    """The frames of a replay file.
+
+    A replay holds one json object per line: the config, then the state sent at the start of each turn and
+    every frame of each action phase. Lines holding a "debug" entry are the config.
+
+    Attributes :
+        * path (str): The file the replay was loaded from
+        * config (JSON): The config of the game
+        * action_frames (dict): Maps each turn number to the list of its action frames, in frame order
+
+    """
+    def __init__(self, path):
+        self.path = path
+        self.config = None
+        self.action_frames = {}
+        with open(path) as replay_file:
+            for line in replay_file:
+                line = line.strip()
+                if not line:
+                    continue
+                data = json.loads(line)
+                if "debug" in data:
+                    self.config = data
+                elif data.get("turnInfo", [None])[0] == 1:
+                    self.action_frames.setdefault(data["turnInfo"][1], []).append(data)
+        if self.config is None:
+            raise ValueError("{} has no config line".format(path))
+        for frames in self.action_frames.values():
+            frames.sort(key=lambda frame: frame["turnInfo"][2])
+
+    @property
+    def turns(self):
+        """The turn numbers that have an action phase, in order
+        """
+        return sorted(self.action_frames)
+
+
+class TurnCheck:
+    """How the simulation of one action phase compares to its recorded frames.
+
+    Attributes :
+        * turn (int): The turn number
+        * recorded_frames (int): The number of frames in the replay
+        * simulated_frames (int): The number of frames the simulator ran
+        * mismatched_units (list): For each compared frame, the number of units not found at the same place in both
+        * health_error (list): For each compared frame, the total health difference of the units found in both
+        * first_divergent_frame (int): The first frame that differs, None if every frame matches
+        * health (tuple): The (simulated, recorded) health of both players at the end of the action phase
+        * seconds (float): The time spent simulating, without the comparison
+
+    """
+    def __init__(self, turn, recorded_frames):
+        self.turn = turn
+        self.recorded_frames = recorded_frames
+        self.simulated_frames = 0
+        self.mismatched_units = []
+        self.health_error = []
+        self.first_divergent_frame = None
+        self.health = None
+        self.seconds = 0.0
+
+    @property
+    def diverged(self):
+        return self.first_divergent_frame is not None
+
+    def __repr__(self):
+        return "TurnCheck(turn {}, {}/{} frames, first divergent frame {})".format(
+            self.turn, self.simulated_frames, self.recorded_frames, self.first_divergent_frame)
+
+
+class ReplayCheck:
+    """The TurnChecks of a whole replay.
+
+    Attributes :
+        * path (str): The replay file
+        * turns (list): A TurnCheck for every action phase
+        * frames (int): The number of frames simulated
+        * seconds (float): The time spent simulating
+
+    """
+    def __init__(self, path):
+        self.path = path
+        self.turns = []
+        self.frames = 0
+        self.seconds = 0.0
+
+    @property
+    def frames_per_second(self):
+        return self.frames / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def divergent_turns(self):
+        return [check.turn for check in self.turns if check.diverged]
+
+    def add(self, check):
+        self.turns.append(check)
+        self.frames += check.simulated_frames
+        self.seconds += check.seconds
+
+
+def recorded_units(frame, catalog):
+    """Counts the units of a recorded frame
+
+    Args:
+        frame: A frame of a replay
+        catalog: The UnitCatalog of the game
+
+    Returns:
+        A tuple of two Counters keyed by (player_index, unit_type, x, y), one counting units and one summing their health
+
+    """
+    counts = Counter()
+    health = Counter()
+    for player_index, key in ((0, "p1Units"), (1, "p2Units")):
+        for type_code, entries in enumerate(frame[key][:len(catalog.shorthands)]):
+            unit_type = catalog.shorthands[type_code]
+            if unit_type in (catalog.REMOVE, catalog.UPGRADE):
+                continue
+            for entry in entries:
+                location = (player_index, unit_type, int(entry[0]), int(entry[1]))
+                counts[location] += 1
+                health[location] += float(entry[2])
+    return counts, health
+
+
+def simulated_units(units):
+    """Counts SimUnits the same way as recorded_units
+    """
+    counts = Counter()
+    health = Counter()
+    for unit in units:
+        location = (unit.player_index, unit.unit_type, unit.x, unit.y)
+        counts[location] += 1
+        health[location] += unit.health
+    return counts, health
+
+
+def compare_units(simulated, recorded):
+    """Compares the unit counts of a simulated and a recorded frame
+
+    Returns:
+        The number of units not found at the same place in both, and the total health difference
+        of the places holding the same units in both
+
+    """
+    simulated_counts, simulated_health = simulated
+    recorded_counts, recorded_health = recorded
+    mismatched = 0
+    health_error = 0.0
+    for location in simulated_counts.keys() | recorded_counts.keys():
+        difference = abs(simulated_counts[location] - recorded_counts[location])
+        if difference:
+            mismatched += difference
+        else:
+            health_error += abs(simulated_health[location] - recorded_health[location])
+    return mismatched, health_error
+
+
+def _starting_state(config, frame, catalog):
+    """
+    The game state of frame 0 of an action phase without its mobile units, and the deploys of both players
+    in spawn order, read from the spawn events.
+    """
+    mobile_types = (catalog.SCOUT, catalog.DEMOLISHER, catalog.INTERCEPTOR)
+    state = dict(frame)
+    for key in ("p1Units", "p2Units"):
+        state[key] = [[] if unit_type in mobile_types else units for unit_type, units in zip(catalog.shorthands, frame[key])]
+    game_state = GameState(config, state, catalog=catalog)
+    game_state.suppress_warnings(True)
+    deploys = ([], [])
+    for event in frame.get("events", {}).get("spawn", []):
+        location, type_code, player = event[0], event[1], event[3]
+        unit_type = catalog.shorthands[type_code] if type_code < len(catalog.shorthands) else None
+        if unit_type in mobile_types:
+            deploys[player - 1].append((unit_type, location))
+    return game_state, deploys
+
+
+def check_turn(simulator, turn, frames, tolerance=1e-6):
+    """Simulates an action phase from its frame 0 and compares every frame to the recorded ones
+
+    Args:
+        simulator: The Simulator to check
+        turn: The turn number
+        frames: The recorded action frames of that turn, in order
+        tolerance: The largest health error that still counts as matching
+
+    Returns:
+        A TurnCheck
+
+    """
+    catalog = simulator.catalog
+    check = TurnCheck(turn, len(frames))
+    game_state, deploys = _starting_state(simulator.config, frames[0], catalog)
+
+    start = time.perf_counter()
+    simulator.simulate(game_state, deploys[0], deploys[1])
+    check.seconds = time.perf_counter() - start
+
+    simulated = []
+    result = simulator.simulate(game_state, deploys[0], deploys[1],
+                                on_frame=lambda frame, units: simulated.append(simulated_units(units)))
+    check.simulated_frames = result.frames
+    for frame, recorded in zip(simulated, frames):
+        mismatched, health_error = compare_units(frame, recorded_units(recorded, catalog))
+        check.mismatched_units.append(mismatched)
+        check.health_error.append(health_error)
+        if check.first_divergent_frame is None and (mismatched or health_error > tolerance):
+            check.first_divergent_frame = len(check.mismatched_units) - 1
+    if check.first_divergent_frame is None and len(simulated) != len(frames):
+        check.first_divergent_frame = min(len(simulated), len(frames))
+    last = frames[-1]
+    check.health = (tuple(result.health), (float(last["p1Stats"][0]), float(last["p2Stats"][0])))
+    return check
+
+
+def check_replay(path, simulator=None):
+    """Checks the simulator against every action phase of a replay file
+
+    Args:
+        path: The replay file
+        simulator: The Simulator to check. A new one is made from the replay's config if None
+
+    Returns:
+        A ReplayCheck
+
+    """
+    replay = Replay(path)
+    if simulator is None:
+        simulator = Simulator(replay.config, UnitCatalog.for_config(replay.config))
+    report = ReplayCheck(path)
+    for turn in replay.turns:
+        report.add(check_turn(simulator, turn, replay.action_frames[turn]))
+    return report
+
+
+def _replay_paths(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith(".replay"):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compares the gamelib simulator to the frames of replay files")
+    parser.add_argument("paths", nargs="+", help="replay files, or folders holding .replay files")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print every divergent turn")
+    args = parser.parse_args(argv)
+
+    frames = 0
+    seconds = 0.0
+    divergent = 0
+    turns = 0
+    for path in _replay_paths(args.paths):
+        report = check_replay(path)
+        frames += report.frames
+        seconds += report.seconds
+        turns += len(report.turns)
+        divergent += len(report.divergent_turns)
+        print("{}: {}/{} turns diverge, {} frames at {:.0f} frames/s".format(
+            path, len(report.divergent_turns), len(report.turns), report.frames, report.frames_per_second))
+        if args.verbose:
+            for check in report.turns:
+                if check.diverged:
+                    frame = check.first_divergent_frame
+                    print("  turn {}: frame {} of {}/{}, {} units mismatched, health error {:.2f}, end health {} recorded {}".format(
+                        check.turn, frame, check.simulated_frames, check.recorded_frames,
+                        check.mismatched_units[frame] if frame < len(check.mismatched_units) else "-",
+                        check.health_error[frame] if frame < len(check.health_error) else 0.0,
+                        list(check.health[0]), list(check.health[1])))
+    print("Total: {}/{} turns diverge, {} frames at {:.0f} frames/s".format(
+        divergent, turns, frames, frames / seconds if seconds > 0 else 0.0))
+    return 1 if divergent else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
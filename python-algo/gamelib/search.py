@@ -0,0 +1,284 @@
+import random
+import time
+
+from .sim_cache import board_key
+from .simulator import Simulator
+
+
+def apply_action(game_state, action):
+    """Queues one action of a plan on a GameState
+
+    Args:
+        game_state: The GameState to change
+        action: (structure_type, location) to build, (UPGRADE, location) to upgrade, or
+            (mobile_type, location, count) to deploy up to count mobile units
+
+    Returns:
+        True if anything was queued
+
+    """
+    unit_type, location = action[0], action[1]
+    if unit_type == game_state.catalog.UPGRADE:
+        return bool(game_state.attempt_upgrade(location))
+    if game_state.catalog.is_stationary(unit_type):
+        return bool(game_state.attempt_spawn(unit_type, location))
+    return bool(game_state.attempt_spawn(unit_type, location, action[2] if len(action) > 2 else 1))
+
+
+def sample_enemy_responses(game_state, samples=3, rng=random):
+    """Guesses what your opponent may deploy during the next action phase
+
+    Each response spends all of your opponent's MP on scouts or demolishers from one of their unblocked
+    edge tiles. An empty response is always included.
+
+    Args:
+        game_state: The GameState of the turn
+        samples: The number of responses to draw, besides the empty one
+        rng: The random number generator to draw them with
+
+    Returns:
+        A list of enemy deploy lists, in the form of the enemy_deploys argument of Simulator.simulate
+
+    """
+    catalog = game_state.catalog
+    game_map = game_state.game_map
+    edges = game_map.get_edge_locations(game_map.TOP_LEFT) + game_map.get_edge_locations(game_map.TOP_RIGHT)
+    edges = [location for location in edges if not game_state.contains_stationary_unit(location)]
+    MP = game_state.get_resource(game_state.MP, 1)
+    responses = [[]]
+    if not edges:
+        return responses
+    for _ in range(samples):
+        unit_type = rng.choice((catalog.SCOUT, catalog.DEMOLISHER))
+        count = int(MP // catalog.cost(unit_type)[game_state.MP])
+        if count > 0:
+            responses.append([(unit_type, rng.choice(edges), count)])
+    return responses
+
+
+def plan_task(context, game_state, actions, enemy_responses):
+    """An evaluation task that simulates the action phase following a plan, see PlanSearch
+
+    The plan is queued on game_state between a checkpoint and a rollback, so game_state is left as it was.
+
+    Returns:
+        A list with the SimulationResult against each enemy response, with an empty structures list to keep it small
+
+    """
+    checkpoint = game_state.checkpoint()
+    try:
+        for action in actions:
+            apply_action(game_state, action)
+        results = []
+        for enemy_deploys in enemy_responses:
+            result = context.simulator.simulate(game_state, (), enemy_deploys)
+            result.structures = []
+            results.append(result)
+        return results
+    finally:
+        game_state.rollback(checkpoint)
+
+
+class PlanSearchResult:
+    """The best plan found by PlanSearch.search.
+
+    Attributes :
+        * actions (tuple): The actions of the plan, in the order they are applied
+        * score (float): The average score of the plan over the enemy responses
+        * evaluated (int): The number of plans simulated
+        * timed_out (bool): Whether the search stopped at its time limit before finishing
+
+    """
+    def __init__(self, actions, score):
+        self.actions = actions
+        self.score = score
+        self.evaluated = 0
+        self.timed_out = False
+
+    def apply(self, game_state):
+        """Queues the actions of the plan on a GameState
+
+        Returns:
+            The number of actions that could be queued
+        """
+        return sum(apply_action(game_state, action) for action in self.actions)
+
+    def __repr__(self):
+        return "PlanSearchResult({}, score {:.2f}, {} plans evaluated)".format(list(self.actions), self.score, self.evaluated)
+
+
+class PlanSearch:
+    """Picks structures, upgrades and mobile deploys together with a beam search scored by the simulator.
+
+    A plan is a set of candidate actions, see apply_action. The search starts from the empty plan and adds one
+    action at a time to each of the beam_width best plans, keeping the best children, until plans hold
+    max_actions actions or no action can be added. The action phase that follows each plan is simulated against
+    every enemy response, and the score of a plan is the average of score_result over those simulations.
+
+    Each step of the beam is checked on the GameState between a checkpoint and a rollback, which drops plans
+    that cannot be queued or that spend more than SP_budget or MP_budget. Plans found in the cache are scored
+    right away, and the others are simulated together with plan_task, on the workers of the EvaluationService
+    if one is given. The search stops at its time limit with the best plan found so far.
+
+    Attributes :
+        * simulator (:obj: Simulator): The simulator scoring plans when there is no evaluation service
+        * cache (:obj: SimulationCache): If set, simulations are looked up in it first and stored in it
+        * evaluation (:obj: EvaluationService): If set, simulations run on it, usually AlgoCore.evaluation
+        * beam_width (int): The number of plans extended at each step
+        * max_actions (int): The largest number of actions in a plan
+        * structure_weight (float): The score of each SP of structures destroyed, yours counting against you
+        * build_weight (float): The score of each SP spent on structures this turn, for the turns they last after it
+
+    """
+    def __init__(self, config, catalog=None, cache=None, beam_width=4, max_actions=4, evaluation=None):
+        """Sets up a search
+
+        Args:
+            config (JSON): Contains information about the game
+            catalog (:obj: UnitCatalog): The compiled unit information of the game. Compiled from config if None
+            cache (:obj: SimulationCache): Used to look up simulations, usually AlgoCore.simulation_cache
+            beam_width: The number of plans extended at each step
+            max_actions: The largest number of actions in a plan
+            evaluation (:obj: EvaluationService): Runs the simulations of each step, usually AlgoCore.evaluation.
+                They run one after another in the main process if None
+
+        """
+        self.simulator = Simulator(config, catalog)
+        self.cache = cache
+        self.evaluation = evaluation
+        self.beam_width = beam_width
+        self.max_actions = max_actions
+        self.structure_weight = 0.1
+        self.build_weight = 0.05
+
+    def score_result(self, game_state, result, start_health, SP_spent):
+        """Scores the simulated action phase of a plan. Override it to change what the search looks for
+
+        Args:
+            game_state: The GameState with the plan queued
+            result: The SimulationResult of the action phase
+            start_health: The health of both players before the action phase
+            SP_spent: The SP the plan spends on structures and upgrades
+
+        Returns:
+            The score, higher is better. By default the enemy health lost minus yours, plus structure_weight
+            times the SP of structures destroyed, and build_weight times SP_spent
+
+        """
+        score = (start_health[1] - result.health[1]) - (start_health[0] - result.health[0])
+        catalog = game_state.catalog
+        for _, _, unit_type, player_index in result.structures_destroyed:
+            value = catalog.cost(unit_type)[game_state.SP] * self.structure_weight
+            score += value if player_index == 1 else -value
+        return score + SP_spent * self.build_weight
+
+    def search(self, game_state, actions, enemy_responses=None, time_limit=None, SP_budget=None, MP_budget=None):
+        """Finds the best plan made of some of the candidate actions. game_state is left as it was
+
+        Args:
+            game_state: The GameState of the turn, with anything already queued
+            actions: The candidate actions, see apply_action
+            enemy_responses: A list of enemy deploy lists to simulate each plan against. sample_enemy_responses if None
+            time_limit: The number of seconds the search may take, None for no limit
+            SP_budget: The most SP a plan may spend, None for all of it
+            MP_budget: The most MP a plan may spend, None for all of it
+
+        Returns:
+            A PlanSearchResult
+
+        """
+        deadline = None if time_limit is None else time.monotonic() + time_limit
+        if enemy_responses is None:
+            enemy_responses = sample_enemy_responses(game_state)
+        actions = list(actions)
+        budget = (SP_budget, MP_budget)
+        root = game_state.checkpoint()
+
+        best = PlanSearchResult((), float("-inf"))
+        seen = {frozenset()}
+        try:
+            beam = self.__evaluate(game_state, [()], actions, enemy_responses, budget, deadline, root, best)
+            if beam:
+                best.score = beam[0][1]
+            for _ in range(self.max_actions):
+                if not beam or best.timed_out:
+                    break
+                children = []
+                for plan, _ in beam:
+                    for index in range(len(actions)):
+                        key = frozenset(plan + (index,))
+                        if index not in plan and key not in seen:
+                            seen.add(key)
+                            children.append(plan + (index,))
+                scored = self.__evaluate(game_state, children, actions, enemy_responses, budget, deadline, root, best)
+                if not scored:
+                    break
+                scored.sort(key=lambda child: -child[1])
+                if scored[0][1] > best.score:
+                    best.actions = tuple(actions[index] for index in scored[0][0])
+                    best.score = scored[0][1]
+                beam = scored[:self.beam_width]
+        finally:
+            game_state.rollback(root)
+        if best.score == float("-inf"):
+            best.score = 0.0
+        return best
+
+    def __evaluate(self, game_state, plans, actions, enemy_responses, budget, deadline, root, best):
+        """
+        Scores a step of the beam. Plans are checked and looked up in the cache on game_state, and those left
+        are simulated in one batch. Returns (plan, score) for every plan scored before the deadline.
+        """
+        start_health = (game_state.my_health, game_state.enemy_health)
+        start_SP, start_MP = game_state.get_resources()
+        scored = []
+        pending = []
+        for plan in plans:
+            if deadline is not None and time.monotonic() >= deadline:
+                best.timed_out = True
+                break
+            if all(apply_action(game_state, actions[index]) for index in plan):
+                SP, MP = game_state.get_resources()
+                if ((budget[0] is None or start_SP - SP <= budget[0]) and
+                        (budget[1] is None or start_MP - MP <= budget[1])):
+                    board = board_key(game_state) if self.cache is not None else None
+                    results = [None]
+                    if board is not None:
+                        results = [self.cache.get(game_state, (), enemy_deploys, board) for enemy_deploys in enemy_responses]
+                    if None in results:
+                        pending.append((plan, board))
+                    else:
+                        scored.append((plan, self.__average(game_state, results, start_health, start_SP - SP)))
+            game_state.rollback(root)
+
+        if pending:
+            items = [(tuple(actions[index] for index in plan), enemy_responses) for plan, _ in pending]
+            if self.evaluation is not None:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                simulated = self.evaluation.evaluate(plan_task, game_state, items, timeout)
+            else:
+                simulated = []
+                for item in items:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        break
+                    simulated.append(plan_task(self, game_state, *item))
+            for (plan, board), results in zip(pending, simulated):
+                if results is None:
+                    continue
+                for index in plan:
+                    apply_action(game_state, actions[index])
+                if self.cache is not None:
+                    for enemy_deploys, result in zip(enemy_responses, results):
+                        self.cache.put(game_state, (), enemy_deploys, result, board)
+                scored.append((plan, self.__average(game_state, results, start_health, start_SP - game_state.get_resource(game_state.SP))))
+                game_state.rollback(root)
+            if len(scored) < len(plans) and deadline is not None and time.monotonic() >= deadline:
+                best.timed_out = True
+        best.evaluated += len(scored)
+        return scored
+
+    def __average(self, game_state, results, start_health, SP_spent):
+        """
+        The average score of the plan queued on game_state over the results against every enemy response.
+        """
+        return sum(self.score_result(game_state, result, start_health, SP_spent) for result in results) / len(results)
@@ -0,0 +1,105 @@
+import struct
+from multiprocessing import shared_memory
+
+# Layout of the shared block: a header, then a GameState.to_bytes snapshot
+_HEADER = struct.Struct("<QI")              # generation, snapshot length
+_SNAPSHOT_OFFSET = 64
+
+
+class SharedBoard:
+    """A board snapshot written once per turn into shared memory and read by worker processes without pickling.
+
+    The block holds a GameState.to_bytes snapshot of the board, with its structures, mobile stacks and resources.
+    The parent makes it with SharedBoard.create and writes boards with write. Workers attach to it by name and
+    copy the snapshot out only when the board changed, so each turn's board crosses the process boundary once
+    instead of with every batch of tasks. Workers still decode the snapshot into a GameState of their own.
+
+    Writes are guarded by the generation number, which is odd while a write is in progress. Readers check
+    it before and after reading, so they never use a half written board.
+
+    Attributes :
+        * name (str): The name of the shared memory block, passed to workers so they can attach
+        * capacity (int): The largest snapshot the block can hold
+
+    """
+    def __init__(self, memory, owner):
+        self._memory = memory
+        self._owner = owner
+        self.name = memory.name
+        self._buffer = memory.buf if owner else memory.buf.toreadonly()
+        self.capacity = memory.size - _SNAPSHOT_OFFSET
+
+    @classmethod
+    def create(cls, snapshot_capacity=65536):
+        """Makes a new shared block, owned by the calling process
+
+        Args:
+            snapshot_capacity: The largest GameState.to_bytes snapshot the block can hold
+
+        """
+        return cls(shared_memory.SharedMemory(create=True, size=_SNAPSHOT_OFFSET + snapshot_capacity), True)
+
+    @classmethod
+    def attach(cls, name):
+        """Maps an existing block read-only, usually in a worker process
+        """
+        return cls(shared_memory.SharedMemory(name=name), False)
+
+    @property
+    def generation(self):
+        """How many boards were written, times 2. Odd while a write is in progress
+        """
+        return _HEADER.unpack_from(self._buffer, 0)[0]
+
+    def write(self, game_state, snapshot=None):
+        """Writes the board of a GameState
+
+        Args:
+            game_state: The GameState to share
+            snapshot: game_state.to_bytes(), if already made
+
+        Returns:
+            The generation of the new board, or None if the snapshot does not fit
+
+        """
+        if snapshot is None:
+            snapshot = game_state.to_bytes()
+        if len(snapshot) > self.capacity:
+            return None
+        buffer = self._buffer
+        generation = self.generation + 1
+        _HEADER.pack_into(buffer, 0, generation, 0)
+        buffer[_SNAPSHOT_OFFSET:_SNAPSHOT_OFFSET + len(snapshot)] = snapshot
+
+        generation += 1
+        _HEADER.pack_into(buffer, 0, generation, len(snapshot))
+        return generation
+
+    def snapshot(self, generation=None):
+        """Copies out the GameState.to_bytes snapshot of the current board
+
+        Args:
+            generation: The generation the caller expects. None to accept any complete board
+
+        Returns:
+            The snapshot, or None if the board is being written or is not the expected generation
+
+        """
+        buffer = self._buffer
+        current, length = _HEADER.unpack_from(buffer, 0)
+        if current % 2 or current == 0 or (generation is not None and current != generation):
+            return None
+        snapshot = bytes(buffer[_SNAPSHOT_OFFSET:_SNAPSHOT_OFFSET + length])
+        if _HEADER.unpack_from(buffer, 0)[0] != current:
+            return None
+        return snapshot
+
+    def close(self):
+        """Releases the view and unmaps the block. The owner also frees it
+        """
+        if self._buffer is not self._memory.buf:
+            self._buffer.release()
+        self._memory.close()
+        if self._owner:
+            self._memory.unlink()
+
@@ -0,0 +1,210 @@
+import hashlib
+import struct
+from collections import OrderedDict
+
+from .simulator import SimulationResult
+
+_UNIT_RECORD = struct.Struct("<BBBBd")   # x, y, type index, flags (owner, upgraded << 1, pending removal << 2), health
+
+
+def board_key(game_state):
+    """A canonical hash of every unit on the board of a GameState
+
+    Boards holding the same units, with the same health, upgrades and removal marks, get the same key
+    whatever the turn, the resources of the players or the order the units were added in.
+
+    Args:
+        game_state: The GameState to hash
+
+    Returns:
+        A 16 byte digest
+
+    """
+    type_index = game_state.catalog.UNIT_TYPE_TO_INDEX
+    digest = hashlib.blake2b(digest_size=16)
+    pack = _UNIT_RECORD.pack
+    for x, y, unit_type, player_index, health, upgraded, pending_removal in game_state.game_map.iter_units():
+        digest.update(pack(x, y, type_index[unit_type], player_index | (upgraded << 1) | (pending_removal << 2), health))
+    return digest.digest()
+
+
+def plan_key(deploys):
+    """A canonical encoding of a deploy plan
+
+    Deploys of the same unit type on the same location that follow each other are merged, so
+    [(SCOUT, [13, 0]), (SCOUT, [13, 0])] and [(SCOUT, [13, 0], 2)] get the same key. Otherwise the
+    order is kept, since units attack in the order they were deployed.
+
+    Args:
+        deploys: A list of (unit_type, location) or (unit_type, location, count) tuples, as passed to Simulator.simulate
+
+    Returns:
+        A tuple of (unit_type, x, y, count) tuples
+
+    """
+    merged = []
+    for deploy in deploys:
+        unit_type, location = deploy[0], deploy[1]
+        count = deploy[2] if len(deploy) > 2 else 1
+        if count <= 0:
+            continue
+        if merged and merged[-1][0] == unit_type and merged[-1][1] == location[0] and merged[-1][2] == location[1]:
+            merged[-1][3] += count
+        else:
+            merged.append([unit_type, location[0], location[1], count])
+    return tuple(tuple(entry) for entry in merged)
+
+
+class _Outcome:
+    """
+    What the cache keeps of a SimulationResult. Health and SP are kept as changes, so the outcome can be
+    reused from any starting health and SP.
+    """
+    __slots__ = ("frames", "health_lost", "SP_gained", "breaches", "damage_dealt", "structures_destroyed", "units_lost", "size")
+
+    def __init__(self, result, health, SP):
+        self.frames = result.frames
+        self.health_lost = (health[0] - result.health[0], health[1] - result.health[1])
+        self.SP_gained = (result.SP[0] - SP[0], result.SP[1] - SP[1])
+        self.breaches = tuple(result.breaches)
+        self.damage_dealt = tuple(result.damage_dealt)
+        self.structures_destroyed = tuple(result.structures_destroyed)
+        self.units_lost = tuple(result.units_lost)
+
+
+class SimulationCache:
+    """A memory bounded transposition table of simulated action phases.
+
+    Results are keyed by board_key of the GameState and plan_key of both players' deploys, so candidates that
+    lead to the same board and deploys, in the same turn or in later ones, are only simulated once. The cache
+    keeps breaches, damage dealt, structures destroyed, units lost, and the health and SP each player lost or
+    gained. When it holds more than max_bytes, the least recently used results are evicted.
+
+    Results returned from the cache are new SimulationResults whose structures list is empty, since the
+    structures left are not kept.
+
+    Attributes :
+        * max_bytes (int): The approximate memory the cache may use
+        * bytes_used (int): The approximate memory the cache uses now
+        * hits (int): The number of lookups that found a result
+        * misses (int): The number of lookups that did not
+        * evictions (int): The number of results evicted to stay under max_bytes
+
+    """
+    # Rough sizes in bytes of a cached result, its key, and each destroyed structure it remembers
+    ENTRY_BYTES = 600
+    STRUCTURE_BYTES = 120
+    DEPLOY_BYTES = 100
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.__entries = OrderedDict()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    @property
+    def hit_rate(self):
+        """The share of lookups that found a result, 0 before the first lookup
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def clear(self):
+        """Forgets every result. The counters are kept
+        """
+        self.__entries.clear()
+        self.bytes_used = 0
+
+    def reset_counters(self):
+        """Sets hits, misses and evictions back to 0
+        """
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, game_state, deploys=(), enemy_deploys=(), board=None):
+        """Looks up the result of simulating deploys on the board of a GameState
+
+        Args:
+            game_state: The GameState the action phase starts from
+            deploys: Your mobile units, as passed to Simulator.simulate
+            enemy_deploys: Your opponent's mobile units, in the same form
+            board: The board_key of game_state, if already known. Computed if None
+
+        Returns:
+            A SimulationResult starting from the health and SP of game_state, or None if it is not cached
+
+        """
+        key = (board if board is not None else board_key(game_state), plan_key(deploys), plan_key(enemy_deploys))
+        outcome = self.__entries.get(key)
+        if outcome is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.__entries.move_to_end(key)
+        health, SP = self.__start(game_state)
+        result = SimulationResult((health[0] - outcome.health_lost[0], health[1] - outcome.health_lost[1]),
+                                  (SP[0] + outcome.SP_gained[0], SP[1] + outcome.SP_gained[1]))
+        result.frames = outcome.frames
+        result.breaches = list(outcome.breaches)
+        result.damage_dealt = list(outcome.damage_dealt)
+        result.structures_destroyed = list(outcome.structures_destroyed)
+        result.units_lost = list(outcome.units_lost)
+        return result
+
+    def put(self, game_state, deploys, enemy_deploys, result, board=None):
+        """Stores the result of simulating deploys on the board of a GameState
+
+        Args:
+            game_state: The GameState the action phase started from
+            deploys: Your mobile units, as passed to Simulator.simulate
+            enemy_deploys: Your opponent's mobile units, in the same form
+            result: The SimulationResult of the simulation
+            board: The board_key of game_state, if already known. Computed if None
+
+        """
+        key = (board if board is not None else board_key(game_state), plan_key(deploys), plan_key(enemy_deploys))
+        old = self.__entries.pop(key, None)
+        if old is not None:
+            self.bytes_used -= old.size
+        outcome = _Outcome(result, *self.__start(game_state))
+        outcome.size = (self.ENTRY_BYTES + self.STRUCTURE_BYTES * len(outcome.structures_destroyed) +
+                        self.DEPLOY_BYTES * (len(key[1]) + len(key[2])))
+        self.__entries[key] = outcome
+        self.bytes_used += outcome.size
+        while self.bytes_used > self.max_bytes and self.__entries:
+            _, evicted = self.__entries.popitem(last=False)
+            self.bytes_used -= evicted.size
+            self.evictions += 1
+
+    def simulate(self, simulator, game_state, deploys=(), enemy_deploys=(), board=None):
+        """Returns the cached result of a simulation, simulating and storing it on a miss
+
+        Args:
+            simulator: The Simulator to use on a miss
+            game_state: The GameState to simulate from
+            deploys: Your mobile units, as passed to Simulator.simulate
+            enemy_deploys: Your opponent's mobile units, in the same form
+            board: The board_key of game_state, if already known. Pass it when simulating many plans on one board
+
+        Returns:
+            A SimulationResult
+
+        """
+        if board is None:
+            board = board_key(game_state)
+        result = self.get(game_state, deploys, enemy_deploys, board)
+        if result is None:
+            result = simulator.simulate(game_state, deploys, enemy_deploys)
+            self.put(game_state, deploys, enemy_deploys, result, board)
+        return result
+
+    @staticmethod
+    def __start(game_state):
+        return ((game_state.my_health, game_state.enemy_health),
+                (game_state.get_resource(game_state.SP, 0), game_state.get_resource(game_state.SP, 1)))
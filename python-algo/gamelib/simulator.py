@@ -0,0 +1,644 @@
+from collections import namedtuple
+
+from .catalog import UnitCatalog
+from .influence import ARENA_SIZE, HALF_ARENA, reach_offsets
+from .navigation import PathFieldCache
+
+
+UnitRules = namedtuple("UnitRules", [
+    "stats", "breach_damage", "breach_SP", "self_destruct_damage_f", "self_destruct_damage_i",
+    "self_destruct_range", "self_destruct_steps", "refund_percentage", "frames_per_move"])
+UnitRules.__doc__ = """The action phase values of a unit type, read from its unitInformation. stats is its UnitStats."""
+
+
+def compile_rules(config, catalog):
+    """Reads the action phase values of every unit type from config["unitInformation"]
+
+    Args:
+        config (JSON): Contains information about the game
+        catalog (:obj: UnitCatalog): The compiled unit information of the game
+
+    Returns:
+        A dict mapping (unit_type, upgraded) to UnitRules
+
+    """
+    rules = {}
+    for unit_def in config["unitInformation"][:6]:
+        unit_type = unit_def["shorthand"]
+        for upgraded in (False, True):
+            values = dict(unit_def)
+            if upgraded:
+                values.update(unit_def.get("upgrade", {}))
+            stats = catalog.stats(unit_type, upgraded)
+            rules[(unit_type, upgraded)] = UnitRules(
+                stats=stats,
+                breach_damage=values.get("playerBreachDamage", 1),
+                breach_SP=values.get("metalForBreach", 0),
+                self_destruct_damage_f=values.get("selfDestructDamageTower", stats.max_health),
+                self_destruct_damage_i=values.get("selfDestructDamageWalker", stats.max_health),
+                self_destruct_range=values.get("selfDestructRange", 0),
+                self_destruct_steps=values.get("selfDestructStepsRequired", 0),
+                refund_percentage=values.get("refundPercentage", 0),
+                frames_per_move=max(1, int(round(1 / stats.speed))) if stats.speed > 0 else 0)
+    return rules
+
+
+def target_edge_of(location):
+    """The edge a mobile unit at location walks to, using the same rule as GameState.get_target_edge
+    """
+    left = location[0] < HALF_ARENA
+    bottom = location[1] < HALF_ARENA
+    if bottom:
+        return 0 if left else 1
+    return 3 if left else 2
+
+
+def _build_edges():
+    """
+    The tiles of each edge in the order of GameMap.get_edges: top right, top left, bottom left, bottom right.
+    """
+    top_right = [[HALF_ARENA + num, ARENA_SIZE - 1 - num] for num in range(HALF_ARENA)]
+    top_left = [[HALF_ARENA - 1 - num, ARENA_SIZE - 1 - num] for num in range(HALF_ARENA)]
+    bottom_left = [[HALF_ARENA - 1 - num, num] for num in range(HALF_ARENA)]
+    bottom_right = [[HALF_ARENA + num, num] for num in range(HALF_ARENA)]
+    return [top_right, top_left, bottom_left, bottom_right]
+
+EDGES = _build_edges()
+EDGE_TILES = [frozenset(x * ARENA_SIZE + y for x, y in edge) for edge in EDGES]
+
+
+class SimUnit:
+    """A unit taking part in a simulated action phase.
+
+    Attributes :
+        * unit_type (str): This unit's type
+        * player_index (int): The owner of the unit, 0 for you 1 for your opponent
+        * x, y (int): The current location of the unit
+        * health (float): The current health of the unit, including shields
+        * upgraded (bool): If this unit is upgraded
+        * pending_removal (bool): If this structure is removed at the end of the action phase
+        * rules (:obj: UnitRules): The values of the unit's type
+        * stationary (bool): Whether the unit is a structure
+        * target_edge (int): The edge a mobile unit walks to
+        * path (list): The path a mobile unit is following, None if it needs a new one
+        * path_index (int): The index of the unit's location in path
+        * steps (int): The number of tiles a mobile unit moved
+        * shielded_by (set): The supports that already shielded a mobile unit
+
+    """
+    __slots__ = ("unit_type", "player_index", "x", "y", "health", "upgraded", "pending_removal", "rules",
+                 "stationary", "target_edge", "path", "path_index", "steps", "shielded_by")
+
+    def __init__(self, unit_type, player_index, x, y, health, rules, upgraded=False, pending_removal=False):
+        self.unit_type = unit_type
+        self.player_index = player_index
+        self.x = x
+        self.y = y
+        self.health = health
+        self.upgraded = upgraded
+        self.pending_removal = pending_removal
+        self.rules = rules
+        self.stationary = rules.stats.stationary
+        self.target_edge = None if self.stationary else target_edge_of((x, y))
+        self.path = None
+        self.path_index = 0
+        self.steps = 0
+        self.shielded_by = set()
+
+    def __repr__(self):
+        return "SimUnit({}, player {}, [{}, {}], health {})".format(self.unit_type, self.player_index, self.x, self.y, self.health)
+
+
+class SimulationResult:
+    """The outcome of a simulated action phase.
+
+    Attributes :
+        * frames (int): The number of frames the action phase lasted
+        * health (list): The health of each player at the end of the action phase
+        * SP (list): The SP of each player at the end of the action phase, including breach rewards and removal refunds
+        * breaches (list): The number of mobile units each player scored with
+        * damage_dealt (list): The damage each player's units dealt, to structures and mobile units
+        * structures_destroyed (list): (x, y, unit_type, player_index) for every structure destroyed by attacks or self destructs
+        * units_lost (list): The number of mobile units each player lost to attacks or self destructs
+        * structures (list): The SimUnits of the structures left at the end of the action phase
+
+    """
+    def __init__(self, health, SP):
+        self.frames = 0
+        self.health = list(health)
+        self.SP = list(SP)
+        self.breaches = [0, 0]
+        self.damage_dealt = [0.0, 0.0]
+        self.structures_destroyed = []
+        self.units_lost = [0, 0]
+        self.structures = []
+
+    def __repr__(self):
+        return "SimulationResult({} frames, health {}, breaches {}, {} structures destroyed)".format(
+            self.frames, self.health, self.breaches, len(self.structures_destroyed))
+
+
+class Simulator:
+    """Simulates the action phase of a turn, frame by frame, from a GameState and both players' deploys.
+
+    Every frame, ready mobile units take one step along the path ShortestPathFinder gives them, and units reaching
+    their target edge breach. Units whose path ends elsewhere self destruct, damaging enemies in selfDestructRange
+    if they walked at least selfDestructStepsRequired tiles. Supports then shield friendly mobile units in range,
+    once per support and unit. Then every unit attacks the target GameState.get_target would pick, structures first
+    and then mobile units in the order they were deployed, and destroyed units are removed. Destroyed structures
+    are queued, and before the next move only the units in a pocket next to one of them get a new path. Structures marked for removal are refunded at the end of the action phase.
+    All values come from config["unitInformation"].
+
+    Most frames only move units along their paths. Before each frame, the simulator finds how many frames pass
+    before any unit could breach, self destruct, attack, be attacked or be shielded, and runs those frames with
+    moves only, which gives the same results as running them in full.
+
+    Attributes :
+        * config (JSON): Contains information about the game
+        * catalog (:obj: UnitCatalog): The compiled unit information of the game
+        * rules (dict): Maps (unit_type, upgraded) to the UnitRules of that type
+        * max_frames (int): A simulation stops after this many frames even if mobile units remain
+        * skip_quiet_frames (bool): Whether frames in which units can only move are run with moves only
+        * units_stepped (int): The mobile units the last run went through in full frames, once per unit and frame
+
+    Paths are cached by board layout, start tile and target edge, and pathlength fields are shared through a
+    PathFieldCache, so simulations of different deploys on the same board only compute each path once.
+
+    """
+    PATH_CACHE_SIZE = 4096
+
+    def __init__(self, config, catalog=None, max_frames=1000):
+        """Compiles the rules of the game
+
+        Args:
+            config (JSON): Contains information about the game
+            catalog (:obj: UnitCatalog): The compiled unit information of the game. Compiled from config if None
+            max_frames: The longest action phase to simulate
+
+        """
+        self.config = config
+        self.catalog = catalog if catalog is not None else UnitCatalog.for_config(config)
+        self.rules = compile_rules(config, self.catalog)
+        self.max_frames = max_frames
+        self.skip_quiet_frames = True
+        self.units_stepped = 0
+        self._get_hit_radius = self.catalog.get_hit_radius
+        self._path_fields = PathFieldCache()
+        self._path_cache = {}
+
+    def simulate(self, game_state, deploys=(), enemy_deploys=(), on_frame=None):
+        """Simulates the action phase that follows the current turn
+
+        Structures and mobile units already on the game_map, including those added with attempt_spawn, take part.
+
+        Args:
+            game_state: The GameState to simulate from
+            deploys: Your additional mobile units, as a list of (unit_type, location) or (unit_type, location, count) tuples
+            enemy_deploys: Your opponent's mobile units, in the same form
+            on_frame: If given, called after every frame with the frame number and a list of the SimUnits still alive
+
+        Returns:
+            A SimulationResult
+
+        """
+        structures, mobiles = self._units_from_map(game_state)
+        for player_index, plan in ((0, deploys), (1, enemy_deploys)):
+            mobiles.extend(self._units_from_plan(plan, player_index))
+        result = SimulationResult(
+            [game_state.my_health, game_state.enemy_health],
+            [game_state.get_resource(game_state.SP, 0), game_state.get_resource(game_state.SP, 1)])
+        return self.run(structures, mobiles, result, on_frame)
+
+    def _units_from_map(self, game_state):
+        structures = []
+        mobiles = []
+        rules = self.rules
+        for x, y, unit_type, player_index, health, upgraded, pending_removal in game_state.game_map.iter_units():
+            unit = SimUnit(unit_type, player_index, x, y, health, rules[(unit_type, upgraded)], upgraded, pending_removal)
+            (structures if unit.stationary else mobiles).append(unit)
+        return structures, mobiles
+
+    def _units_from_plan(self, plan, player_index):
+        units = []
+        for deploy in plan:
+            unit_type, location = deploy[0], deploy[1]
+            count = deploy[2] if len(deploy) > 2 else 1
+            rules = self.rules[(unit_type, False)]
+            for _ in range(count):
+                units.append(SimUnit(unit_type, player_index, location[0], location[1], rules.stats.max_health, rules))
+        return units
+
+    def run(self, structures, mobiles, result, on_frame=None):
+        """Runs an action phase on prepared units. Used by simulate
+
+        Args:
+            structures: A list of structure SimUnits
+            mobiles: A list of mobile SimUnits, in deploy order
+            result: A SimulationResult holding the health and SP of both players before the action phase
+            on_frame: If given, called after every frame with the frame number and a list of the SimUnits still alive
+
+        Returns:
+            The SimulationResult, updated
+
+        """
+        self._structure_grid = [None] * (ARENA_SIZE * ARENA_SIZE)
+        for unit in structures:
+            self._structure_grid[unit.x * ARENA_SIZE + unit.y] = unit
+        self._layout = frozenset(unit.x * ARENA_SIZE + unit.y for unit in structures)
+        self._damaged_structures = []
+        self._opened_tiles = []
+        self._threat_tiles = None
+        self._reach_tiles = {}
+        self._busy_until = 0
+        supports = [unit for unit in structures if unit.rules.stats.shieldRange > 0 and
+                    (unit.rules.stats.shieldPerUnit > 0 or unit.rules.stats.shieldBonusPerY > 0)]
+        turrets = [unit for unit in structures if unit.rules.stats.damage_i > 0 and unit.rules.stats.attackRange > 0]
+
+        self.units_stepped = 0
+        frame = 0
+        while mobiles and frame < self.max_frames:
+            if frame > 0:
+                if self._opened_tiles:
+                    self._repath(mobiles)
+                quiet = self._quiet_frames(mobiles, frame, supports, turrets) if self.skip_quiet_frames and frame >= self._busy_until else 0
+                if quiet and on_frame is None:
+                    mobiles = self._skip(mobiles, frame, quiet, result)
+                    frame += quiet
+                    continue
+                if quiet:
+                    for frame in range(frame, frame + quiet):
+                        mobiles = self._move(mobiles, frame, result)
+                        on_frame(frame, [unit for unit in self._structure_grid if unit is not None] + mobiles)
+                    frame += 1
+                    continue
+                mobiles = self._move(mobiles, frame, result)
+            self.units_stepped += len(mobiles)
+            tiles = self._mobile_tiles(mobiles)
+            if supports:
+                self._shield(supports, tiles)
+            for attacker in turrets:
+                if attacker.health > 0:
+                    self._attack(attacker, tiles, result)
+            for attacker in mobiles:
+                if attacker.health > 0:
+                    self._attack(attacker, tiles, result)
+            mobiles = self._remove_destroyed(mobiles, result)
+            turrets = [unit for unit in turrets if unit.health > 0]
+            supports = [unit for unit in supports if unit.health > 0]
+            if on_frame is not None:
+                on_frame(frame, [unit for unit in self._structure_grid if unit is not None] + mobiles)
+            frame += 1
+        result.frames = frame
+
+        for unit in self._structure_grid:
+            if unit is None:
+                continue
+            if unit.pending_removal:
+                stats = unit.rules.stats
+                result.SP[unit.player_index] += stats.cost[0] * unit.rules.refund_percentage * unit.health / stats.max_health
+            else:
+                result.structures.append(unit)
+        return result
+
+    def _path(self, unit):
+        """
+        The path of a unit from its current location, shared by every unit on the same tile walking to the same edge
+        on the same board layout.
+        """
+        key = (self._layout, unit.x, unit.y, unit.target_edge)
+        path = self._path_cache.get(key)
+        if path is None:
+            if len(self._path_cache) >= self.PATH_CACHE_SIZE:
+                self._path_cache.clear()
+            path = self._path_fields.path([unit.x, unit.y], EDGES[unit.target_edge], self._layout) or [[unit.x, unit.y]]
+            self._path_cache[key] = path
+        return path
+
+    def _repath(self, mobiles):
+        """
+        Handles the queued structure deaths. Units whose pocket did not touch a destroyed structure keep their path.
+        """
+        self._layout, changed = self._path_fields.open_tiles(self._layout, self._opened_tiles)
+        self._opened_tiles = []
+        self._threat_tiles = None
+        self._reach_tiles = {}
+        self._busy_until = 0
+        for unit in mobiles:
+            if unit.x * ARENA_SIZE + unit.y in changed:
+                unit.path = None
+
+    def _quiet_frames(self, mobiles, frame, supports, turrets):
+        """
+        The number of frames from frame on that only move units: no unit self destructs, and none ends a move
+        where it could attack, be attacked or be shielded, so no structure dies either. Units may breach.
+        Running them with _move alone gives the same results as running them in full.
+        When a unit stays where it interacts, _busy_until is set to its next move so frames before it are not checked again.
+        """
+        if self._threat_tiles is None:
+            self._threat_tiles = self._build_threat_tiles(turrets)
+        if self._threat_tiles is False:
+            return 0
+        horizon = self.max_frames - frame
+
+        # Mobile units attacking each other. Each move brings two units at most 1 tile closer
+        tiles = (set(), set())
+        limit = None
+        fastest = None
+        for unit in mobiles:
+            tiles[unit.player_index].add((unit.x, unit.y))
+            stats = unit.rules.stats
+            if stats.damage_i > 0 and (limit is None or stats.attackRange + self._get_hit_radius > limit):
+                limit = stats.attackRange + self._get_hit_radius
+            frames_per_move = unit.rules.frames_per_move
+            if frames_per_move and (fastest is None or frames_per_move < fastest):
+                fastest = frames_per_move
+        if limit is not None and tiles[0] and tiles[1]:
+            nearest = min((x0 - x1) * (x0 - x1) + (y0 - y1) * (y0 - y1) for x0, y0 in tiles[0] for x1, y1 in tiles[1]) ** 0.5
+            moves = int((nearest - limit) // 2)
+            if moves < 1:
+                return 0
+            if fastest is not None:
+                horizon = min(horizon, moves * fastest)
+
+        # Units on the same tile with the same path, rules and shields move and interact together
+        groups = {}
+        for unit in mobiles:
+            key = (unit.player_index, unit.x, unit.y, unit.target_edge, id(unit.path), unit.path_index, unit.rules, frozenset(unit.shielded_by))
+            groups.setdefault(key, unit)
+        last_breach = 0
+        for unit in groups.values():
+            quiet, breach = self._unit_quiet_frames(unit, frame, horizon, supports)
+            horizon = quiet
+            if not horizon:
+                return 0
+            if breach is None:
+                last_breach = None
+            elif last_breach is not None:
+                last_breach = max(last_breach, breach)
+        # The action phase ends with the frame in which the last unit breaches
+        return horizon if last_breach is None else min(horizon, last_breach + 1)
+
+    def _unit_quiet_frames(self, unit, frame, horizon, supports):
+        """
+        Helper function for _quiet_frames, the number of frames up to horizon before unit self destructs,
+        or ends a move on a tile where it could attack, be attacked or be shielded. Also returns the number
+        of frames before the unit breaches, None if it does not breach in those frames.
+        """
+        rules = unit.rules
+        stats = rules.stats
+        player_index = unit.player_index
+        threat = self._threat_tiles[player_index]
+        reach = self._structure_reach(1 - player_index, stats.attackRange) if stats.damage_f > 0 else None
+        shields = [(support.x, support.y, support.rules.stats.shieldRange * support.rules.stats.shieldRange)
+                   for support in supports if support.player_index == player_index and support not in unit.shielded_by]
+
+        def interacts(x, y):
+            index = x * ARENA_SIZE + y
+            if threat[index] or (reach is not None and reach[index]):
+                return True
+            for sx, sy, limit in shields:
+                if (x - sx) * (x - sx) + (y - sy) * (y - sy) <= limit:
+                    return True
+            return False
+
+        frames_per_move = rules.frames_per_move
+        if not frames_per_move:
+            return (0 if interacts(unit.x, unit.y) else horizon), None
+        if frame % frames_per_move and interacts(unit.x, unit.y):
+            self._busy_until = frame + (-frame % frames_per_move)
+            return 0, None
+        path, index = unit.path, unit.path_index
+        if path is None:
+            path, index = self._path(unit), 0
+        edge_tiles = EDGE_TILES[unit.target_edge]
+        move_frame = frame + (-frame % frames_per_move)
+        while move_frame - frame < horizon:
+            index += 1
+            if index >= len(path):
+                return move_frame - frame, None
+            x, y = path[index]
+            if x * ARENA_SIZE + y in edge_tiles:
+                return horizon, move_frame - frame
+            if interacts(x, y):
+                if move_frame == frame:
+                    self._busy_until = frame + frames_per_move
+                return move_frame - frame, None
+            move_frame += frames_per_move
+        return horizon, None
+
+    def _build_threat_tiles(self, turrets):
+        """
+        For each player, a flat grid marking the tiles where an enemy turret can attack their mobile units.
+        False if turrets can attack enemy structures, since then no frame is quiet.
+        """
+        threat = (bytearray(ARENA_SIZE * ARENA_SIZE), bytearray(ARENA_SIZE * ARENA_SIZE))
+        for turret in turrets:
+            if turret.health <= 0:
+                continue
+            stats = turret.rules.stats
+            if stats.damage_f > 0 and self._structure_reach(1 - turret.player_index, stats.attackRange)[turret.x * ARENA_SIZE + turret.y]:
+                return False
+            grid = threat[1 - turret.player_index]
+            for dx, dy, _ in reach_offsets(stats.attackRange, self._get_hit_radius):
+                x, y = turret.x + dx, turret.y + dy
+                if 0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE:
+                    grid[x * ARENA_SIZE + y] = 1
+        return threat
+
+    def _structure_reach(self, player_index, attack_range):
+        """
+        A flat grid marking the tiles from which a unit with attack_range can attack a structure of player_index.
+        """
+        key = (player_index, attack_range)
+        grid = self._reach_tiles.get(key)
+        if grid is None:
+            grid = bytearray(ARENA_SIZE * ARENA_SIZE)
+            offsets = reach_offsets(attack_range, self._get_hit_radius)
+            for structure in self._structure_grid:
+                if structure is None or structure.player_index != player_index or structure.health <= 0:
+                    continue
+                for dx, dy, _ in offsets:
+                    x, y = structure.x + dx, structure.y + dy
+                    if 0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE:
+                        grid[x * ARENA_SIZE + y] = 1
+            self._reach_tiles[key] = grid
+        return grid
+
+    def _skip(self, mobiles, frame, frames, result):
+        """
+        Runs quiet frames found by _quiet_frames, moving every unit as many tiles as _move would.
+        Breaches are counted in the order _move would count them.
+        """
+        end = frame + frames
+        remaining = []
+        breaches = []
+        for order, unit in enumerate(mobiles):
+            frames_per_move = unit.rules.frames_per_move
+            moves = (end - 1) // frames_per_move - (frame - 1) // frames_per_move if frames_per_move else 0
+            if not moves:
+                remaining.append(unit)
+                continue
+            if unit.path is None:
+                unit.path = self._path(unit)
+                unit.path_index = 0
+            edge_tiles = EDGE_TILES[unit.target_edge]
+            path = unit.path
+            for move in range(1, moves + 1):
+                x, y = path[unit.path_index + move]
+                if x * ARENA_SIZE + y in edge_tiles:
+                    moves = move
+                    breaches.append((frame + (-frame % frames_per_move) + (move - 1) * frames_per_move, order, unit))
+                    break
+            else:
+                remaining.append(unit)
+            unit.path_index += moves
+            unit.x, unit.y = path[unit.path_index]
+            unit.steps += moves
+        breaches.sort(key=lambda breach: breach[:2])
+        for _, _, unit in breaches:
+            result.breaches[unit.player_index] += 1
+            result.health[1 - unit.player_index] -= unit.rules.breach_damage
+            result.SP[unit.player_index] += unit.rules.breach_SP
+        return remaining
+
+    def _move(self, mobiles, frame, result):
+        remaining = []
+        for unit in mobiles:
+            frames_per_move = unit.rules.frames_per_move
+            if not frames_per_move or frame % frames_per_move:
+                remaining.append(unit)
+                continue
+            if unit.path is None:
+                unit.path = self._path(unit)
+                unit.path_index = 0
+            if unit.path_index + 1 < len(unit.path):
+                unit.path_index += 1
+                unit.x, unit.y = unit.path[unit.path_index]
+                unit.steps += 1
+                if unit.x * ARENA_SIZE + unit.y in EDGE_TILES[unit.target_edge]:
+                    result.breaches[unit.player_index] += 1
+                    result.health[1 - unit.player_index] -= unit.rules.breach_damage
+                    result.SP[unit.player_index] += unit.rules.breach_SP
+                    continue
+                remaining.append(unit)
+            else:
+                self._self_destruct(unit, mobiles, result)
+                result.units_lost[unit.player_index] += 1
+        return remaining
+
+    def _self_destruct(self, unit, mobiles, result):
+        rules = unit.rules
+        unit.health = 0
+        if unit.steps < rules.self_destruct_steps or rules.self_destruct_range <= 0:
+            return
+        enemy = 1 - unit.player_index
+        grid = self._structure_grid
+        for dx, dy, _ in reach_offsets(rules.self_destruct_range, self._get_hit_radius):
+            x, y = unit.x + dx, unit.y + dy
+            if 0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE:
+                structure = grid[x * ARENA_SIZE + y]
+                if structure is not None and structure.player_index == enemy and structure.health > 0:
+                    self._damage(structure, rules.self_destruct_damage_f, unit.player_index, result)
+        limit = rules.self_destruct_range + self._get_hit_radius
+        for other in mobiles:
+            if other.player_index == enemy and other.health > 0:
+                dx, dy = other.x - unit.x, other.y - unit.y
+                if (dx * dx + dy * dy) ** 0.5 < limit:
+                    self._damage(other, rules.self_destruct_damage_i, unit.player_index, result)
+
+    def _mobile_tiles(self, mobiles):
+        """
+        For each player, a dict mapping each (x, y) holding their mobile units to the list of those units.
+        """
+        tiles = ({}, {})
+        for unit in mobiles:
+            if unit.health > 0:
+                tiles[unit.player_index].setdefault((unit.x, unit.y), []).append(unit)
+        return tiles
+
+    def _shield(self, supports, tiles):
+        for support in supports:
+            stats = support.rules.stats
+            rows_from_edge = support.y if support.player_index == 0 else ARENA_SIZE - 1 - support.y
+            amount = stats.shieldPerUnit + stats.shieldBonusPerY * rows_from_edge
+            limit = stats.shieldRange * stats.shieldRange
+            for (x, y), units in tiles[support.player_index].items():
+                dx, dy = x - support.x, y - support.y
+                if dx * dx + dy * dy > limit:
+                    continue
+                for unit in units:
+                    if support not in unit.shielded_by:
+                        unit.shielded_by.add(support)
+                        unit.health += amount
+
+    def _attack(self, attacker, tiles, result):
+        """
+        Picks a target with the priority of GameState.get_target: mobile over stationary, nearest, lowest health,
+        lowest y for player 0 or highest y for player 1, then furthest from x = 13.5.
+        """
+        stats = attacker.rules.stats
+        ax, ay = attacker.x, attacker.y
+        enemy = 1 - attacker.player_index
+        y_sign = 1 if attacker.player_index == 0 else -1
+        limit = stats.attackRange + self._get_hit_radius
+        best_key = None
+        target = None
+        if stats.damage_i > 0:
+            for (x, y), units in tiles[enemy].items():
+                dx, dy = x - ax, y - ay
+                distance = (dx * dx + dy * dy) ** 0.5
+                if distance >= limit:
+                    continue
+                weakest = None
+                for unit in units:
+                    if unit.health > 0 and (weakest is None or unit.health < weakest.health):
+                        weakest = unit
+                if weakest is None:
+                    continue
+                key = (distance, weakest.health, y_sign * y, -abs(HALF_ARENA - 0.5 - x), x, y)
+                if best_key is None or key < best_key:
+                    best_key = key
+                    target = weakest
+            if target is not None:
+                self._damage(target, stats.damage_i, attacker.player_index, result)
+                return
+        if stats.damage_f > 0:
+            grid = self._structure_grid
+            for dx, dy, distance in reach_offsets(stats.attackRange, self._get_hit_radius):
+                x, y = ax + dx, ay + dy
+                if not (0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE):
+                    continue
+                structure = grid[x * ARENA_SIZE + y]
+                if structure is None or structure.player_index != enemy or structure.health <= 0:
+                    continue
+                key = (distance, structure.health, y_sign * y, -abs(HALF_ARENA - 0.5 - x), x, y)
+                if best_key is None or key < best_key:
+                    best_key = key
+                    target = structure
+            if target is not None:
+                self._damage(target, stats.damage_f, attacker.player_index, result)
+
+    def _damage(self, unit, amount, player_index, result):
+        dealt = min(amount, unit.health)
+        unit.health -= amount
+        result.damage_dealt[player_index] += dealt
+        if unit.stationary:
+            self._damaged_structures.append(unit)
+
+    def _remove_destroyed(self, mobiles, result):
+        remaining = []
+        for unit in mobiles:
+            if unit.health > 0:
+                remaining.append(unit)
+            else:
+                result.units_lost[unit.player_index] += 1
+        if self._damaged_structures:
+            grid = self._structure_grid
+            for unit in self._damaged_structures:
+                index = unit.x * ARENA_SIZE + unit.y
+                if unit.health <= 0 and grid[index] is unit:
+                    grid[index] = None
+                    result.structures_destroyed.append((unit.x, unit.y, unit.unit_type, unit.player_index))
+                    self._opened_tiles.append(index)
+            self._damaged_structures = []
+        return remaining
@@ -1,11 +1,27 @@
 import unittest
 import json
+import io
+import contextlib
+import os
+import tempfile
+import time
 from .game_state import GameState
 from .unit import GameUnit
+from . import util
+from .simulator import Simulator
+from .batch_simulator import BatchSimulator
+from .navigation import PathFieldCache
+from .shared_board import SharedBoard
+from .evaluation import EvaluationService, path_task
+from .replay import check_replay
+from .planner import TurnBudget, TurnPlanner
+from .sim_cache import SimulationCache, board_key
+from .search import PlanSearch
+from .placement import TurretPlacer, SupportPlacer
 
 class BasicTests(unittest.TestCase):
 
-    def make_turn_0_map(self):
+    def make_config(self):
         config = """
             {
             "seasonCompatibilityModeP1": 5,
@@ -186,12 +202,21 @@ class BasicTests(unittest.TestCase):
             }
         }
         """
-        turn_0 = """{"p2Units":[[],[],[],[],[],[],[]],"turnInfo":[0,0,-1],"p1Stats":[30.0,25.0,5.0,0],"p1Units":[[],[],[],[],[],[],[]],"p2Stats":[30.0,25.0,5.0,0],"events":{"selfDestruct":[],"breach":[],"damage":[],"shield":[],"move":[],"spawn":[],"death":[],"attack":[],"melee":[]}}"""
-        
-        state = GameState(json.loads(config), turn_0)
+        return json.loads(config)
+
+    def make_state(self, serialized_string):
+        state = GameState(self.make_config(), serialized_string)
         state.suppress_warnings(True)
         return state
 
+    def make_turn_0_map(self):
+        turn_0 = """{"p2Units":[[],[],[],[],[],[],[]],"turnInfo":[0,0,-1],"p1Stats":[30.0,25.0,5.0,0],"p1Units":[[],[],[],[],[],[],[]],"p2Stats":[30.0,25.0,5.0,0],"events":{"selfDestruct":[],"breach":[],"damage":[],"shield":[],"move":[],"spawn":[],"death":[],"attack":[],"melee":[]}}"""
+        return self.make_state(turn_0)
+
+    def make_turn_with_units(self):
+        turn = """{"p2Units":[[[13,14,75.0,"11"]],[],[[12,15,90.0,"12"],[15,15,60.0,"13"]],[],[],[],[],[[12,15,0,"14"]]],"turnInfo":[0,3,-1],"p1Stats":[28.0,10.0,7.0,120],"p1Units":[[[13,12,75.0,"1"]],[[13,2,30.0,"2"]],[[14,11,90.0,"3"]],[[13,0,15.0,"4"],[13,0,15.0,"5"]],[],[],[[13,12,0,"6"]],[]],"p2Stats":[25.0,8.0,6.0,140],"events":{"selfDestruct":[],"breach":[],"damage":[],"shield":[],"move":[],"spawn":[],"death":[],"attack":[],"melee":[]}}"""
+        return self.make_state(turn)
+
     def test_basic(self):
         self.assertEqual(True, True, "It's the end of the world as we know it, and I feel fine")
 
@@ -213,7 +238,7 @@ class BasicTests(unittest.TestCase):
         self.assertEqual(True, game.attempt_spawn("DF", [[13, 6]]), "We cannot spawn a tower!")
         self.assertEqual(2, game.attempt_spawn("SI", [[13, 0], [13, 0], [13, 5]]), "More or less than 2 units were spawned!")
         self.assertEqual([("DF", 13, 6)], game._build_stack, "Build queue is wrong!")
-        self.assertEqual([("SI", 13, 0), ("SI", 13, 0), ("SI", 13, 0)], game._deploy_stack, "Deploy queue is wrong!")
+        self.assertEqual([("SI", 13, 0), ("SI", 13, 0), ("SI", 13, 0)], game.current_plan()[1], "Deploy queue is wrong!")
 
     def test_trivial_functions(self):
         game = self.make_turn_0_map()
@@ -275,3 +300,651 @@ class BasicTests(unittest.TestCase):
         actual = game.project_future_MP(turns)
         self.assertAlmostEqual(actual, expected, 0, "Expected {} MP {} turns from now, got {}".format(expected, turns, actual))
 
+
+    def test_unit_store(self):
+        game = self.make_turn_with_units()
+        store = game.unit_store
+        self.assertEqual(8, len(store), "Every non RM/UP entry should have a row")
+        self.assertEqual([0, 0, 0, 0, 0, 1, 1, 1], list(store.player_index), "Owners are wrong")
+        self.assertEqual(2, len(store.select(1, "DF")), "There should be two enemy turrets")
+        self.assertEqual(20.0, store.sum_stat("attackDamageWalker", 1, "DF"), "The upgraded turret should count its upgraded damage")
+        self.assertEqual(1, store.count_by_row(0)[12], "There should be one friendly unit on row 12")
+        self.assertEqual(2, store.count_by_row(0)[0], "Mobile units should be counted per unit")
+
+    def test_lazy_units(self):
+        game = self.make_turn_with_units()
+        wall = game.game_map[13, 12][0]
+        self.assertTrue(wall.pending_removal, "The wall should be marked for removal")
+        self.assertEqual("1", str(game.unit_store.unit_id[0]), "The engine id should be kept")
+        turret = game.game_map[12, 15][0]
+        self.assertTrue(turret.upgraded, "The enemy turret should be upgraded")
+        self.assertEqual(3.5, turret.attackRange, "The upgraded turret should have its upgraded range")
+        self.assertIs(turret, game.game_map[12, 15][0], "Units should only be created once per tile")
+        self.assertEqual(2, len(game.game_map[13, 0]), "Scouts should stack")
+        game.game_map.add_unit("PI", [14, 0])
+        game.game_map.remove_unit([14, 11])
+        self.assertEqual(0, len(game.game_map[14, 11]), "Removed tiles should not be refilled from the store")
+
+    def test_decoded_state(self):
+        game = self.make_turn_with_units()
+        decoded = self.make_state(json.loads(game.serialized_string))
+        self.assertEqual(game.turn_number, decoded.turn_number, "A decoded state should parse the same as its string")
+        self.assertEqual(len(game.unit_store), len(decoded.unit_store), "A decoded state should have the same units")
+        self.assertEqual(json.loads(game.serialized_string), json.loads(decoded.serialized_string), "The string should be available on request")
+
+    def test_lazy_state(self):
+        game = GameState(self.make_config(), self.make_turn_with_units().serialized_string, lazy=True)
+        game.suppress_warnings(True)
+        self.assertIsNone(game._game_map, "A lazy state should not build the map up front")
+        self.assertEqual(7.0, game.get_resource(game.MP), "Resources should be parsed immediately")
+        self.assertEqual(3, game.turn_number, "The turn number should be parsed immediately")
+        self.assertTrue(game.contains_stationary_unit([14, 11]), "The map should be built on first access")
+        self.assertFalse(game.game_map.enable_warnings, "Suppressed warnings should carry over to the lazily built map")
+
+    def test_board_model(self):
+        from .board import BoardModel
+        board = BoardModel(self.make_config())
+        turn = json.loads(self.make_turn_with_units().serialized_string)
+        first = board.apply(turn)
+        self.assertEqual(6, len(first.added), "Every structure should be added on the first turn")
+        turret = board.get_unit("3")
+        self.assertIs(turret, board.unit_at([14, 11]), "Units should be found by id and by tile")
+
+        turn["p1Units"][2][0][2] = 40.0
+        turn["p1Units"][7] = [[14, 11, 0, "20"]]
+        turn["p2Units"][0] = []
+        second = board.apply(turn)
+        self.assertIs(turret, board.get_unit("3"), "Structures should keep their GameUnit across turns")
+        self.assertEqual(40.0, turret.health, "Health changes should be applied")
+        self.assertTrue(turret.upgraded, "Upgrades should be applied")
+        self.assertEqual(1, len(second.destroyed), "The enemy wall should be destroyed")
+        self.assertEqual({(14, 11), (13, 14)}, second.changed_tiles, "Only the changed tiles should be reported")
+
+    def test_board_model_caches(self):
+        from .board import BoardModel
+        config = self.make_config()
+        board = BoardModel(config)
+        turn = json.loads(self.make_turn_with_units().serialized_string)
+        board.apply(turn)
+        threat_map = board.threat_map
+        self.assertEqual(5.0, threat_map.damage_at([14, 12], 1))
+        layout = board.layout
+        game = GameState(config, turn, board=board)
+        self.assertEqual(GameState(config, turn).find_path_to_edge([13, 0]), game.find_path_to_edge([13, 0]))
+        self.assertEqual(1, board.path_fields.field_count(layout))
+
+        turn = json.loads(json.dumps(turn))
+        turn["p1Units"][2][0][2] = 40.0
+        turn["p1Units"][7] = [[14, 11, 0, "20"]]
+        board.apply(turn)
+        self.assertIs(threat_map, board.threat_map, "The threat map should be kept across turns")
+        self.assertEqual(15.0, threat_map.damage_at([14, 12], 1), "The upgrade should update the kept threat map")
+        self.assertIs(layout, board.layout, "Health changes and upgrades should not change the layout")
+        self.assertEqual(1, board.path_fields.field_count(layout), "The path field should survive the turn")
+
+        turn = json.loads(json.dumps(turn))
+        turn["p2Units"][0] = []
+        board.apply(turn)
+        self.assertEqual(layout - {13 * 28 + 14}, board.layout, "The destroyed wall should open its tile")
+        self.assertEqual(0, board.path_fields.field_count(board.layout), "The diff should invalidate the field of its pocket")
+
+        game = GameState(config, turn, board=board)
+        fresh = GameState(config, turn)
+        self.assertIsNot(board.threat_map, game.threat_map, "The game state should get its own copy of the threat map")
+        for state in (game, fresh):
+            state.game_map.add_unit("FF", [12, 12], 0)
+        for location in [[13, 13], [12, 11], [14, 12], [10, 13]]:
+            for player_index in (0, 1):
+                self.assertEqual(fresh.threat_map.damage_at(location, player_index), game.threat_map.damage_at(location, player_index))
+        for start in ([13, 0], [3, 10], [20, 6]):
+            self.assertEqual(fresh.find_path_to_edge(start), game.find_path_to_edge(start), "Seeded paths should follow the changed map")
+        with self.assertRaises(ValueError):
+            GameState(config, json.loads(json.dumps(turn)), board=board)
+
+    def test_unit_catalog(self):
+        from .catalog import UnitCatalog
+        config = self.make_config()
+        catalog = UnitCatalog(config)
+        self.assertEqual((2.0, 0), catalog.cost("DF"), "Turrets should cost 2 SP")
+        self.assertEqual((4.0, 0), catalog.cost("DF", upgrade=True), "Turret upgrades should cost 4 SP")
+        self.assertEqual((1.0, 0), catalog.cost("FF", upgrade=True), "Upgrades without a cost should cost the same as the unit")
+        self.assertEqual(15.0, catalog.stats("DF", upgraded=True).damage_i, "Upgraded turrets should do more damage")
+        self.assertTrue(catalog.is_stationary("EF") and not catalog.is_stationary("PI"), "Structure flags are wrong")
+        self.assertEqual(3, catalog.UNIT_TYPE_TO_INDEX["PI"], "Scouts should be the fourth unit")
+        with self.assertRaises(AttributeError):
+            catalog.WALL = "XX"
+
+        game = GameState(config, self.make_turn_0_map().serialized_string, catalog=catalog)
+        self.assertIs(catalog, game.game_map.catalog, "The map should share the catalog of its state")
+        self.assertEqual([4.0, 0], game.type_cost("DF", True), "type_cost should read from the catalog")
+
+    def test_threat_map(self):
+        game = self.make_turn_with_units()
+        threat_map = game.threat_map
+        for location in [[13, 13], [12, 12], [16, 13], [10, 13], [14, 12]]:
+            self.assertEqual(len(game.get_attackers(location, 0)), threat_map.attacker_count(location, 0), "Threat map disagrees with get_attackers at {}".format(location))
+        self.assertEqual(20.0, threat_map.damage_at([13, 14], 0), "Both enemy turrets should reach [13, 14]")
+        self.assertEqual(5.0, threat_map.damage_at([14, 12], 1), "Our turret should threaten enemy units")
+
+        game.game_map.add_unit("DF", [13, 16], 1)
+        self.assertEqual(25.0, threat_map.damage_at([13, 14], 0), "Added turrets should update the threat map")
+        game._player_resources[0]['SP'] = 10
+        game.attempt_upgrade([14, 11])
+        self.assertEqual(15.0, threat_map.damage_at([14, 12], 1), "Upgraded turrets should update the threat map")
+        self.assertEqual(1, threat_map.attacker_count([14, 8], 1), "Upgrades should extend the range in the threat map")
+        game.game_map.remove_unit([14, 11])
+        self.assertEqual(0, threat_map.attacker_count([14, 12], 1), "Removed turrets should update the threat map")
+        self.assertEqual(40.0, threat_map.path_damage([[13, 14], [13, 13]], 0), "Path damage should sum the grid")
+
+    def test_batched_targets(self):
+        import random
+        rng = random.Random(7)
+        game = self.make_turn_0_map()
+        for _ in range(60):
+            location = [rng.randint(0, 27), rng.randint(0, 27)]
+            if not game.game_map.in_arena_bounds(location):
+                continue
+            game.game_map.add_unit(rng.choice(["FF", "EF", "DF", "PI", "EI", "SI"]), location, rng.randint(0, 1))
+            for unit in game.game_map[location]:
+                unit.health = rng.choice([5.0, 10.0, unit.health])
+        targets = game.get_targets()
+        self.assertTrue(len(targets) > 10, "Every unit that can attack should get a target")
+        for attacker, target in targets:
+            self.assertIs(game.get_target(attacker), target, "Batched targeting disagrees with get_target for {}".format(attacker))
+        self.assertEqual([], game.get_targets([]), "An empty subset should have no targets")
+
+    def test_bulk_spawn(self):
+        bulk = self.make_turn_with_units()
+        single = self.make_turn_with_units()
+        self.assertEqual(7, bulk.attempt_spawn("PI", [[13, 0], [14, 0]], 1000), "Every affordable scout should be spawned")
+        for _ in range(1000):
+            if not single.attempt_spawn("PI", [13, 0]):
+                break
+        self.assertEqual(single.current_plan(), bulk.current_plan(), "Bulk spawning should give the same deploy stack")
+        self.assertEqual([("PI", 13, 0, 7)], bulk._deploy_stack, "Bulk spawning should queue one record per location")
+        self.assertEqual(0, bulk.get_resource(bulk.MP), "Every MP should be spent")
+        self.assertEqual(9, len(bulk.game_map[13, 0]), "The scouts should be on the map")
+
+        self.assertEqual(2, bulk.attempt_spawn("DF", [[10, 10], [10, 10], [11, 10]], 3), "Structures should not stack")
+        self.assertEqual(1, bulk.attempt_upgrade([[10, 10], [11, 10], [14, 11]]), "Only affordable upgrades should happen")
+        self.assertEqual(2, bulk.get_resource(bulk.SP), "Upgrades should be paid for")
+        self.assertEqual([("DF", 10, 10), ("DF", 11, 10), ("UP", 10, 10)], bulk._build_stack, "Build stack is wrong")
+
+    def test_resource_forecast(self):
+        game = self.make_turn_with_units()
+        forecast = game.resource_forecast
+        curve = forecast.MP_curve(game.get_resource(game.MP), horizon=20, include_supports=False)
+        for turns in range(1, 21):
+            self.assertEqual(curve[turns], game.project_future_MP(turns), "The curve should match project_future_MP at {} turns".format(turns))
+        self.assertEqual(game.project_future_MP(4, current_MP=4.0), forecast.project_MP(7.0, 4, spend=3.0, include_supports=False), "Spending should shift the start of the curve")
+        self.assertEqual([[1, 0], [0, 0]], forecast.support_income, "Our support should generate 1 SP")
+        self.assertEqual(10.0 + 3 * 6, game.project_future_SP(3), "SP should grow by coresPerRound plus support income")
+        game.attempt_upgrade([13, 2])
+        self.assertEqual([[1, 1], [0, 0]], game.resource_forecast.support_income, "Upgraded supports should also generate MP")
+
+    def make_shielding_state(self):
+        config = self.make_config()
+        config["unitInformation"][1].update({"shieldRange": 3.0, "shieldPerUnit": 3.0, "shieldBonusPerY": 0.5})
+        config["unitInformation"][1]["upgrade"].update({"shieldRange": 5.0, "shieldPerUnit": 4.0})
+        state = GameState(config, self.make_turn_with_units().serialized_string)
+        state.suppress_warnings(True)
+        return state
+
+    def test_shield_map(self):
+        game = self.make_shielding_state()
+        shield_map = game.shield_map
+        self.assertEqual(4.0, shield_map.shield_at([13, 0], 0), "The support at [13, 2] should shield [13, 0] by 3 + 2 * 0.5")
+        self.assertEqual(0, shield_map.shield_at([13, 6], 0), "[13, 6] is out of shield range")
+        self.assertEqual(0, shield_map.shield_at([13, 0], 1), "Supports should not shield enemy units")
+        game.attempt_spawn("EF", [14, 3])
+        self.assertEqual(4.0 + 4.5, shield_map.shield_at([14, 1], 0), "Both supports should shield [14, 1]")
+        self.assertEqual(8.5, shield_map.path_shield([[13, 0], [14, 1], [14, 2]], 0), "Each support should only shield a unit once")
+        game.attempt_upgrade([13, 2])
+        self.assertEqual(5.0, shield_map.shield_at([13, 7], 0), "Upgraded supports should reach further and shield more")
+        game.game_map.remove_unit([13, 2])
+        self.assertEqual({(14, 3)}, shield_map.supports_in_range([14, 1], 0), "Removed supports should stop shielding")
+
+    def test_path_exposure(self):
+        game = self.make_shielding_state()
+        for location in ([23, 14], [24, 14], [25, 15]):
+            game.game_map.add_unit("DF", location, 1)
+        path = game.find_path_to_edge([13, 0])
+        exposure = game.get_path_exposure(path, "PI", 3)
+        self.assertEqual(len(path) - 1, len(exposure.frames), "Scouts should spend one frame per tile")
+        self.assertEqual(4.0, exposure.total_shield, "The support at [13, 2] should shield the stack once")
+        self.assertEqual(50.0, exposure.total_damage, "The stack should take every frame of turret damage")
+        self.assertEqual([3, 2, 1, 1, 1], exposure.survivors[-5:], "Focused fire should kill one shielded scout per 19 damage")
+        self.assertEqual(1, exposure.breaches, "The last scout should reach the edge")
+
+        single = game.get_path_exposure(path, "PI", 1)
+        self.assertEqual(19.0, single.total_damage, "A single scout can only take its health and shield in damage")
+        self.assertEqual(0, single.breaches, "A single scout should not survive the turrets")
+        slow = game.get_path_exposure(path, "SI", 1)
+        self.assertEqual(4 * (len(path) - 1), len(slow.frames), "Interceptors should spend four frames per tile")
+
+    def test_snapshot(self):
+        game = self.make_turn_with_units()
+        game.suppress_warnings(True)
+        game.attempt_spawn("PI", [14, 0], 2)
+        snapshot = game.to_bytes()
+        self.assertLess(len(snapshot), len(game.serialized_string), "Snapshots should be smaller than the engine json")
+
+        copy = GameState.from_bytes(game.config, snapshot)
+        self.assertEqual(game.turn_number, copy.turn_number)
+        self.assertEqual(game.get_resources(0), copy.get_resources(0), "Snapshots should keep resources spent this turn")
+        self.assertEqual([game.my_health, game.enemy_health], [copy.my_health, copy.enemy_health])
+        self.assertEqual(sorted(game.game_map.iter_units()), sorted(copy.game_map.iter_units()), "Snapshots should keep every unit and flag")
+        self.assertEqual(2, len(copy.game_map[14, 0]), "Spawned scouts should be in the snapshot")
+        self.assertTrue(copy.game_map[13, 12][0].pending_removal)
+        self.assertEqual(snapshot, copy.to_bytes(), "Decoding and encoding again should give the same snapshot")
+        with self.assertRaises(ValueError):
+            GameState.from_bytes(game.config, b"not a snapshot" * 4)
+
+    def test_logging(self):
+        class Counted:
+            formatted = 0
+            def __str__(self):
+                Counted.formatted += 1
+                return "counted"
+
+        output = io.StringIO()
+        util.configure_logging(level=util.INFO, ring_level=util.DEBUG, asynchronous=False)
+        try:
+            with contextlib.redirect_stderr(output):
+                util.dump_recent_logs()
+                util.log(util.DEBUG, "hidden {}", Counted())
+                self.assertEqual(0, Counted.formatted, "Messages below the output level should not be formatted")
+                util.log(util.WARNING, "shown {}", Counted())
+                util.debug_write("a", 1)
+                game = self.make_turn_0_map()
+                game.suppress_warnings(False)
+                game.warn("warning {}", Counted())
+                game.suppress_warnings(True)
+                game.warn("suppressed {}", Counted())
+                self.assertEqual(2, Counted.formatted, "Only written messages should be formatted")
+                self.assertEqual("shown counted\na, 1\nwarning counted\n", output.getvalue())
+
+                util.dump_recent_logs("slow turn")
+                dumped = output.getvalue().splitlines()[3:]
+                self.assertIn("slow turn", dumped[0])
+                self.assertTrue(dumped[1].endswith("DEBUG] hidden counted"), "The ring buffer should keep messages below the output level")
+                self.assertEqual(5, len(dumped), "Suppressed warnings should not reach the ring buffer")
+
+                locations = [[13, 0]]
+                util.log(util.DEBUG, "scored on {}", locations)
+                locations.append([14, 0])
+                util.dump_recent_logs()
+                self.assertTrue(output.getvalue().endswith("scored on [[13, 0]]\n"), "The ring buffer should keep the logged values")
+        finally:
+            util.configure_logging(ring_level=util.INFO, asynchronous=True)
+
+    def test_simulator(self):
+        game = self.make_turn_0_map()
+        simulator = Simulator(game.config, game.catalog)
+        result = simulator.simulate(game, [("PI", [13, 0], 3)])
+        self.assertEqual([3, 0], result.breaches, "Unopposed scouts should all breach")
+        self.assertEqual([30.0, 27.0], result.health)
+        self.assertEqual(25.0 + 3, result.SP[0], "Each breach should give metalForBreach SP")
+        self.assertEqual(len(game.find_path_to_edge([13, 0])), result.frames, "Scouts should move one tile per frame")
+
+        for location in ([16, 4], [17, 5], [18, 6]):
+            game.game_map.add_unit("DF", location, 1)
+        result = simulator.simulate(game, [("PI", [13, 0], 3)])
+        self.assertEqual([0, 0], result.breaches, "Three turrets should stop three scouts")
+        self.assertEqual([3, 0], result.units_lost)
+        self.assertEqual(45.0, result.damage_dealt[1], "Turrets should deal exactly the scouts' health")
+
+        game = self.make_turn_0_map()
+        for x in range(6, 22):
+            game.game_map.add_unit("FF", [x, 7], 1)
+        result = simulator.simulate(game, [("PI", [13, 0], 2)])
+        self.assertEqual([0, 0], result.breaches, "A wall line should stop every scout")
+        self.assertEqual([2, 0], result.units_lost, "Blocked scouts should self destruct")
+        end = game.find_path_to_edge([13, 0])[-1]
+        damaged = {(unit.x, unit.y): unit.health for unit in result.structures}
+        self.assertLessEqual(damaged[(end[0], end[1] + 1)], 75.0 - 2 * 15.0, "Self destructs should damage the walls next to the end of the path")
+
+    def test_batch_simulator(self):
+        game = self.make_shielding_state()
+        for x in range(4, 24, 3):
+            game.game_map.add_unit("DF", [x, 15], 1)
+        for x in range(3, 25, 2):
+            game.game_map.add_unit("FF", [x, 16], 1)
+        scenarios = [([(unit_type, location, count)], [("PI", [14, 27], 2)])
+                     for unit_type in ("PI", "EI", "SI") for location in ([13, 0], [3, 10], [20, 6]) for count in (2, 6)]
+
+        simulator = Simulator(game.config, game.catalog)
+        expected = [simulator.simulate(game, deploys, enemy_deploys) for deploys, enemy_deploys in scenarios]
+        results = BatchSimulator(game.config, game.catalog).simulate(game, scenarios)
+        self.assertEqual(len(scenarios), len(results))
+        for one, batched in zip(expected, results):
+            self.assertEqual(
+                (one.frames, one.health, one.SP, one.breaches, one.damage_dealt, one.structures_destroyed, one.units_lost),
+                (batched.frames, batched.health, batched.SP, batched.breaches, batched.damage_dealt, batched.structures_destroyed, batched.units_lost),
+                "Batched scenarios should give the same results as simulating them one at a time")
+        self.assertTrue(any(result.structures_destroyed for result in results), "Some scenarios should destroy structures and re-path")
+
+        layout = frozenset(x * 28 + y for x, y, _, _, _ in game.game_map.iter_structures())
+        fields = PathFieldCache()
+        for start in ([13, 0], [3, 10], [20, 6]):
+            end_points = game.game_map.get_edge_locations(game.get_target_edge(start))
+            self.assertEqual(game.find_path_to_edge(start), fields.path(start, end_points, layout), "Cached path fields should give the same paths")
+
+    def test_batch_simulator_speedup(self):
+        game = self.make_shielding_state()
+        for x in range(4, 24, 3):
+            game.game_map.add_unit("DF", [x, 15], 1)
+        for x in range(3, 25, 2):
+            game.game_map.add_unit("FF", [x, 16], 1)
+        locations = [location for location in game.game_map.get_edge_locations(2) + game.game_map.get_edge_locations(3)
+                     if not game.contains_stationary_unit(location)]
+        scenarios = [([(unit_type, location, count)], []) for unit_type in ("PI", "EI", "SI") for location in locations for count in (2, 6)]
+
+        simulator = Simulator(game.config, game.catalog)
+        expected = []
+        units_stepped = 0
+        for deploys, enemy_deploys in scenarios:
+            expected.append(simulator.simulate(game, deploys, enemy_deploys))
+            units_stepped += simulator.units_stepped
+        batch = BatchSimulator(game.config, game.catalog)
+        results = batch.simulate(game, scenarios)
+        self.assertEqual([(one.frames, one.damage_dealt, one.structures_destroyed, one.units_lost) for one in expected],
+                         [(one.frames, one.damage_dealt, one.structures_destroyed, one.units_lost) for one in results])
+        # Stacks of identical units are stepped once per frame instead of once per unit, about 0.4 of the work here
+        self.assertLess(batch.stacks_stepped, 0.5 * units_stepped, "A batch of {} scenarios stepped {} stacks against {} units one at a time".format(
+            len(scenarios), batch.stacks_stepped, units_stepped))
+
+    def test_quiet_frames(self):
+        game = self.make_shielding_state()
+        for x in range(4, 24, 6):
+            game.game_map.add_unit("DF", [x, 15], 1)
+        scenarios = [([(unit_type, location, count)], enemy_deploys) for unit_type in ("PI", "EI") for location in ([13, 0], [20, 6])
+                     for count in (1, 8) for enemy_deploys in ([], [("PI", [14, 27], 3)])]
+        stepped = Simulator(game.config, game.catalog)
+        stepped.skip_quiet_frames = False
+        skipping = Simulator(game.config, game.catalog)
+        for deploys, enemy_deploys in scenarios:
+            frames = ([], [])
+            expected = stepped.simulate(game, deploys, enemy_deploys)
+            result = skipping.simulate(game, deploys, enemy_deploys)
+            self.assertEqual(
+                (expected.frames, expected.health, expected.SP, expected.breaches, expected.damage_dealt, expected.structures_destroyed, expected.units_lost),
+                (result.frames, result.health, result.SP, result.breaches, result.damage_dealt, result.structures_destroyed, result.units_lost),
+                "Skipping quiet frames should give the same results as stepping every frame")
+            for simulator, recorded in ((stepped, frames[0]), (skipping, frames[1])):
+                simulator.simulate(game, deploys, enemy_deploys,
+                                   on_frame=lambda frame, units, recorded=recorded: recorded.append((frame, sorted((unit.x, unit.y, unit.health) for unit in units))))
+            self.assertEqual(frames[0], frames[1], "Every skipped frame should still be reported")
+
+    def test_evaluation_service(self):
+        game = self.make_shielding_state()
+        scenarios = [([("PI", [13, 0], count)], []) for count in range(1, 6)]
+        expected = [Simulator(game.config, game.catalog).simulate(game, deploys, enemy_deploys) for deploys, enemy_deploys in scenarios]
+
+        inline = EvaluationService(game.config, workers=0)
+        inline.start()
+        self.assertFalse(inline.running)
+        self.assertEqual([result.breaches for result in expected], [result.breaches for result in inline.simulate(game, scenarios)])
+        self.assertEqual([game.find_path_to_edge([3, 10])], inline.evaluate(path_task, game, [([3, 10],)]))
+        self.assertEqual([None] * 5, inline.simulate(game, scenarios, timeout=0), "Nothing should be evaluated after the deadline")
+        self.assertEqual(5, inline.timed_out)
+
+        pool = EvaluationService(game.config, workers=2)
+        pool.start()
+        try:
+            self.assertTrue(pool.running)
+            results = pool.simulate(game, scenarios, timeout=30)
+            self.assertEqual([(result.breaches, result.health) for result in expected], [(result.breaches, result.health) for result in results],
+                             "Workers should give the same results as the main process")
+            self.assertEqual(0, pool.timed_out)
+        finally:
+            pool.shutdown()
+        self.assertFalse(pool.running)
+
+    def test_shared_board(self):
+        game = self.make_shielding_state()
+        board = SharedBoard.create()
+        reader = SharedBoard.attach(board.name)
+        try:
+            self.assertIsNone(reader.snapshot(), "Nothing should be read before the first write")
+            generation = board.write(game)
+            self.assertEqual(2, generation)
+            self.assertEqual(game.to_bytes(), reader.snapshot(generation))
+            self.assertIsNone(reader.snapshot(generation + 2), "A reader expecting another board should get nothing")
+            self.assertEqual(4, board.write(game, b"other"))
+            self.assertEqual(b"other", reader.snapshot(), "Readers should see the newest board")
+            self.assertIsNone(reader.snapshot(generation), "An older generation should not be read")
+            self.assertIsNone(board.write(game, bytes(board.capacity + 1)), "Boards that do not fit should not be written")
+        finally:
+            reader.close()
+            board.close()
+
+    def test_turn_planner(self):
+        config = self.make_config()
+        budget = TurnBudget(config)
+        self.assertEqual(5.0 * 0.8, budget.seconds, "The budget should come from waitTimeBotSoft")
+        state = json.loads(self.make_turn_with_units().serialized_string)
+        state["p1Stats"][3] = 1500
+        budget.finish(1.0)
+        self.assertEqual(103.5, budget.start(state, 100.0), "Time the engine counts beyond the algo's should be taken off the budget")
+        self.assertEqual(0.5, budget.overhead_seconds)
+
+        def build(game_state):
+            game_state.attempt_spawn("DF", [3, 12])
+        def slow(game_state):
+            game_state.attempt_spawn("DF", [5, 12])
+            time.sleep(0.3)
+        def attack(game_state):
+            game_state.attempt_spawn("PI", [13, 0])
+
+        game = GameState(config, self.make_turn_with_units().serialized_string)
+        game.suppress_warnings(True)
+        order = []
+        planner = TurnPlanner(game, time.monotonic() + 10)
+        planner.add_stage(lambda game_state: order.append("attack"), priority=0, name="attack")
+        planner.add_stage(lambda game_state: order.append("defend"), priority=1, name="defend")
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assertTrue(planner.run())
+            self.assertFalse(game.submit_turn(), "A turn should only be submitted once")
+        self.assertEqual(["defend", "attack"], order, "Stages should run from the highest priority")
+        self.assertEqual(2, len(output.getvalue().splitlines()))
+
+        game = GameState(config, self.make_turn_with_units().serialized_string)
+        game.suppress_warnings(True)
+        planner = TurnPlanner(game, time.monotonic() + 0.1)
+        planner.add_stage(build, priority=2)
+        planner.add_stage(slow, priority=1)
+        planner.add_stage(attack, priority=0)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assertFalse(planner.run(), "The watchdog should submit the turn when a stage passes the deadline")
+        self.assertEqual(['[["DF", 3, 12]]', '[]'], output.getvalue().splitlines(), "Only the stages done by the deadline should be submitted")
+        self.assertEqual(["build", "slow"], planner.completed)
+        self.assertEqual(["attack"], planner.skipped)
+
+        def broken(game_state):
+            game_state.attempt_spawn("DF", [5, 12])
+            game_state.attempt_spawn("PI", [14, 0])
+            raise RuntimeError("broken stage")
+        game = GameState(config, self.make_turn_with_units().serialized_string)
+        game.suppress_warnings(True)
+        resources = game.get_resources()
+        planner = TurnPlanner(game, time.monotonic() + 10)
+        planner.add_stage(broken, priority=1)
+        planner.add_stage(attack, priority=0)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(io.StringIO()):
+            self.assertTrue(planner.run())
+        self.assertEqual(['[]', '[["PI", 13, 0]]'], output.getvalue().splitlines(), "What a failed stage queued should not be submitted")
+        self.assertEqual(["attack"], planner.completed)
+        self.assertEqual(resources[0], game.get_resource(game.SP), "A failed stage's SP should be given back")
+        self.assertFalse(game.contains_stationary_unit([5, 12]))
+
+    def test_replay_check(self):
+        game = self.make_shielding_state()
+        frame_0 = json.loads(game.serialized_string)
+        frame_0["turnInfo"] = [1, 3, 0]
+        frame_0["p2Units"][3] = [[14, 27, 15.0, "20"]]
+        frame_0["events"]["spawn"] = [[[13, 0], 3, "4", 1], [[13, 0], 3, "5", 1], [[14, 27], 3, "20", 2]]
+
+        frames = []
+        def record(frame, units):
+            recorded = dict(frame_0, turnInfo=[1, 3, frame], p1Units=[[] for _ in range(8)], p2Units=[[] for _ in range(8)])
+            for unit in units:
+                type_code = game.catalog.UNIT_TYPE_TO_INDEX[unit.unit_type]
+                recorded["p1Units" if unit.player_index == 0 else "p2Units"][type_code].append([unit.x, unit.y, unit.health, "0"])
+            frames.append(recorded)
+        start = GameState(game.config, dict(frame_0, p1Units=frame_0["p1Units"][:3] + [[]] * 5, p2Units=frame_0["p2Units"][:3] + [[]] * 5))
+        Simulator(game.config).simulate(start, [("PI", [13, 0], 2)], [("PI", [14, 27])], on_frame=record)
+        self.assertGreater(len(frames), 10)
+
+        def check(frames):
+            path = os.path.join(directory, "game.replay")
+            with open(path, "w") as replay_file:
+                replay_file.write(json.dumps(game.config) + "\n")
+                for frame in frames:
+                    replay_file.write(json.dumps(frame) + "\n")
+            return check_replay(path)
+
+        with tempfile.TemporaryDirectory() as directory:
+            report = check(frames)
+            self.assertEqual([], report.divergent_turns, "Frames made by the simulator should not diverge")
+            self.assertEqual(len(frames), report.frames)
+            self.assertGreater(report.frames_per_second, 0)
+
+            frames[5]["p2Units"][3][0][2] -= 1
+            report = check(frames + [dict(frames[-1], turnInfo=[1, 3, len(frames)])])
+            self.assertEqual(5, report.turns[0].first_divergent_frame, "A health difference should be found on its frame")
+            self.assertEqual(1.0, report.turns[0].health_error[5])
+
+    def test_open_tiles(self):
+        box = [[9, 5], [11, 5], [10, 4], [10, 6]]
+        layout = frozenset(x * 28 + y for x, y in box + [[10, 8], [11, 8], [12, 8]])
+        fields = PathFieldCache()
+        edge = [[14 + num, 27 - num] for num in range(14)]
+        self.assertEqual([[10, 5]], fields.path([10, 5], edge, layout), "A unit boxed in by walls should not move")
+        self.assertIsNone(fields.path([20, 5], edge, layout), "Tiles off the board have no path")
+
+        opened, changed = fields.open_tiles(layout, [11 * 28 + 8])
+        self.assertEqual(layout - {11 * 28 + 8}, opened)
+        self.assertIn(11 * 28 + 9, changed, "The pocket next to the opened tile should change")
+        self.assertNotIn(10 * 28 + 5, changed, "Pockets away from the opened tile should keep their paths")
+
+        opened, changed = fields.open_tiles(opened, [10 * 28 + 6])
+        self.assertIn(10 * 28 + 5, changed)
+        self.assertIn(11 * 28 + 9, changed, "Opening the box should join it to the main pocket")
+        fresh = PathFieldCache()
+        for start in ([10, 5], [11, 9], [3, 10]):
+            self.assertEqual(fresh.path(start, edge, opened), fields.path(start, edge, opened), "Derived layouts should give the same paths")
+
+    def test_simulation_cache(self):
+        game = self.make_shielding_state()
+        simulator = Simulator(game.config, game.catalog)
+        cache = SimulationCache()
+        first = cache.simulate(simulator, game, [("PI", [13, 0]), ("PI", [13, 0])], [("PI", [14, 27])])
+        again = cache.simulate(simulator, game, [("PI", [13, 0], 2)], [("PI", [14, 27], 1)])
+        self.assertEqual((1, 1), (cache.hits, cache.misses), "The same deploys written differently should hit")
+        self.assertEqual(0.5, cache.hit_rate)
+        self.assertEqual((first.breaches, first.health, first.SP, first.units_lost), (again.breaches, again.health, again.SP, again.units_lost))
+
+        later = self.make_shielding_state()
+        later._player_resources[0]['SP'] += 5
+        self.assertEqual(board_key(game), board_key(later), "The board key should not depend on resources")
+        self.assertEqual(first.SP[0] + 5, cache.get(later, [("PI", [13, 0], 2)], [("PI", [14, 27])]).SP[0],
+                         "Cached results should start from the current resources")
+        later.game_map.add_unit("FF", [5, 10], 0)
+        self.assertNotEqual(board_key(game), board_key(later))
+        self.assertIsNone(cache.get(later, [("PI", [13, 0], 2)], [("PI", [14, 27])]))
+
+        small = SimulationCache(max_bytes=2 * SimulationCache.ENTRY_BYTES + 4 * SimulationCache.DEPLOY_BYTES)
+        for count in range(1, 4):
+            small.simulate(simulator, game, [("PI", [13, 0], count)])
+        self.assertEqual((2, 1), (len(small), small.evictions), "The least recently used result should be evicted")
+        self.assertIsNone(small.get(game, [("PI", [13, 0], 1)]))
+        self.assertLessEqual(small.bytes_used, small.max_bytes)
+
+    def test_plan_search(self):
+        game = self.make_shielding_state()
+        game.attempt_spawn("FF", [5, 10])
+        key, snapshot, plan = board_key(game), game.to_bytes(), game.current_plan()
+        checkpoint = game.checkpoint()
+        game.attempt_spawn("EF", [14, 3])
+        game.attempt_upgrade([13, 2])
+        game.attempt_spawn("PI", [13, 0], 3)
+        self.assertNotEqual(key, board_key(game))
+        game.rollback(checkpoint)
+        self.assertEqual((key, snapshot, plan), (board_key(game), game.to_bytes(), game.current_plan()),
+                         "Rolling back should undo every build, upgrade and deploy after the checkpoint")
+        self.assertEqual(4.0, game.shield_map.shield_at([14, 1], 0), "Rolling back should update the shield map")
+
+        fork = game.fork()
+        fork.attempt_spawn("DF", [8, 11])
+        self.assertEqual(snapshot, game.to_bytes(), "Changing a fork should not change the original")
+
+        search = PlanSearch(game.config, game.catalog, cache=SimulationCache())
+        actions = [("PI", [13, 0], 1000), ("PI", [14, 0], 1000), ("EF", [14, 3]), ("DF", [8, 11])]
+        responses = [[], [("PI", [14, 27], 6)]]
+        result = search.search(game, actions, responses)
+        self.assertEqual(snapshot, game.to_bytes(), "The search should leave the GameState as it was")
+        self.assertTrue(any(action[0] == "PI" for action in result.actions), "Scouts should score against an open edge")
+        self.assertEqual(len(result.actions), result.apply(game))
+        game.rollback(checkpoint)
+        self.assertFalse(any(action[0] == "PI" for action in search.search(game, actions, responses, MP_budget=0).actions),
+                         "Plans over the MP budget should be dropped")
+        self.assertTrue(search.search(game, actions, responses, time_limit=0).timed_out)
+
+        pool = EvaluationService(game.config, workers=2)
+        pool.start()
+        try:
+            parallel = PlanSearch(game.config, game.catalog, evaluation=pool).search(game, actions, responses)
+        finally:
+            pool.shutdown()
+        self.assertEqual((result.actions, result.score), (parallel.actions, parallel.score),
+                         "Simulating plans on the evaluation workers should find the same plan")
+        self.assertEqual(snapshot, game.to_bytes())
+
+    def test_turret_placer(self):
+        game = self.make_shielding_state()
+        placer = TurretPlacer(game.config, game.catalog)
+        paths = placer.enemy_paths(game)
+        self.assertEqual(28, len(paths), "Every free enemy edge tile should have a path")
+        self.assertAlmostEqual(1.0, sum(weight for _, weight in paths))
+
+        game._player_resources[0]['SP'] = 30
+        placement = placer.place(game, paths, SP_budget=12)
+        self.assertLessEqual(placement.SP, 12, "The placer should keep within its budget")
+        self.assertIn(("UP", [14, 11]), placement.actions, "The existing turret should be worth upgrading")
+        edges = game.game_map.get_edge_locations(game.game_map.BOTTOM_LEFT) + game.game_map.get_edge_locations(game.game_map.BOTTOM_RIGHT)
+        self.assertFalse(any(action[1] in edges for action in placement.actions), "Our edges should stay free")
+        self.assertEqual(len(placement.actions), placement.apply(game))
+        self.assertEqual(30 - placement.SP, game.get_resource(game.SP))
+
+        again = placer.place(game, paths)
+        self.assertLess(again.value / max(again.SP, 1), placement.value / placement.SP,
+                        "Turrets on paths that are already covered should be worth less")
+        one_path = placer.place(game, paths[:1], SP_budget=2, upgrades=False)
+        self.assertEqual("DF", one_path.actions[0][0])
+        self.assertTrue(any(game.game_map.distance_between_locations(one_path.actions[0][1], location) <= 2.5 for location in paths[0][0]),
+                        "A turret for a single path should be in range of it")
+
+    def test_support_placer(self):
+        game = self.make_shielding_state()
+        for location in ([23, 14], [24, 14], [25, 15]):
+            game.game_map.add_unit("DF", location, 1)
+        game._player_resources[0]['SP'] = 30
+        game.attempt_spawn("PI", [13, 0], 5)
+        placer = SupportPlacer(game.config, game.catalog)
+        self.assertEqual([("PI", [13, 0], 5)], placer.planned_stacks(game))
+
+        path = game.find_path_to_edge([13, 0])
+        placement = placer.place(game)
+        self.assertTrue(placement.actions, "The scouts take damage, so supports should be worth building")
+        self.assertEqual(30.0, placement.value, "Shield should only count up to the 50 damage the stack takes, 20 of it already shielded")
+        self.assertFalse(any(action[1] in path for action in placement.actions), "Supports should not block the route")
+        exposure_before = game.get_path_exposure(path, "PI", 5)
+        placement.apply(game)
+        self.assertGreater(game.get_path_exposure(path, "PI", 5).total_shield, exposure_before.total_shield)
+        self.assertFalse(placer.place(game).actions, "A fully shielded stack needs no more supports")
+        self.assertFalse(placer.place(game, [("PI", [14, 0], 0)]).actions)
+
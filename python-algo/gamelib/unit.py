@@ -1,3 +1,6 @@
+from .catalog import UnitCatalog
+
+
 def is_stationary(unit_type, structure_types):
     """
         Args:
@@ -30,14 +33,16 @@ class GameUnit:
         * shieldPerUnit (float): how much shield is given per unit
         * pending_removal (boolean): If this unit is marked for removal by its owner
         * upgraded (boolean): If this unit is upgraded
+        * catalog (:obj: UnitCatalog): The compiled unit information this unit reads its values from
 
     """
-    def __init__(self, unit_type, config, player_index=None, health=None, x=-1, y=-1):
+    def __init__(self, unit_type, config, player_index=None, health=None, x=-1, y=-1, catalog=None):
         """ Initialize unit variables using args passed
 
         """
         self.unit_type = unit_type
         self.config = config
+        self.catalog = catalog if catalog is not None else UnitCatalog.for_config(config)
         self.player_index = player_index
         self.pending_removal = False
         self.upgraded = False
@@ -47,34 +52,30 @@ class GameUnit:
         self.health = self.max_health if not health else health
 
     def __serialize_type(self):
-        from .game_state import STRUCTURE_TYPES, UNIT_TYPE_TO_INDEX, SUPPORT
-        type_config = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[self.unit_type]]
-        self.stationary = type_config["unitCategory"] == 0
-        self.speed = type_config.get("speed", 0)
-        self.damage_f = type_config.get("attackDamageTower", 0)
-        self.damage_i = type_config.get("attackDamageWalker", 0)
-        self.attackRange = type_config.get("attackRange", 0)
-        self.shieldRange = type_config.get("shieldRange", 0)
-        self.max_health = type_config.get("startHealth", 0)
-        self.shieldPerUnit = type_config.get("shieldPerUnit", 0)
-        self.shieldBonusPerY = type_config.get("shieldBonusPerY", 0)
-        self.cost = [type_config.get("cost1", 0), type_config.get("cost2", 0)]
+        self.__apply_stats(self.catalog.stats(self.unit_type))
 
+    def __apply_stats(self, stats):
+        self.stationary = stats.stationary
+        self.speed = stats.speed
+        self.damage_f = stats.damage_f
+        self.damage_i = stats.damage_i
+        self.attackRange = stats.attackRange
+        self.shieldRange = stats.shieldRange
+        self.max_health = stats.max_health
+        self.shieldPerUnit = stats.shieldPerUnit
+        self.shieldBonusPerY = stats.shieldBonusPerY
+        self.cost = list(stats.cost)
 
     def upgrade(self):
-        from .game_state import UNIT_TYPE_TO_INDEX
-        type_config = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[self.unit_type]].get("upgrade", {})
-        self.speed = type_config.get("speed", self.speed)
-        self.damage_f = type_config.get("attackDamageTower", self.damage_f)
-        self.damage_i = type_config.get("attackDamageWalker", self.damage_i)
-        self.attackRange = type_config.get("attackRange", self.attackRange)
-        self.shieldRange = type_config.get("shieldRange", self.shieldRange)
-        self.max_health = type_config.get("startHealth", self.max_health)
-        self.shieldPerUnit = type_config.get("shieldPerUnit", self.shieldPerUnit)
-        self.shieldBonusPerY = type_config.get("shieldBonusPerY", self.shieldBonusPerY)
-        self.cost = [type_config.get("cost1", 0) + self.cost[0], type_config.get("cost2", 0) + self.cost[1]]
+        self.__apply_stats(self.catalog.stats(self.unit_type, True))
         self.upgraded = True
 
+    def downgrade(self):
+        """Undoes upgrade, for example when a GameState rolls back to a checkpoint
+        """
+        self.__apply_stats(self.catalog.stats(self.unit_type))
+        self.upgraded = False
+
 
     def __toString(self):
         owner = "Friendly" if self.player_index == 0 else "Enemy"
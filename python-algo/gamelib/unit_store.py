@@ -0,0 +1,188 @@
+from array import array
+
+from .unit import GameUnit
+from .catalog import UnitCatalog
+
+
+class UnitStore:
+    """Holds every unit of a serialized game state as parallel arrays.
+
+    Row i of every array describes the same unit, in the order units appear in
+    p1Units followed by p2Units. GameUnit objects are only created on request,
+    which lets bulk analysis work directly on the arrays.
+
+    Attributes :
+        * config (JSON): Contains information about the game
+        * catalog (:obj: UnitCatalog): The compiled unit information of the game
+        * x (array): The x coordinate of each unit
+        * y (array): The y coordinate of each unit
+        * health (array): The current health of each unit
+        * type_code (array): The index of each unit's type in config["unitInformation"]
+        * player_index (array): The owner of each unit, 0 for you 1 for your opponent
+        * upgraded (array): 1 if the unit is upgraded, 0 otherwise
+        * pending_removal (array): 1 if the unit is marked for removal by its owner, 0 otherwise
+        * unit_id (array): The engine's id for each unit, -1 if it was not provided
+
+    """
+    REMOVE_INDEX = 6
+    UPGRADE_INDEX = 7
+
+    def __init__(self, config, catalog=None):
+        self.config = config
+        self.catalog = catalog if catalog is not None else UnitCatalog.for_config(config)
+        self.x = array('b')
+        self.y = array('b')
+        self.health = array('d')
+        self.type_code = array('b')
+        self.player_index = array('b')
+        self.upgraded = array('b')
+        self.pending_removal = array('b')
+        self.unit_id = array('q')
+        self._shorthands = self.catalog.shorthands
+        self._tile_rows = None
+
+    def __len__(self):
+        return len(self.x)
+
+    def add_player_units(self, units, player_index):
+        """Appends one player's units, as found in p1Units or p2Units of a game state
+
+        Args:
+            units: A list holding one list of [x, y, health, id] entries per unit type
+            player_index: The owner of the units, 0 for you 1 for your opponent
+
+        """
+        first_row = len(self.x)
+        for type_code, entries in enumerate(units):
+            if not entries:
+                continue
+            if type_code == self.REMOVE_INDEX or type_code == self.UPGRADE_INDEX:
+                self.__flag_structures(entries, first_row, type_code)
+                continue
+            count = len(entries)
+            self.x.extend([int(entry[0]) for entry in entries])
+            self.y.extend([int(entry[1]) for entry in entries])
+            self.health.extend([float(entry[2]) for entry in entries])
+            self.unit_id.extend([int(entry[3]) if len(entry) > 3 else -1 for entry in entries])
+            self.type_code.extend([type_code] * count)
+            self.player_index.extend([player_index] * count)
+            self.upgraded.extend(bytes(count))
+            self.pending_removal.extend(bytes(count))
+        self._tile_rows = None
+
+    def __flag_structures(self, entries, first_row, type_code):
+        """
+        Helper function for add_player_units to apply removal and upgrade markers to the structure on the same tile.
+        This depends on RM and UP always being the last types to be processed
+        """
+        flags = self.pending_removal if type_code == self.REMOVE_INDEX else self.upgraded
+        for entry in entries:
+            x, y = int(entry[0]), int(entry[1])
+            for row in self.rows_at(x, y):
+                if row >= first_row and self.is_stationary(row):
+                    flags[row] = 1
+                    break
+
+    def is_stationary(self, row):
+        """Whether the unit in the given row is a structure
+        """
+        return self.catalog.is_stationary(self._shorthands[self.type_code[row]])
+
+    def unit_type(self, row):
+        """The shorthand unit type of the unit in the given row
+        """
+        return self._shorthands[self.type_code[row]]
+
+    def tiles(self):
+        """Gets every occupied tile
+
+        Returns:
+            A dict mapping each occupied (x, y) tuple to the list of rows located there, in row order
+
+        """
+        if self._tile_rows is None:
+            tile_rows = {}
+            for row, location in enumerate(zip(self.x, self.y)):
+                rows = tile_rows.get(location)
+                if rows is None:
+                    tile_rows[location] = [row]
+                else:
+                    rows.append(row)
+            self._tile_rows = tile_rows
+        return self._tile_rows
+
+    def rows_at(self, x, y):
+        """The rows of the units located at [x, y]
+        """
+        return self.tiles().get((x, y), [])
+
+    def make_unit(self, row):
+        """Creates a GameUnit from a row of the store
+
+        Args:
+            row: The row of the unit
+
+        Returns:
+            A new GameUnit with the type, owner, location, health and flags of that row
+
+        """
+        unit = GameUnit(self.unit_type(row), self.config, self.player_index[row], self.health[row], self.x[row], self.y[row], self.catalog)
+        if self.upgraded[row]:
+            unit.upgrade()
+        if self.pending_removal[row]:
+            unit.pending_removal = True
+        return unit
+
+    def select(self, player_index=None, unit_type=None):
+        """Gets the rows matching an owner and unit type
+
+        Args:
+            player_index: The owner to match, 0 for you 1 for your opponent. Matches both if None
+            unit_type: The unit type to match, SCOUT, WALL, etc. Matches every type if None
+
+        Returns:
+            A list of matching rows
+
+        """
+        type_code = None if unit_type is None else self.catalog.UNIT_TYPE_TO_INDEX[unit_type]
+        return [row for row in range(len(self.x))
+                if (player_index is None or self.player_index[row] == player_index)
+                and (type_code is None or self.type_code[row] == type_code)]
+
+    def count_by_row(self, player_index=None, unit_type=None):
+        """Counts units on each row (y coordinate) of the board
+
+        Args:
+            player_index: The owner to count, 0 for you 1 for your opponent. Counts both if None
+            unit_type: The unit type to count. Counts every type if None
+
+        Returns:
+            A list where entry y is the number of matching units with that y coordinate
+
+        """
+        counts = [0] * 28
+        for row in self.select(player_index, unit_type):
+            counts[self.y[row]] += 1
+        return counts
+
+    def sum_stat(self, stat, player_index=None, unit_type=None):
+        """Sums a unitInformation value over matching units, using the upgraded value for upgraded units
+
+        Args:
+            stat: A key of a unitInformation entry, such as 'attackDamageWalker'
+            player_index: The owner to sum over, 0 for you 1 for your opponent. Sums both if None
+            unit_type: The unit type to sum over. Sums every type if None
+
+        Returns:
+            The total of that value over the matching units
+
+        """
+        unit_information = self.config["unitInformation"]
+        total = 0
+        for row in self.select(player_index, unit_type):
+            type_config = unit_information[self.type_code[row]]
+            value = type_config.get(stat, 0)
+            if self.upgraded[row]:
+                value = type_config.get("upgrade", {}).get(stat, value)
+            total += value
+        return total
@@ -1,4 +1,11 @@
+import atexit
+import collections
+import copy
+import os
+import queue
 import sys
+import threading
+import time
 
 
 BANNER_TEXT = "---------------- Starting Your Algo --------------------"
@@ -29,13 +36,200 @@ def send_command(cmd):
     sys.stdout.write(cmd.strip() + "\n")
     sys.stdout.flush()
 
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+
+class _Logger:
+    """
+    The state behind log, debug_write and dump_recent_logs. 
+    Messages at or above level are formatted by the caller and queued for a background thread that writes them
+    to stderr, so the turn never waits on stderr. The queue is bounded, and messages that do not fit are dropped and
+    counted. Messages at or above ring_level are also kept, unformatted, in a ring buffer of the last ring_size
+    messages, which dump_recent_logs writes out, for example after a slow turn. Their args are copied when they
+    are kept, so the dump shows the values that were logged.
+    """
+    def __init__(self):
+        self.level = INFO
+        self.ring_level = INFO
+        self.min_level = INFO
+        self.asynchronous = True
+        self.dropped = 0
+        self.ring = collections.deque(maxlen=256)
+        self.queue = queue.Queue(maxsize=1024)
+        self.thread = None
+        self.pid = None
+        self.lock = threading.Lock()
+
+    def emit(self, line):
+        if not self.asynchronous:
+            self.write([line])
+            return
+        if self.pid != os.getpid():
+            self.start_writer()
+        try:
+            self.queue.put_nowait(line)
+        except queue.Full:
+            self.dropped += 1
+
+    def start_writer(self):
+        """
+        Starts the writer thread. Also called after a fork, since threads do not survive it.
+        """
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.queue = queue.Queue(maxsize=self.queue.maxsize)
+            self.thread = threading.Thread(target=self.run_writer, name="gamelib-log-writer", daemon=True)
+            self.pid = os.getpid()
+            self.thread.start()
+
+    def run_writer(self):
+        log_queue = self.queue
+        while True:
+            lines = [log_queue.get()]
+            while True:
+                try:
+                    lines.append(log_queue.get_nowait())
+                except queue.Empty:
+                    break
+            self.write(lines)
+            for _ in lines:
+                log_queue.task_done()
+
+    def write(self, lines):
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            lines = ["({} log messages dropped)".format(dropped)] + lines
+        sys.stderr.write("\n".join(lines) + "\n")
+        sys.stderr.flush()
+
+    def flush(self, timeout=1.0):
+        """
+        Waits up to timeout seconds for queued messages to be written.
+        """
+        if self.thread is None or self.pid != os.getpid():
+            return
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.001)
+
+
+_logger = _Logger()
+atexit.register(_logger.flush)
+
+
+def _format(message, args):
+    if args:
+        return str(message).format(*args).strip()
+    return str(message).strip()
+
+
+def configure_logging(level=None, ring_level=None, ring_size=None, queue_size=None, asynchronous=None):
+    """Changes how log messages are handled. Arguments left as None keep their current value
+
+    Args:
+        level: The lowest level written to the debug output, DEBUG, INFO, WARNING or ERROR. INFO by default
+        ring_level: The lowest level kept in the recent message ring buffer. INFO by default, the same as level. 
+            Set it to DEBUG to keep the messages that are not written, at the cost of copying their args
+        ring_size: The number of recent messages kept. 256 by default
+        queue_size: The number of messages waiting to be written before new ones are dropped. 1024 by default
+        asynchronous: If False, messages are written immediately instead of by a background thread
+
+    """
+    logger = _logger
+    if level is not None:
+        logger.level = level
+    if ring_level is not None:
+        logger.ring_level = ring_level
+    if ring_size is not None:
+        logger.ring = collections.deque(logger.ring, maxlen=ring_size)
+    if queue_size is not None:
+        logger.flush()
+        logger.queue = queue.Queue(maxsize=queue_size)
+        logger.pid = None
+    if asynchronous is not None:
+        logger.flush()
+        logger.asynchronous = asynchronous
+    logger.min_level = min(logger.level, logger.ring_level)
+
+
+def log_enabled(level):
+    """Whether messages of a level are written to the debug output. 
+    Use it to skip building expensive messages
+
+    Args:
+        level: DEBUG, INFO, WARNING or ERROR
+
+    Returns:
+        True if messages at that level are written
+
+    """
+    return level >= _logger.level
+
+
+def log(level, message, *args):
+    """Writes a message to the games debug output if its level is enabled, without blocking on stderr.
+
+    The message is only formatted, with message.format(*args), if it is written. 
+    Messages below both the output level and the ring buffer's level cost a single comparison.
+
+    Args:
+        level: DEBUG, INFO, WARNING or ERROR
+        message: The message, optionally with {} fields filled from args
+        args: Values for the fields of message
+
+    """
+    logger = _logger
+    if level < logger.min_level:
+        return
+    if level >= logger.ring_level:
+        logger.ring.append((time.monotonic(), level, message, tuple(map(copy.copy, args))))
+    if level >= logger.level:
+        logger.emit(_format(message, args))
+
+
+def dump_recent_logs(reason=None):
+    """Writes the messages in the recent message ring buffer, including any below the output level, and clears it
+
+    Args:
+        reason: An optional line written before the messages, such as why they are dumped
+
+    """
+    logger = _logger
+    records = list(logger.ring)
+    logger.ring.clear()
+    if not records:
+        return
+    lines = ["---- {} recent log messages{} ----".format(len(records), ": {}".format(reason) if reason else "")]
+    start = records[0][0]
+    for timestamp, level, message, args in records:
+        lines.append("[{:+.3f}s {}] {}".format(timestamp - start, LEVEL_NAMES.get(level, level), _format(message, args)))
+    for line in lines:
+        logger.emit(line)
+
+
+def flush_logs(timeout=1.0):
+    """Waits for queued messages to be written to the debug output. Called automatically when the algo exits
+
+    Args:
+        timeout: The longest time to wait, in seconds
+
+    """
+    _logger.flush(timeout)
+
+
 def debug_write(*msg):
-    """Prints a message to the games debug output
+    """Prints a message to the games debug output, at the INFO level of log
 
     Args:
         msg: The message to output
 
     """
     #Printing to STDERR is okay and printed out by the game but doesn't effect turns.
-    sys.stderr.write(", ".join(map(str, msg)).strip() + "\n")
-    sys.stderr.flush()
+    if INFO < _logger.min_level:
+        return
+    log(INFO, ", ".join(map(str, msg)))